@@ -1,43 +1,231 @@
 import argparse
 import os
 
-import markdown2
-import pdfkit
-
+from assess.models.assessors import DEFAULT_MAX_CONCURRENCY
+from assess.models.batch import BatchRunner, list_records
+from assess.models.map_reduce import MapReduceReader
 from assess.models.orchestrator import Orchestrator
-from assess.structures.criteria import AssessmentCriteria
+from assess.models.rendering import PdfRenderPool
+from assess.structures.criteria import criteria_registry
 from assess.structures.medical_record import MedicalRecord
-
-
-def convert_markdown_to_pdf(md_string: str, output_path: str):
-    html_text = markdown2.markdown(md_string)
-    pdfkit.from_string(html_text, output_path)
-
+from assess.structures.report import render_combined_pdf, render_pdf, write_report
+from assess.utils import document_cache, instrumentation, rate_limit, serialize
+from assess.utils.context_packing import ContextPacker
+from assess.utils.instrumentation import Operation
+from assess.utils.retrieval import ContextSelector
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Convert Markdown to PDF.")
-    parser.add_argument(
+    records = parser.add_mutually_exclusive_group(required=True)
+    records.add_argument(
         "--record-path", type=str, help="Path to the patient's medical record"
     )
+    records.add_argument(
+        "--record-dir",
+        type=str,
+        help="Path to a directory of medical records to assess as a batch",
+    )
+    records.add_argument(
+        "--manifest",
+        type=str,
+        help="Path to a JSON or text file listing medical records to assess as a batch",
+    )
     parser.add_argument(
         "--criteria",
         type=str,
+        nargs="+",
+        choices=criteria_registry.names(),
         help="The criteria against which to assess the patient",
-        default="colonoscopy",
+        default=["colonoscopy"],
+    )
+    parser.add_argument(
+        "--combined",
+        action="store_true",
+        help="Write one report covering every criteria rather than one per criteria",
     )
     parser.add_argument(
         "--write-loc", type=str, help="Output path for the generated report"
     )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        help="The maximum number of criteria sections to assess at once",
+        default=DEFAULT_MAX_CONCURRENCY,
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="The number of records to assess at once in batch mode",
+        default=4,
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help="The maximum number of seconds to spend on each record in batch mode",
+        default=None,
+    )
+    parser.add_argument(
+        "--context-token-budget",
+        type=int,
+        help="Send only the most relevant parts of records larger than this many tokens",
+        default=None,
+    )
+    parser.add_argument(
+        "--pack-context",
+        action="store_true",
+        help="Remove duplicate pages and boilerplate from records before they are sent",
+    )
+    parser.add_argument(
+        "--map-reduce",
+        action="store_true",
+        help="Read records too long for one prompt in parts, in parallel, with GPT-3.5 "
+        "(other stages get the most relevant parts, as with --context-token-budget)",
+    )
+    parser.add_argument(
+        "--cache-path",
+        type=str,
+        help="Path to a SQLite file in which to cache LLM responses between runs",
+        default=None,
+    )
+    parser.add_argument(
+        "--cache-replay",
+        action="store_true",
+        help="Only answer from the response cache, failing instead of calling the API",
+    )
+    parser.add_argument(
+        "--document-cache",
+        type=str,
+        help="Path to a directory in which to cache the parsed pages of each PDF",
+        default=None,
+    )
+    parser.add_argument(
+        "--document-cache-mb",
+        type=float,
+        help="Evict the least recently used parsed PDFs beyond this many megabytes",
+        default=None,
+    )
+    parser.add_argument(
+        "--pdf-workers",
+        type=int,
+        help="The number of processes with which to parse each large PDF",
+        default=1,
+    )
+    parser.add_argument(
+        "--render-workers",
+        type=int,
+        help="The number of processes on which to render reports to PDF",
+        default=1,
+    )
+    parser.add_argument(
+        "--requests-per-minute",
+        type=float,
+        help="The most LLM requests to send per minute, across all workers",
+        default=None,
+    )
+    parser.add_argument(
+        "--tokens-per-minute",
+        type=float,
+        help="The most (estimated) prompt tokens to send to the LLM per minute",
+        default=None,
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Write the time, tokens and context size of every LLM call as JSON",
+    )
 
     args = parser.parse_args()
+    if len(args.criteria) > 1 and not args.record_path:
+        parser.error("Batch mode assesses against a single criteria")
 
-    criteria = AssessmentCriteria.from_spec(args.criteria)
-    record = MedicalRecord.from_pdf(args.record_path)
-    orchestrator = Orchestrator()
-    output = orchestrator.run_pipeline(criteria=criteria, record=record)
+    if args.cache_path:
+        from assess.utils import response_cache
 
-    fname = f"{record.get_name().replace(' ', '_')}_Assessment.pdf"
+        response_cache.configure_response_cache(
+            response_cache.SqliteResponseCache(
+                args.cache_path, replay=args.cache_replay
+            )
+        )
 
-    convert_markdown_to_pdf(
-        md_string=output, output_path=os.path.join(args.write_loc, fname)
-    )
+    if args.document_cache:
+        max_bytes = None
+        if args.document_cache_mb is not None:
+            max_bytes = int(args.document_cache_mb * 2**20)
+        document_cache.configure_document_cache(
+            document_cache.ParsedDocumentCache(args.document_cache, max_bytes=max_bytes)
+        )
+
+    if args.requests_per_minute or args.tokens_per_minute:
+        rate_limit.configure_rate_limiter(
+            Operation.LLM,
+            rate_limit.RateLimiter(
+                requests_per_minute=args.requests_per_minute,
+                tokens_per_minute=args.tokens_per_minute,
+            ),
+        )
+
+    context_selector = None
+    if args.context_token_budget:
+        context_selector = ContextSelector(token_budget=args.context_token_budget)
+    context_packer = ContextPacker() if args.pack_context else None
+    map_reduce = MapReduceReader() if args.map_reduce else None
+
+    criteria = [criteria_registry.get(x) for x in args.criteria]
+    orchestrator = Orchestrator(max_concurrency=args.max_concurrency)
+
+    if args.record_path:
+        with instrumentation.tracing(args.record_path) as trace:
+            record = MedicalRecord.from_pdf(
+                args.record_path,
+                context_selector=context_selector,
+                pdf_workers=args.pdf_workers,
+                context_packer=context_packer,
+                map_reduce=map_reduce,
+            )
+            reports = orchestrator.build_multi_criteria_reports(
+                criteria=criteria, record=record
+            )
+
+        name = record.get_name().replace(" ", "_")
+        # A handful of reports render faster on this process than by starting a pool
+        if len(reports) == 1:
+            outputs = {f"{name}_Assessment.pdf": next(iter(reports.values()))}
+        elif args.combined:
+            outputs = {}
+            with open(
+                os.path.join(args.write_loc, f"{name}_Assessment.pdf"), "wb"
+            ) as f:
+                render_combined_pdf(reports, f)
+        else:
+            outputs = {
+                f"{name}_{label}_Assessment.pdf": report
+                for label, report in reports.items()
+            }
+
+        for fname, report in outputs.items():
+            write_report(
+                report,
+                os.path.join(args.write_loc, fname),
+                render=render_pdf,
+                binary=True,
+            )
+        if args.trace:
+            serialize.write_json_file(
+                trace.to_dict(), os.path.join(args.write_loc, f"{name}_trace.json")
+            )
+    else:
+        with PdfRenderPool(workers=args.render_workers) as pool:
+            runner = BatchRunner(
+                criteria=criteria[0],
+                orchestrator=orchestrator,
+                report_writer=pool.render_to_file,
+                report_extension=".pdf",
+                workers=args.workers,
+                timeout=args.timeout,
+                context_selector=context_selector,
+                trace=args.trace,
+                pdf_workers=args.pdf_workers,
+                context_packer=context_packer,
+                map_reduce=map_reduce,
+            )
+            runner.run(list_records(args.record_dir or args.manifest), args.write_loc)
@@ -0,0 +1,119 @@
+import argparse
+
+from assess.models.assessors import DEFAULT_MAX_CONCURRENCY
+from assess.models.map_reduce import MapReduceReader
+from assess.models.orchestrator import Orchestrator
+from assess.models.service import AssessmentServer, AssessmentService, ServiceConstant
+from assess.structures.medical_record import MedicalRecord
+from assess.utils import document_cache, rate_limit
+from assess.utils.context_packing import ContextPacker
+from assess.utils.instrumentation import Operation
+from assess.utils.retrieval import ContextSelector
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve medical record assessments over HTTP."
+    )
+    parser.add_argument("--host", type=str, default=ServiceConstant.DEFAULT_HOST.value)
+    parser.add_argument("--port", type=int, default=ServiceConstant.DEFAULT_PORT.value)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="The number of records to assess at once",
+        default=2,
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        help="The most records to hold waiting; beyond this, uploads are refused",
+        default=16,
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        help="The maximum number of criteria sections to assess at once",
+        default=DEFAULT_MAX_CONCURRENCY,
+    )
+    parser.add_argument(
+        "--context-token-budget",
+        type=int,
+        help="Send only the most relevant parts of records larger than this many tokens",
+        default=None,
+    )
+    parser.add_argument(
+        "--pack-context",
+        action="store_true",
+        help="Remove duplicate pages and boilerplate from records before they are sent",
+    )
+    parser.add_argument(
+        "--map-reduce",
+        action="store_true",
+        help="Read records too long for one prompt in parts, in parallel, with GPT-3.5 "
+        "(other stages get the most relevant parts, as with --context-token-budget)",
+    )
+    parser.add_argument(
+        "--cache-path",
+        type=str,
+        help="Path to a SQLite file in which to cache LLM responses between runs",
+        default=None,
+    )
+    parser.add_argument(
+        "--document-cache",
+        type=str,
+        help="Path to a directory in which to cache the parsed pages of each PDF",
+        default=None,
+    )
+    parser.add_argument(
+        "--requests-per-minute",
+        type=float,
+        help="The most LLM requests to send per minute, across all workers",
+        default=None,
+    )
+    parser.add_argument(
+        "--tokens-per-minute",
+        type=float,
+        help="The most (estimated) prompt tokens to send to the LLM per minute",
+        default=None,
+    )
+    args = parser.parse_args()
+
+    if args.cache_path:
+        from assess.utils import response_cache
+
+        response_cache.configure_response_cache(
+            response_cache.SqliteResponseCache(args.cache_path)
+        )
+
+    if args.document_cache:
+        document_cache.configure_document_cache(
+            document_cache.ParsedDocumentCache(args.document_cache)
+        )
+
+    if args.requests_per_minute or args.tokens_per_minute:
+        rate_limit.configure_rate_limiter(
+            Operation.LLM,
+            rate_limit.RateLimiter(
+                requests_per_minute=args.requests_per_minute,
+                tokens_per_minute=args.tokens_per_minute,
+            ),
+        )
+
+    context_selector = None
+    if args.context_token_budget:
+        context_selector = ContextSelector(token_budget=args.context_token_budget)
+    context_packer = ContextPacker() if args.pack_context else None
+    map_reduce = MapReduceReader() if args.map_reduce else None
+
+    service = AssessmentService(
+        orchestrator=Orchestrator(max_concurrency=args.max_concurrency),
+        record_loader=lambda path: MedicalRecord.from_pdf(
+            path,
+            context_selector=context_selector,
+            context_packer=context_packer,
+            map_reduce=map_reduce,
+        ),
+        workers=args.workers,
+        queue_size=args.queue_size,
+    )
+    service.warm_up()
+    AssessmentServer(service, host=args.host, port=args.port).serve_forever()
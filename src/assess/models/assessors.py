@@ -1,17 +1,35 @@
+from __future__ import annotations
+
+import asyncio
 from collections import OrderedDict
-from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
-import tomlkit
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 from loguru import logger
 
 from assess.models.llms import LlmType
 from assess.structures import prompts
-from assess.structures.criteria import AssessmentCriteria
+from assess.structures.criteria import AssessmentCriteria, AssessmentMode, SectionGate
 from assess.structures.medical_record import MedicalRecord
+from assess.utils import instrumentation
+from assess.utils.async_tools import llm_request_slot
+from assess.utils.instrumentation import Operation
+from assess.utils.prompt_builder import prompt_builder
+
+# The LLM clients are slow to import, so they are imported on first use
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+    from langchain_core.language_models import BaseChatModel
+    from langchain_openai import ChatOpenAI
+
+DEFAULT_MAX_CONCURRENCY = 4
+FINAL_ASSESSMENT_STAGE = "final_assessment"
+SECTIONS_STAGE = "sections"
+SKIPPED_SECTION_RESPONSE = "[SKIPPED] Not assessed, as the outcome had already been decided by another criteria."
+
+
+def _section_key(name: str) -> str:
+    return f"Assessment for Criteria \"{name.replace('-', ' ').title()}\""
 
 
 class Assessor:
@@ -23,72 +41,555 @@ class Assessor:
         """Performs the assessment"""
         raise NotImplementedError
 
+    async def aassess_criteria(
+        self, criteria: AssessmentCriteria, record: MedicalRecord
+    ) -> Tuple[OrderedDict[str, str], bool]:
+        """Asynchronously performs the assessment"""
+        raise NotImplementedError
+
 
 class GPT4Assessor(Assessor):
-    """Assesses using GPT4"""
+    """Assesses using GPT4, or using `model` if one is given"""
 
-    def __init__(self):
-        self.model = ChatOpenAI(model=LlmType.GPT_4.value)
-        self.engine = OpenAiAssessmentEngine(self.model)
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        model: Optional[BaseChatModel] = None,
+    ):
+        if model is None:
+            from langchain_openai import ChatOpenAI
+
+            model = ChatOpenAI(model=LlmType.GPT_4.value, max_retries=0)
+        self.model = model
+        self.engine = OpenAiAssessmentEngine(
+            self.model, max_concurrency=max_concurrency, llm_type=LlmType.GPT_4
+        )
 
     def assess_criteria(
         self, criteria: AssessmentCriteria, record: MedicalRecord
     ) -> Tuple[OrderedDict[str, str], bool]:
         return self.engine.assess_criteria(criteria, record)
 
+    async def aassess_criteria(
+        self, criteria: AssessmentCriteria, record: MedicalRecord
+    ) -> Tuple[OrderedDict[str, str], bool]:
+        return await self.engine.aassess_criteria(criteria, record)
+
 
 class OpenAiAssessmentEngine:
-    """Engine class to call OpenAI models."""
+    """
+    Engine class to call OpenAI models.
+
+    Each criteria section is assessed independently, so up to `max_concurrency` sections
+    are sent to the model at once. Set it to 1 to assess the sections one at a time.
+
+    A criteria spec can choose how its sections are sent with its `assessment-mode`: as
+    concurrent individual requests (the default), through the model's batch API, or as a
+    single combined request which assesses every section at once.
+
+    Given the `llm_type` of the model, prompts too large for it are refused unsent.
+    """
+
+    def __init__(
+        self,
+        model: ChatOpenAI,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        llm_type: Optional[LlmType] = None,
+    ):
+        if max_concurrency < 1:
+            raise ValueError(
+                f"max_concurrency must be at least 1 (received {max_concurrency})"
+            )
+        from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
+        from langchain_core.prompts import ChatPromptTemplate
+
+        from assess.utils.runnables import RateLimitedRunnable
 
-    def __init__(self, model: ChatOpenAI):
         self.model = model
+        self.max_concurrency = max_concurrency
         self._individual_criteria_prompt = ChatPromptTemplate.from_template(
-            template=prompts.ASSESS_AGAINST_INDIVIDUAL_CRITERIA
+            template=prompts.ASSESS_AGAINST_INDIVIDUAL_CRITERIA.template
+        )
+        self._individual_criteria_chain = RateLimitedRunnable(
+            self._individual_criteria_prompt | self.model | StrOutputParser(),
+            llm_type=llm_type,
+        )
+
+        self._all_criteria_prompt = ChatPromptTemplate.from_template(
+            template=prompts.ASSESS_AGAINST_ALL_CRITERIA.template
         )
-        self._individual_criteria_chain = create_stuff_documents_chain(
-            self.model, self._individual_criteria_prompt
+        self._all_criteria_chain = RateLimitedRunnable(
+            self._all_criteria_prompt | self.model | JsonOutputParser(),
+            llm_type=llm_type,
         )
 
         self._final_assessment = ChatPromptTemplate.from_template(
             template=prompts.FINAL_ASSESSMENT
         )
-        self._final_assessment_chain = (
-            self._final_assessment | self.model | StrOutputParser()
+        self._final_assessment_chain = RateLimitedRunnable(
+            self._final_assessment | self.model | StrOutputParser(), llm_type=llm_type
         )
 
-    def assess_criteria(
-        self, criteria: AssessmentCriteria, record: MedicalRecord
-    ) -> Tuple[OrderedDict[str, str], bool]:
-        result = OrderedDict()
+    def _chain_inputs(self, inputs: Dict) -> Dict:
+        # Every section of a record shares the same rendered prefix, so only the profile
+        # and criteria after it differ
+        return prompt_builder.inputs(
+            prompts.ASSESS_AGAINST_INDIVIDUAL_CRITERIA,
+            inputs["context"],
+            profile=inputs["profile"],
+            criteria=inputs["criteria"],
+        )
 
-        patient_profile = record.extract_patient_profile()
-        logger.info(f"The patient's profile: {tomlkit.dumps(patient_profile)}")
-        assessements_of_each_criteria = OrderedDict()
+    def _assess_individual_criteria(self, inputs: Dict) -> str:
+        logger.info(f"Assessing criteria '{inputs['name']}'...")
+        with instrumentation.stage(inputs["name"]), instrumentation.event(
+            Operation.LLM, inputs["context"]
+        ) as call:
+            response = self._individual_criteria_chain.invoke(
+                self._chain_inputs(inputs), config=call.config
+            )
+        logger.info(f"Assessment response: {response}")
+        return response
+
+    def _assess_all_individual_criteria(self, inputs: List[Dict]) -> List[str]:
+        """Assesses each section, returning the responses in the same order as the inputs."""
+        if self.max_concurrency == 1 or len(inputs) <= 1:
+            return [self._assess_individual_criteria(x) for x in inputs]
+        n_workers = min(self.max_concurrency, len(inputs))
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            futures = [
+                executor.submit(
+                    instrumentation.propagate_context(self._assess_individual_criteria),
+                    x,
+                )
+                for x in inputs
+            ]
+            return [x.result() for x in futures]
+
+    async def _aassess_individual_criteria(
+        self, inputs: Dict, semaphore: asyncio.Semaphore
+    ) -> str:
+        async with semaphore, llm_request_slot():
+            logger.info(f"Assessing criteria '{inputs['name']}'...")
+            with instrumentation.stage(inputs["name"]), instrumentation.event(
+                Operation.LLM, inputs["context"]
+            ) as call:
+                response = await self._individual_criteria_chain.ainvoke(
+                    self._chain_inputs(inputs), config=call.config
+                )
+        logger.info(f"Assessment response: {response}")
+        return response
+
+    async def _aassess_all_individual_criteria(self, inputs: List[Dict]) -> List[str]:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        return list(
+            await asyncio.gather(
+                *(self._aassess_individual_criteria(x, semaphore) for x in inputs)
+            )
+        )
+
+    def _batch_config(self, call: instrumentation.Event) -> Dict:
+        return {**call.config, "max_concurrency": self.max_concurrency}
+
+    def _batch_assess_all_individual_criteria(self, inputs: List[Dict]) -> List[str]:
+        logger.info(f"Assessing {len(inputs)} criteria as a batch...")
+        with instrumentation.stage(SECTIONS_STAGE), instrumentation.event(
+            Operation.LLM
+        ) as call:
+            for x in inputs:
+                call.set_context(x["context"])
+            responses = self._individual_criteria_chain.batch(
+                [self._chain_inputs(x) for x in inputs], config=self._batch_config(call)
+            )
+        logger.info(f"Assessment responses: {responses}")
+        return responses
+
+    async def _abatch_assess_all_individual_criteria(
+        self, inputs: List[Dict]
+    ) -> List[str]:
+        logger.info(f"Assessing {len(inputs)} criteria as a batch...")
+        with instrumentation.stage(SECTIONS_STAGE), instrumentation.event(
+            Operation.LLM
+        ) as call:
+            for x in inputs:
+                call.set_context(x["context"])
+            responses = await self._individual_criteria_chain.abatch(
+                [self._chain_inputs(x) for x in inputs], config=self._batch_config(call)
+            )
+        logger.info(f"Assessment responses: {responses}")
+        return responses
+
+    def _combined_inputs(
+        self, inputs: List[Dict], record: MedicalRecord
+    ) -> Tuple[Dict, List[Document]]:
+        criteria = "\n\n".join(x["criteria"] for x in inputs)
+        context = record.context_for(criteria)
+        chain_inputs = prompt_builder.inputs(
+            prompts.ASSESS_AGAINST_ALL_CRITERIA,
+            context,
+            profile=inputs[0]["profile"],
+            criteria=criteria,
+        )
+        return chain_inputs, context
+
+    def _split_combined_response(
+        self, inputs: List[Dict], response: Dict
+    ) -> List[Optional[str]]:
+        """
+        Returns the response to each section, or None for those the model left out.
+        Raises OutputParserException if the response isn't a JSON object.
+        """
+        from langchain_core.exceptions import OutputParserException
+
+        logger.info(f"Combined assessment response: {response}")
+        if not isinstance(response, dict):
+            raise OutputParserException(
+                f"Expected a JSON object with a response to each criteria, received "
+                f"{type(response).__name__}"
+            )
+        return [
+            None if response.get(x["name"]) is None else str(response[x["name"]])
+            for x in inputs
+        ]
+
+    def _missing_sections(
+        self, inputs: List[Dict], responses: List[Optional[str]]
+    ) -> List[Dict]:
+        missing = [x for x, response in zip(inputs, responses) if response is None]
+        if missing:
+            logger.warning(
+                f"The combined assessment left out criteria "
+                f"{[x['name'] for x in missing]}. Assessing them individually instead."
+            )
+        return missing
+
+    def _fill_missing_sections(
+        self, responses: List[Optional[str]], reassessed: List[str]
+    ) -> List[str]:
+        reassessed = iter(reassessed)
+        return [next(reassessed) if x is None else x for x in responses]
+
+    def _assess_all_criteria_at_once(
+        self, inputs: List[Dict], record: MedicalRecord
+    ) -> List[str]:
+        logger.info(f"Assessing {len(inputs)} criteria in a single request...")
+        chain_inputs, context = self._combined_inputs(inputs, record)
+        with instrumentation.stage(SECTIONS_STAGE), instrumentation.event(
+            Operation.LLM, context
+        ) as call:
+            response = self._all_criteria_chain.invoke(chain_inputs, config=call.config)
+        responses = self._split_combined_response(inputs, response)
+        missing = self._missing_sections(inputs, responses)
+        if not missing:
+            return responses
+        return self._fill_missing_sections(
+            responses, self._assess_all_individual_criteria(missing)
+        )
+
+    async def _aassess_all_criteria_at_once(
+        self, inputs: List[Dict], record: MedicalRecord
+    ) -> List[str]:
+        logger.info(f"Assessing {len(inputs)} criteria in a single request...")
+        chain_inputs, context = self._combined_inputs(inputs, record)
+        async with llm_request_slot():
+            with instrumentation.stage(SECTIONS_STAGE), instrumentation.event(
+                Operation.LLM, context
+            ) as call:
+                response = await self._all_criteria_chain.ainvoke(
+                    chain_inputs, config=call.config
+                )
+        responses = self._split_combined_response(inputs, response)
+        missing = self._missing_sections(inputs, responses)
+        if not missing:
+            return responses
+        return self._fill_missing_sections(
+            responses, await self._aassess_all_individual_criteria(missing)
+        )
+
+    def _assess_sections(
+        self, criteria: AssessmentCriteria, inputs: List[Dict], record: MedicalRecord
+    ) -> List[str]:
+        from langchain_core.exceptions import OutputParserException
+
+        mode = criteria.get_assessment_mode()
+        if mode == AssessmentMode.BATCH:
+            return self._batch_assess_all_individual_criteria(inputs)
+        if mode == AssessmentMode.COMBINED:
+            try:
+                return self._assess_all_criteria_at_once(inputs, record)
+            except OutputParserException as e:
+                logger.warning(
+                    f"Could not parse the combined assessment ({e}). "
+                    "Assessing each criteria individually instead."
+                )
+        return self._assess_all_individual_criteria(inputs)
+
+    async def _aassess_sections(
+        self, criteria: AssessmentCriteria, inputs: List[Dict], record: MedicalRecord
+    ) -> List[str]:
+        from langchain_core.exceptions import OutputParserException
+
+        mode = criteria.get_assessment_mode()
+        if mode == AssessmentMode.BATCH:
+            return await self._abatch_assess_all_individual_criteria(inputs)
+        if mode == AssessmentMode.COMBINED:
+            try:
+                return await self._aassess_all_criteria_at_once(inputs, record)
+            except OutputParserException as e:
+                logger.warning(
+                    f"Could not parse the combined assessment ({e}). "
+                    "Assessing each criteria individually instead."
+                )
+        return await self._aassess_all_individual_criteria(inputs)
+
+    def _gate_decision(
+        self, criteria: AssessmentCriteria, name: str, response: str
+    ) -> Optional[str]:
+        """Returns the final assessment if this section's response alone decides it."""
+        gate = criteria.get_section_gate(name)
+        met = response.strip().startswith("[YES]")
+        title = name.replace("-", " ").title()
+        if gate == SectionGate.REQUIRED and not met:
+            return (
+                f'[NO] The patient does not meet the required criteria "{title}", '
+                "so they are not eligible for the procedure."
+            )
+        if gate == SectionGate.SUFFICIENT and met:
+            return (
+                f'[YES] The patient meets the criteria "{title}", '
+                "which alone makes them eligible for the procedure."
+            )
+        return None
+
+    def _decide_gates(
+        self,
+        criteria: AssessmentCriteria,
+        inputs: List[Dict],
+        responses: Dict[str, str],
+    ) -> Optional[str]:
+        """
+        Returns the final assessment if the gating responses so far decide it. A failed
+        required section denies at once, but a met sufficient section only approves once
+        every required section has been met, so that the outcome never depends on which
+        section's response arrives first.
+        """
+        decisions = {
+            name: self._gate_decision(criteria, name, response)
+            for name, response in responses.items()
+        }
+        required = [
+            x["name"]
+            for x in inputs
+            if criteria.get_section_gate(x["name"]) == SectionGate.REQUIRED
+        ]
+        for name in required:
+            if decisions.get(name) is not None:
+                return decisions[name]
+        if any(name not in responses for name in required):
+            return None
+        for x in inputs:
+            if decisions.get(x["name"]) is not None:
+                return decisions[x["name"]]
+        return None
+
+    def _split_gating_inputs(
+        self, criteria: AssessmentCriteria, inputs: List[Dict]
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """Splits the sections into the gating sections and the rest, in evaluation order."""
+        by_name = {x["name"]: x for x in inputs}
+        ordered = [by_name[name] for name, _ in criteria.get_evaluation_order()]
+        gates = [x for x in ordered if criteria.get_section_gate(x["name"])]
+        rest = [x for x in ordered if not criteria.get_section_gate(x["name"])]
+        return gates, rest
+
+    def _assess_gating_sections(
+        self, criteria: AssessmentCriteria, inputs: List[Dict]
+    ) -> Tuple[Dict[str, str], Optional[str]]:
+        """
+        Assesses the gating sections, starting them in evaluation order, until they decide
+        the outcome. Sections which haven't started by then are cancelled.
+        """
+        responses, decision = {}, None
+        n_workers = min(self.max_concurrency, len(inputs))
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            futures = {
+                executor.submit(
+                    instrumentation.propagate_context(self._assess_individual_criteria),
+                    x,
+                ): x["name"]
+                for x in inputs
+            }
+            for future in as_completed(futures):
+                responses[futures[future]] = future.result()
+                decision = self._decide_gates(criteria, inputs, responses)
+                if decision is not None:
+                    break
+            for future in futures:
+                future.cancel()
+
+        # Calls in flight when the outcome was decided have been paid for, so keep them
+        for future, name in futures.items():
+            if future.cancelled() or name in responses or future.exception():
+                continue
+            responses[name] = future.result()
+        return responses, decision
+
+    async def _aassess_gating_sections(
+        self, criteria: AssessmentCriteria, inputs: List[Dict]
+    ) -> Tuple[Dict[str, str], Optional[str]]:
+        """
+        Assesses the gating sections, starting them in evaluation order, until they decide
+        the outcome. Sections still waiting or in flight by then are cancelled.
+        """
+        responses, decision = {}, None
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        tasks = {
+            asyncio.ensure_future(self._aassess_individual_criteria(x, semaphore)): x[
+                "name"
+            ]
+            for x in inputs
+        }
+        pending = set(tasks)
+        try:
+            while pending and decision is None:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in (x for x in tasks if x in done):
+                    responses[tasks[task]] = task.result()
+                decision = self._decide_gates(criteria, inputs, responses)
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        return responses, decision
+
+    def _order_responses(
+        self, inputs: List[Dict], responses: Dict[str, str]
+    ) -> List[str]:
+        skipped = [x["name"] for x in inputs if x["name"] not in responses]
+        if skipped:
+            logger.info(f"Outcome decided early, skipping criteria {skipped}")
+        return [responses.get(x["name"], SKIPPED_SECTION_RESPONSE) for x in inputs]
+
+    def _assess_gated_sections(
+        self, criteria: AssessmentCriteria, inputs: List[Dict], record: MedicalRecord
+    ) -> Tuple[List[str], Optional[str]]:
+        """
+        Assesses the gating sections first and the rest only if the gates didn't decide
+        the outcome. Returns the responses in section order, with skipped sections marked,
+        and the final assessment if it was decided early.
+        """
+        gates, rest = self._split_gating_inputs(criteria, inputs)
+        responses, decision = self._assess_gating_sections(criteria, gates)
+        if decision is None and rest:
+            rest_responses = self._assess_sections(criteria, rest, record)
+            responses.update(zip((x["name"] for x in rest), rest_responses))
+        return self._order_responses(inputs, responses), decision
+
+    async def _aassess_gated_sections(
+        self, criteria: AssessmentCriteria, inputs: List[Dict], record: MedicalRecord
+    ) -> Tuple[List[str], Optional[str]]:
+        gates, rest = self._split_gating_inputs(criteria, inputs)
+        responses, decision = await self._aassess_gating_sections(criteria, gates)
+        if decision is None and rest:
+            rest_responses = await self._aassess_sections(criteria, rest, record)
+            responses.update(zip((x["name"] for x in rest), rest_responses))
+        return self._order_responses(inputs, responses), decision
+
+    def _build_section_inputs(
+        self, criteria: AssessmentCriteria, record: MedicalRecord, patient_profile: Dict
+    ) -> List[Dict]:
+        import tomlkit
+
+        profile = tomlkit.dumps(patient_profile)
+        logger.info(f"The patient's profile: {profile}")
+
+        inputs = []
         for criteria_name, description in criteria.get_sections():
-            logger.info(f"Assessing criteria '{criteria_name}'...")
             criteria_string = f"{criteria_name}:\n{description}"
-            response = self._individual_criteria_chain.invoke(
+            inputs.append(
                 {
-                    "profile": tomlkit.dumps(patient_profile),
+                    "name": criteria_name,
+                    "profile": profile,
                     "criteria": criteria_string,
-                    "context": record.pages,
+                    "context": record.context_for(criteria_string),
                 }
             )
-            logger.info(f"Assessment response: {response}")
-            key = (
-                f"Assessment for Criteria \"{criteria_name.replace('-', ' ').title()}\""
-            )
-            assessements_of_each_criteria[key] = response
+        return inputs
+
+    def _key_assessments(
+        self, inputs: List[Dict], responses: List[str]
+    ) -> OrderedDict[str, str]:
+        assessements_of_each_criteria = OrderedDict()
+        for x, response in zip(inputs, responses):
+            assessements_of_each_criteria[_section_key(x["name"])] = response
+        return assessements_of_each_criteria
 
+    def _final_assessment_inputs(
+        self, criteria: AssessmentCriteria, assessements_of_each_criteria: OrderedDict
+    ) -> Dict:
         logger.info("Performing final assessment...")
         assessments = "\n".join(assessements_of_each_criteria.values())
-        final_assessment = self._final_assessment_chain.invoke(
-            {"instructions": criteria.get_description(), "assessments": assessments}
-        )
-        logger.info(f"Final assessment: {final_assessment}")
+        return {"instructions": criteria.get_description(), "assessments": assessments}
 
+    def _collect_results(
+        self, assessements_of_each_criteria: OrderedDict, final_assessment: str
+    ) -> Tuple[OrderedDict[str, str], bool]:
+        logger.info(f"Final assessment: {final_assessment}")
+        result = OrderedDict()
         result["Final Assessment"] = final_assessment
         for key, val in assessements_of_each_criteria.items():
             result[key] = val
 
         return result, final_assessment.startswith("[YES]")
+
+    def assess_criteria(
+        self, criteria: AssessmentCriteria, record: MedicalRecord
+    ) -> Tuple[OrderedDict[str, str], bool]:
+        patient_profile = record.extract_patient_profile()
+        inputs = self._build_section_inputs(criteria, record, patient_profile)
+        if criteria.has_gates():
+            responses, decision = self._assess_gated_sections(criteria, inputs, record)
+        else:
+            responses, decision = self._assess_sections(criteria, inputs, record), None
+        assessements_of_each_criteria = self._key_assessments(inputs, responses)
+        if decision is not None:
+            return self._collect_results(assessements_of_each_criteria, decision)
+
+        with instrumentation.stage(FINAL_ASSESSMENT_STAGE), instrumentation.event(
+            Operation.LLM
+        ) as call:
+            final_assessment = self._final_assessment_chain.invoke(
+                self._final_assessment_inputs(criteria, assessements_of_each_criteria),
+                config=call.config,
+            )
+        return self._collect_results(assessements_of_each_criteria, final_assessment)
+
+    async def aassess_criteria(
+        self, criteria: AssessmentCriteria, record: MedicalRecord
+    ) -> Tuple[OrderedDict[str, str], bool]:
+        patient_profile = await record.aextract_patient_profile()
+        inputs = self._build_section_inputs(criteria, record, patient_profile)
+        if criteria.has_gates():
+            responses, decision = await self._aassess_gated_sections(
+                criteria, inputs, record
+            )
+        else:
+            responses = await self._aassess_sections(criteria, inputs, record)
+            decision = None
+        assessements_of_each_criteria = self._key_assessments(inputs, responses)
+        if decision is not None:
+            return self._collect_results(assessements_of_each_criteria, decision)
+
+        async with llm_request_slot():
+            with instrumentation.stage(FINAL_ASSESSMENT_STAGE), instrumentation.event(
+                Operation.LLM
+            ) as call:
+                final_assessment = await self._final_assessment_chain.ainvoke(
+                    self._final_assessment_inputs(
+                        criteria, assessements_of_each_criteria
+                    ),
+                    config=call.config,
+                )
+        return self._collect_results(assessements_of_each_criteria, final_assessment)
@@ -0,0 +1,252 @@
+import csv
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from assess.models.map_reduce import MapReduceReader
+from assess.models.orchestrator import Orchestrator
+from assess.structures.criteria import AssessmentCriteria
+from assess.structures.medical_record import MedicalRecord
+from assess.structures.report import AssessmentReport, render_markdown, write_report
+from assess.utils import instrumentation, serialize
+from assess.utils.context_packing import ContextPacker
+from assess.utils.instrumentation import DeadlineExceeded, Trace
+from assess.utils.retrieval import ContextSelector
+
+
+class BatchStatus(Enum):
+    APPROVED = "APPROVED"
+    DENIED = "DENIED"
+    ERROR = "ERROR"
+    TIMEOUT = "TIMEOUT"
+
+
+class BatchConstant(Enum):
+    REPORT_SUFFIX = "_Assessment"
+    SUMMARY_FNAME = "summary"
+    SUMMARY_FIELDS = ("record", "status", "seconds", "report", "error")
+    TRACE_SUFFIX = "_trace.json"
+    METRICS_FNAME = "metrics.json"
+    LOAD_STAGE = "load_record"
+
+
+class RecordResult:
+    """The outcome of assessing a single record as part of a batch."""
+
+    def __init__(
+        self,
+        record: str,
+        status: BatchStatus,
+        seconds: float,
+        report: Optional[str] = None,
+        error: Optional[str] = None,
+        trace: Optional[Trace] = None,
+    ):
+        self.record = record
+        self.status = status
+        self.seconds = seconds
+        self.report = report
+        self.error = error
+        self.trace = trace
+
+    def to_dict(self) -> Dict:
+        return {
+            "record": self.record,
+            "status": self.status.value,
+            "seconds": round(self.seconds, 3),
+            "report": self.report,
+            "error": self.error,
+        }
+
+
+def list_records(path: str) -> List[str]:
+    """
+    Lists the records to assess. `path` is either a directory, in which case every PDF in
+    it is assessed, or a manifest: a JSON list or a text file with one record path per
+    line. Relative paths in a manifest are resolved against the manifest's directory.
+    """
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(path, x)
+            for x in os.listdir(path)
+            if x.lower().endswith(".pdf")
+        )
+
+    if path.lower().endswith(".json"):
+        entries = serialize.load_json_file(path)
+    else:
+        entries = [x.strip() for x in serialize.load_text_file(path).splitlines()]
+    manifest_dir = os.path.dirname(os.path.abspath(path))
+    return [os.path.join(manifest_dir, x) for x in entries if x]
+
+
+def write_markdown_report(report: AssessmentReport, output_path: str):
+    write_report(report, output_path, render=render_markdown)
+
+
+class BatchRunner:
+    """
+    Assesses many records against one criteria using a single, shared set of clients.
+    Records run in parallel on `workers` threads. A record which takes longer than
+    `timeout` seconds is stopped at its next stage or LLM call, reported as TIMEOUT, and
+    no report is written for it. The call in flight when the time runs out is finished,
+    so a record can overrun its timeout by the length of one call.
+
+    Reports are named after their record's file. Records in different directories with
+    the same file name are numbered in the order they are listed, as `<name>_2` and on.
+
+    With `trace` set, each record's trace of LLM calls is written next to its report, and
+    histograms of every stage's metrics across the batch are written to metrics.json.
+    """
+
+    def __init__(
+        self,
+        criteria: AssessmentCriteria,
+        orchestrator: Optional[Orchestrator] = None,
+        record_loader: Optional[Callable[[str], MedicalRecord]] = None,
+        report_writer: Callable[[AssessmentReport, str], None] = write_markdown_report,
+        report_extension: str = ".md",
+        workers: int = 4,
+        timeout: Optional[float] = None,
+        context_selector: Optional[ContextSelector] = None,
+        trace: bool = False,
+        pdf_workers: int = 1,
+        context_packer: Optional[ContextPacker] = None,
+        map_reduce: Optional[MapReduceReader] = None,
+    ):
+        if workers < 1:
+            raise ValueError(f"workers must be at least 1 (received {workers})")
+        self.criteria = criteria
+        self.orchestrator = orchestrator or Orchestrator()
+        self.record_loader = record_loader or self._default_record_loader(
+            context_selector, pdf_workers, context_packer, map_reduce
+        )
+        self.report_writer = report_writer
+        self.report_extension = report_extension
+        self.workers = workers
+        self.timeout = timeout
+        self.trace = trace
+
+    @staticmethod
+    def _default_record_loader(
+        context_selector: Optional[ContextSelector],
+        pdf_workers: int,
+        context_packer: Optional[ContextPacker],
+        map_reduce: Optional[MapReduceReader],
+    ) -> Callable[[str], MedicalRecord]:
+        return lambda path: MedicalRecord.from_pdf(
+            path,
+            context_selector=context_selector,
+            pdf_workers=pdf_workers,
+            context_packer=context_packer,
+            map_reduce=map_reduce,
+        )
+
+    @staticmethod
+    def _record_stems(record_paths: List[str]) -> List[str]:
+        """The name of each record's file, numbered where several records share one."""
+        stems = [os.path.splitext(os.path.basename(x))[0] for x in record_paths]
+        taken = set(stems)
+        seen = Counter()
+        result = []
+        for stem in stems:
+            seen[stem] += 1
+            if seen[stem] == 1:
+                result.append(stem)
+                continue
+            n = seen[stem]
+            while f"{stem}_{n}" in taken:
+                n += 1
+            seen[stem] = n
+            taken.add(f"{stem}_{n}")
+            result.append(f"{stem}_{n}")
+        return result
+
+    def _assess(self, record_path: str, stem: str, write_loc: str) -> Tuple[str, bool]:
+        with instrumentation.stage(BatchConstant.LOAD_STAGE.value):
+            record = self.record_loader(record_path)
+        report = self.orchestrator.build_report(criteria=self.criteria, record=record)
+        # A record which finished its last call after the deadline still timed out
+        instrumentation.check_deadline()
+        fname = f"{stem}{BatchConstant.REPORT_SUFFIX.value}{self.report_extension}"
+        report_path = os.path.join(write_loc, fname)
+        self.report_writer(report, report_path)
+        return report_path, report.approved
+
+    def _assess_with_timeout(
+        self, record_path: str, stem: str, write_loc: str
+    ) -> RecordResult:
+        logger.info(f"Assessing record '{record_path}'...")
+        start = time.perf_counter()
+        with instrumentation.tracing(record_path) as trace:
+            try:
+                with instrumentation.deadline(self.timeout):
+                    report_path, approved = self._assess(record_path, stem, write_loc)
+                status = BatchStatus.APPROVED if approved else BatchStatus.DENIED
+                result = RecordResult(
+                    record_path, status, time.perf_counter() - start, report=report_path
+                )
+            except DeadlineExceeded:
+                result = RecordResult(
+                    record_path,
+                    BatchStatus.TIMEOUT,
+                    time.perf_counter() - start,
+                    error=f"Timed out after {self.timeout} seconds",
+                )
+            except Exception as e:
+                result = RecordResult(
+                    record_path,
+                    BatchStatus.ERROR,
+                    time.perf_counter() - start,
+                    error=f"{type(e).__name__}: {e}",
+                )
+        result.trace = trace
+        if self.trace:
+            trace_path = os.path.join(
+                write_loc, f"{stem}{BatchConstant.TRACE_SUFFIX.value}"
+            )
+            serialize.write_json_file(trace.to_dict(), trace_path)
+        logger.info(
+            f"Finished record '{record_path}' in {result.seconds:.1f}s: {result.status.value}"
+        )
+        return result
+
+    def run(self, record_paths: List[str], write_loc: str) -> List[RecordResult]:
+        """Assesses each record, writing its report and a summary to `write_loc`."""
+        os.makedirs(write_loc, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(
+                executor.map(
+                    lambda x, stem: self._assess_with_timeout(x, stem, write_loc),
+                    record_paths,
+                    self._record_stems(record_paths),
+                )
+            )
+        write_summary(results, write_loc)
+        if self.trace:
+            write_metrics(results, write_loc)
+        return results
+
+
+def write_summary(results: List[RecordResult], write_loc: str):
+    """Writes the status and timing of each record as both JSON and CSV."""
+    rows = [x.to_dict() for x in results]
+    fname = BatchConstant.SUMMARY_FNAME.value
+    serialize.write_json_file(rows, os.path.join(write_loc, f"{fname}.json"))
+    with open(os.path.join(write_loc, f"{fname}.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=BatchConstant.SUMMARY_FIELDS.value)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_metrics(results: List[RecordResult], write_loc: str):
+    """Writes histograms of each stage's metrics across the records of a batch."""
+    metrics = instrumentation.aggregate_traces(x.trace for x in results if x.trace)
+    serialize.write_json_file(
+        metrics, os.path.join(write_loc, BatchConstant.METRICS_FNAME.value)
+    )
@@ -1,16 +1,27 @@
-from typing import Dict, List, Optional
+from __future__ import annotations
 
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_community.tools import DuckDuckGoSearchRun
-from langchain_core.documents import Document
-from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
-from langchain_core.pydantic_v1 import BaseModel
-from langchain_openai import ChatOpenAI
-from pydantic.v1.error_wrappers import ValidationError
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Type
 
 from assess.models.llms import LlmType
 from assess.structures import prompts
+from assess.utils import instrumentation, rate_limit, retry_tools
+from assess.utils.async_tools import llm_request_slot
+from assess.utils.instrumentation import Operation
+from assess.utils.prompt_builder import PREFIX_VARIABLE, prompt_builder
+
+# The LLM and search clients are slow to import, so they are imported on first use
+if TYPE_CHECKING:
+    from langchain_community.tools import DuckDuckGoSearchRun
+    from langchain_core.documents import Document
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.pydantic_v1 import BaseModel
+    from langchain_core.runnables import Runnable
+    from langchain_openai import ChatOpenAI
+
+# Chains kept by the chain registry; a few are built per model client
+DEFAULT_MAX_CHAINS = 128
 
 
 class MissingApiKeyExcepetion(Exception):
@@ -22,8 +33,28 @@ class MissingApiKeyExcepetion(Exception):
 class SingleDocumentInterpreter:
     """Interface class for advisors."""
 
-    def __init__(self):
-        self.search = DuckDuckGoSearchRun()
+    # The model the advisor asks, whose prompt budget its prompts must fit
+    llm_type: Optional[LlmType] = None
+    _search: Optional[DuckDuckGoSearchRun] = None
+    _search_lock = threading.Lock()
+
+    def __init__(self, search: Optional[Any] = None):
+        self._own_search = search
+
+    @property
+    def search(self) -> DuckDuckGoSearchRun:
+        """
+        The search tool. Unless one was given to this interpreter, it is created on first
+        use and shared by every interpreter.
+        """
+        if self._own_search is not None:
+            return self._own_search
+        with SingleDocumentInterpreter._search_lock:
+            if SingleDocumentInterpreter._search is None:
+                from langchain_community.tools import DuckDuckGoSearchRun
+
+                SingleDocumentInterpreter._search = DuckDuckGoSearchRun()
+            return SingleDocumentInterpreter._search
 
     def ask(
         self,
@@ -45,16 +76,59 @@ class SingleDocumentInterpreter:
 
     def web_search(self, query: str) -> str:
         """Performs a web search and returns the results as a string."""
+        with instrumentation.event(Operation.WEB_SEARCH):
+            return self._run_search(query)
+
+    @retry_tools.retry_transient_failures
+    def _run_search(self, query: str) -> str:
+        rate_limit.acquire(Operation.WEB_SEARCH)
         return self.search.run(query)
 
+    @retry_tools.retry_transient_failures
+    async def _arun_search(self, query: str) -> str:
+        await rate_limit.aacquire(Operation.WEB_SEARCH)
+        return await self.search.arun(query)
+
+    async def aask(
+        self,
+        prompt: str,
+        context: Optional[List[Document]] = None,
+        search_results: Optional[str] = None,
+    ) -> str:
+        """Asynchronously asks an arbitrary prompt and returns a string."""
+        raise NotImplementedError
+
+    async def aextract_json(
+        self,
+        prompt: str,
+        json_structure: BaseModel,
+        context: Optional[List[Document]] = None,
+    ) -> Dict:
+        """Asynchronously extracts JSON data"""
+        raise NotImplementedError
+
+    async def aweb_search(self, query: str) -> str:
+        """Asynchronously performs a web search and returns the results as a string."""
+        async with llm_request_slot():
+            with instrumentation.event(Operation.WEB_SEARCH):
+                return await self._arun_search(query)
+
 
 class GPT4SingleDocumentInterpreter(SingleDocumentInterpreter):
-    """An SingleDocumentInterpreter backed by GPT-4"""
+    """An SingleDocumentInterpreter backed by GPT-4, or by `model` if one is given."""
+
+    llm_type = LlmType.GPT_4
 
-    def __init__(self):
-        super().__init__()
-        self.model = ChatOpenAI(model=LlmType.GPT_4.value)
-        self.engine = OpenAiEngine(self.model)
+    def __init__(
+        self, model: Optional[BaseChatModel] = None, search: Optional[Any] = None
+    ):
+        super().__init__(search=search)
+        if model is None:
+            from langchain_openai import ChatOpenAI
+
+            model = ChatOpenAI(model=LlmType.GPT_4.value, max_retries=0)
+        self.model = model
+        self.engine = OpenAiEngine(self.model, llm_type=self.llm_type)
 
     def ask(
         self,
@@ -62,7 +136,7 @@ class GPT4SingleDocumentInterpreter(SingleDocumentInterpreter):
         context: Optional[List[Document]] = None,
         search_results: Optional[str] = None,
     ) -> str:
-        return self.engine.ask(s, context)
+        return self.engine.ask(s, context, search_results)
 
     def extract_json(
         self,
@@ -72,14 +146,38 @@ class GPT4SingleDocumentInterpreter(SingleDocumentInterpreter):
     ) -> Dict:
         return self.engine.extract_json(prompt, json_structure, context)
 
+    async def aask(
+        self,
+        s: str,
+        context: Optional[List[Document]] = None,
+        search_results: Optional[str] = None,
+    ) -> str:
+        return await self.engine.aask(s, context, search_results)
+
+    async def aextract_json(
+        self,
+        prompt: str,
+        json_structure: BaseModel,
+        context: Optional[List[Document]] = None,
+    ) -> Dict:
+        return await self.engine.aextract_json(prompt, json_structure, context)
+
 
 class GPT3_5SingleDocumentInterpreter(SingleDocumentInterpreter):
-    """An SingleDocumentInterpreter backed by GPT-3.5"""
+    """An SingleDocumentInterpreter backed by GPT-3.5, or by `model` if one is given."""
 
-    def __init__(self):
-        super().__init__()
-        self.model = ChatOpenAI(model=LlmType.GPT_3_5.value)
-        self.engine = OpenAiEngine(self.model)
+    llm_type = LlmType.GPT_3_5
+
+    def __init__(
+        self, model: Optional[BaseChatModel] = None, search: Optional[Any] = None
+    ):
+        super().__init__(search=search)
+        if model is None:
+            from langchain_openai import ChatOpenAI
+
+            model = ChatOpenAI(model=LlmType.GPT_3_5.value, max_retries=0)
+        self.model = model
+        self.engine = OpenAiEngine(self.model, llm_type=self.llm_type)
 
     def ask(
         self,
@@ -87,7 +185,7 @@ class GPT3_5SingleDocumentInterpreter(SingleDocumentInterpreter):
         context: Optional[List[Document]] = None,
         search_results: Optional[str] = None,
     ) -> str:
-        return self.engine.ask(s, context)
+        return self.engine.ask(s, context, search_results)
 
     def extract_json(
         self,
@@ -97,55 +195,169 @@ class GPT3_5SingleDocumentInterpreter(SingleDocumentInterpreter):
     ) -> Dict:
         return self.engine.extract_json(prompt, json_structure, context)
 
+    async def aask(
+        self,
+        s: str,
+        context: Optional[List[Document]] = None,
+        search_results: Optional[str] = None,
+    ) -> str:
+        return await self.engine.aask(s, context, search_results)
+
+    async def aextract_json(
+        self,
+        prompt: str,
+        json_structure: BaseModel,
+        context: Optional[List[Document]] = None,
+    ) -> Dict:
+        return await self.engine.aextract_json(prompt, json_structure, context)
+
+
+class ChainRegistry:
+    """
+    Builds each chain once and hands the same chain to every caller which asks for it.
+    Chains are keyed by the model client, the prompt template, the JSON schema they
+    extract and the model type they are budgeted for. At most `max_entries` chains are
+    kept, dropping the least recently used, so that clients made per request don't
+    accumulate. Each chain holds a reference to its client, so a client's id stays unique
+    for as long as its chains are registered.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_CHAINS):
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be at least 1 (received {max_entries})")
+        self.max_entries = max_entries
+        self._chains: OrderedDict[
+            Tuple[int, str, Optional[Type[BaseModel]], Optional[LlmType]], Runnable
+        ] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        model: ChatOpenAI,
+        template: str,
+        json_structure: Optional[Type[BaseModel]],
+        build: Callable[[], Runnable],
+        llm_type: Optional[LlmType] = None,
+    ) -> Runnable:
+        key = (id(model), template, json_structure, llm_type)
+        with self._lock:
+            if key in self._chains:
+                self._chains.move_to_end(key)
+            else:
+                self._chains[key] = build()
+                while len(self._chains) > self.max_entries:
+                    self._chains.popitem(last=False)
+            return self._chains[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._chains)
+
+    def clear(self):
+        with self._lock:
+            self._chains.clear()
+
+
+chain_registry = ChainRegistry()
+
 
 class OpenAiEngine:
+    """
+    Asks the model about a record. Prompts with context begin with the record, rendered
+    once by the prompt builder and shared between every prompt about the same record.
+    Given the `llm_type` of the model, prompts too large for it are refused unsent.
+    """
+
+    def __init__(self, model: ChatOpenAI, llm_type: Optional[LlmType] = None):
+        from langchain_core.output_parsers import StrOutputParser
+        from langchain_core.prompts import ChatPromptTemplate
+
+        from assess.utils.runnables import RateLimitedRunnable
 
-    def __init__(self, model: ChatOpenAI):
         self.model = model
+        self.llm_type = llm_type
         self._basic_prompt = ChatPromptTemplate.from_template(
             template=prompts.BASIC_NO_CONTEXT
         )
-        self._basic_chain = self._basic_prompt | self.model | StrOutputParser()
+        self._basic_chain = RateLimitedRunnable(
+            self._basic_prompt | self.model | StrOutputParser(), llm_type=llm_type
+        )
 
         self._context_prompt = ChatPromptTemplate.from_template(
-            template=prompts.BASIC_CONTEXT
+            template=prompts.BASIC_CONTEXT.template
         )
-        self._context_chain = create_stuff_documents_chain(
-            self.model, prompt=self._context_prompt
+        self._context_chain = RateLimitedRunnable(
+            self._context_prompt | self.model | StrOutputParser(), llm_type=llm_type
         )
 
-        self._context_and_search_prompt = ChatPromptTemplate.from_template(
-            template=prompts.CONTEXT_AND_SEARCH_RESULTS
+        self._search_prompt = ChatPromptTemplate.from_template(
+            template=prompts.SEARCH_RESULTS_ONLY
         )
-        self._context_and_search_chain = create_stuff_documents_chain(
-            self.model, prompt=self._context_and_search_prompt
+        self._search_chain = RateLimitedRunnable(
+            self._search_prompt | self.model | StrOutputParser(), llm_type=llm_type
         )
 
-        self._assessment_prompt = ChatPromptTemplate.from_template(
-            template=prompts.ASSESS_AGAINST_INDIVIDUAL_CRITERIA
+        self._context_and_search_prompt = ChatPromptTemplate.from_template(
+            template=prompts.CONTEXT_AND_SEARCH_RESULTS.template
         )
-        self._assessment_chain = create_stuff_documents_chain(
-            self.model, self._assessment_prompt
+        self._context_and_search_chain = RateLimitedRunnable(
+            self._context_and_search_prompt | self.model | StrOutputParser(),
+            llm_type=llm_type,
         )
 
-    def ask(
+    def _select_ask_chain(
         self,
         s: str,
         context: Optional[List[Document]] = None,
         search_results: Optional[str] = None,
-    ) -> str:
-        if not context:
-            return self._basic_chain.invoke({"question": s})
-        elif context and not search_results:
-            return self._context_chain.invoke({"question": s, "context": context})
-        elif not context and search_results:
-            return self._context_chain.invoke(
-                {"question": s, "context": search_results}
+    ) -> Tuple[Runnable, Dict]:
+        if context and search_results:
+            return self._context_and_search_chain, prompt_builder.inputs(
+                prompts.CONTEXT_AND_SEARCH_RESULTS,
+                context,
+                question=s,
+                search_result=search_results,
             )
-        else:
-            return self._context_and_search_prompt(
-                {"question": s, "context": context, "search_results": search_results}
+        elif context:
+            return self._context_chain, prompt_builder.inputs(
+                prompts.BASIC_CONTEXT, context, question=s
             )
+        elif search_results:
+            return self._search_chain, {"question": s, "search_result": search_results}
+        else:
+            return self._basic_chain, {"question": s}
+
+    def ask(
+        self,
+        s: str,
+        context: Optional[List[Document]] = None,
+        search_results: Optional[str] = None,
+    ) -> str:
+        chain, inputs = self._select_ask_chain(s, context, search_results)
+        with instrumentation.event(Operation.LLM, context) as call:
+            call.set_context(search_results)
+            return chain.invoke(inputs, config=call.config)
+
+    async def aask(
+        self,
+        s: str,
+        context: Optional[List[Document]] = None,
+        search_results: Optional[str] = None,
+    ) -> str:
+        chain, inputs = self._select_ask_chain(s, context, search_results)
+        async with llm_request_slot():
+            with instrumentation.event(Operation.LLM, context) as call:
+                call.set_context(search_results)
+                return await chain.ainvoke(inputs, config=call.config)
+
+    def _get_json_extraction_chain(self, json_structure: BaseModel) -> Runnable:
+        return chain_registry.get(
+            self.model,
+            prompts.JSON_EXTRACTION_PROMPT.template,
+            json_structure,
+            lambda: self._build_json_extraction_chain(json_structure),
+            llm_type=self.llm_type,
+        )
 
     def extract_json(
         self,
@@ -153,15 +365,42 @@ class OpenAiEngine:
         json_structure: BaseModel,
         context: Optional[List[Document]] = None,
     ) -> Dict:
+        chain = self._get_json_extraction_chain(json_structure)
+        inputs = prompt_builder.inputs(
+            prompts.JSON_EXTRACTION_PROMPT, context or [], prompt=prompt
+        )
+        with instrumentation.event(Operation.LLM, context) as call:
+            return chain.invoke(inputs, config=call.config)
+
+    async def aextract_json(
+        self,
+        prompt: str,
+        json_structure: BaseModel,
+        context: Optional[List[Document]] = None,
+    ) -> Dict:
+        chain = self._get_json_extraction_chain(json_structure)
+        inputs = prompt_builder.inputs(
+            prompts.JSON_EXTRACTION_PROMPT, context or [], prompt=prompt
+        )
+        async with llm_request_slot():
+            with instrumentation.event(Operation.LLM, context) as call:
+                return await chain.ainvoke(inputs, config=call.config)
+
+    def _build_json_extraction_chain(self, json_structure: BaseModel) -> Runnable:
+        from langchain_core.output_parsers import JsonOutputParser
+        from langchain_core.prompts import PromptTemplate
+
+        from assess.utils.runnables import RateLimitedRunnable
+
         parser = JsonOutputParser(pydantic_object=json_structure)
-        prompt = PromptTemplate(
-            template=prompts.JSON_EXTRACTION_PROMPT,
-            input_variables=["prompt", "context"],
+        template = PromptTemplate(
+            template=prompts.JSON_EXTRACTION_PROMPT.template,
+            input_variables=[PREFIX_VARIABLE, "prompt"],
             partial_variables={"format_instructions": parser.get_format_instructions()},
         )
-        chain = create_stuff_documents_chain(self.model, prompt) | parser
-        result = chain.invoke({"prompt": prompt, "context": context})
-        return result
+        return RateLimitedRunnable(
+            template | self.model | parser, llm_type=self.llm_type
+        )
 
 
 class DocReaderFactory:
@@ -181,9 +420,26 @@ class DocReaderFactory:
             )
 
     def get_advisor(self) -> SingleDocumentInterpreter:
+        from pydantic.v1.error_wrappers import ValidationError
+
         try:
             return self._select_advisor()
         except ValidationError:
             raise MissingApiKeyExcepetion(
                 "Make sure you provide an API key for the model you want to instantiate."
             )
+
+
+_shared_advisors: Dict[LlmType, SingleDocumentInterpreter] = {}
+_shared_advisors_lock = threading.Lock()
+
+
+def get_shared_advisor(model_id: LlmType) -> SingleDocumentInterpreter:
+    """
+    Returns an interpreter shared by everything in the process which asks for this model,
+    so that records borrow a client rather than each building their own.
+    """
+    with _shared_advisors_lock:
+        if model_id not in _shared_advisors:
+            _shared_advisors[model_id] = DocReaderFactory(model_id).get_advisor()
+        return _shared_advisors[model_id]
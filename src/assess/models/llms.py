@@ -1,6 +1,25 @@
 from enum import Enum
 
+# Tokens left in each request for the model's answer
+COMPLETION_RESERVE_TOKENS = 1024
+
 
 class LlmType(Enum):
     GPT_4 = "gpt-4"
     GPT_3_5 = "gpt-3.5-turbo"
+
+    @property
+    def context_window(self) -> int:
+        """The most tokens the model accepts in one request, prompt and answer together."""
+        return CONTEXT_WINDOWS[self]
+
+    @property
+    def prompt_budget(self) -> int:
+        """The most tokens a prompt to the model may use."""
+        return self.context_window - COMPLETION_RESERVE_TOKENS
+
+
+CONTEXT_WINDOWS = {
+    LlmType.GPT_4: 8192,
+    LlmType.GPT_3_5: 16385,
+}
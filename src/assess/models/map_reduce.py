@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, List, Optional
+
+from loguru import logger
+
+from assess.models.doc_readers import SingleDocumentInterpreter, get_shared_advisor
+from assess.models.llms import LlmType
+from assess.structures import prompts
+from assess.utils import instrumentation
+from assess.utils.context_packing import ContextBudgetExceededError, ContextPacker
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+DEFAULT_MAX_WORKERS = 8
+MAP_STAGE = "map"
+REDUCE_STAGE = "reduce"
+
+
+def _answer_documents(answers: List[str]) -> List[Document]:
+    from langchain_core.documents import Document
+
+    return [
+        Document(page_content=f"Answer from part {i + 1}:\n{x}", metadata={"part": i})
+        for i, x in enumerate(answers)
+    ]
+
+
+class MapReduceReader:
+    """
+    Completes a task over a record too long for one prompt. The record is split into
+    parts which each fit the `packer`'s budget, the task is given for every part at once
+    (map), then the answers are combined into one (reduce). Answers too long to combine
+    in one prompt are combined in groups first, in rounds until one group is left. A
+    round which doesn't leave fewer groups raises ContextBudgetExceededError.
+
+    Parts are read by `advisor`, the shared GPT-3.5 interpreter by default, `max_workers`
+    at a time (or as many as the process-wide request limit allows, in asyncio). Answers
+    are combined by `reduce_advisor`, the same advisor by default, which must accept the
+    packer's budget.
+    """
+
+    def __init__(
+        self,
+        advisor: Optional[SingleDocumentInterpreter] = None,
+        packer: Optional[ContextPacker] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        reduce_advisor: Optional[SingleDocumentInterpreter] = None,
+    ):
+        if max_workers < 1:
+            raise ValueError(f"max_workers must be at least 1 (received {max_workers})")
+        self._advisor = advisor
+        self._reduce_advisor = reduce_advisor
+        self.packer = packer or ContextPacker(LlmType.GPT_3_5)
+        self.max_workers = max_workers
+
+    @property
+    def advisor(self) -> SingleDocumentInterpreter:
+        return self._advisor or get_shared_advisor(LlmType.GPT_3_5)
+
+    @property
+    def reduce_advisor(self) -> SingleDocumentInterpreter:
+        return self._reduce_advisor or self.advisor
+
+    def split(self, pages: List[Document]) -> List[List[Document]]:
+        return self.packer.split(pages)
+
+    def _map_prompts(self, task: str, parts: List[List[Document]]) -> List[str]:
+        return [
+            prompts.MAP_RECORD_PART.format(part=i + 1, parts=len(parts), task=task)
+            for i in range(len(parts))
+        ]
+
+    def _in_parallel(self, func: Callable, items: List) -> List:
+        if self.max_workers == 1 or len(items) <= 1:
+            return [func(x) for x in items]
+        n_workers = min(self.max_workers, len(items))
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            futures = [
+                executor.submit(instrumentation.propagate_context(func), x)
+                for x in items
+            ]
+            return [x.result() for x in futures]
+
+    def _groups(self, answers: List[str]) -> List[List[Document]]:
+        return self.packer.split(_answer_documents(answers))
+
+    def _check_progress(self, groups: List[List[Document]], previous: int):
+        if len(groups) >= previous:
+            raise ContextBudgetExceededError(
+                f"Combining the answers left {len(groups)} groups from {previous}, so "
+                f"they can't be combined within the {self.packer.budget} token budget"
+            )
+
+    def ask(self, task: str, parts: List[List[Document]]) -> str:
+        """Completes the task for each part of the record, then combines the answers."""
+        logger.info(f"Reading {len(parts)} parts of the record in parallel...")
+        questions = self._map_prompts(task, parts)
+        with instrumentation.stage(MAP_STAGE):
+            answers = self._in_parallel(
+                lambda i: self.advisor.ask(questions[i], context=parts[i]),
+                list(range(len(parts))),
+            )
+        question = prompts.REDUCE_PARTIAL_ANSWERS.format(task=task)
+        with instrumentation.stage(REDUCE_STAGE):
+            groups = self._groups(answers)
+            while len(groups) > 1:
+                answers = self._in_parallel(
+                    lambda x: self.reduce_advisor.ask(question, context=x), groups
+                )
+                previous, groups = len(groups), self._groups(answers)
+                self._check_progress(groups, previous)
+            return self.reduce_advisor.ask(question, context=groups[0])
+
+    async def aask(self, task: str, parts: List[List[Document]]) -> str:
+        """As `ask`, reading every part concurrently."""
+        logger.info(f"Reading {len(parts)} parts of the record concurrently...")
+        questions = self._map_prompts(task, parts)
+        with instrumentation.stage(MAP_STAGE):
+            answers = list(
+                await asyncio.gather(
+                    *(
+                        self.advisor.aask(x, context=part)
+                        for x, part in zip(questions, parts)
+                    )
+                )
+            )
+        question = prompts.REDUCE_PARTIAL_ANSWERS.format(task=task)
+        with instrumentation.stage(REDUCE_STAGE):
+            groups = self._groups(answers)
+            while len(groups) > 1:
+                answers = list(
+                    await asyncio.gather(
+                        *(self.reduce_advisor.aask(question, context=x) for x in groups)
+                    )
+                )
+                previous, groups = len(groups), self._groups(answers)
+                self._check_progress(groups, previous)
+            return await self.reduce_advisor.aask(question, context=groups[0])
@@ -1,128 +1,359 @@
-from typing import OrderedDict
+import asyncio
+import io
+from typing import Any, Callable, Dict, List, Optional, OrderedDict, Tuple
 
 from loguru import logger
 
-from assess.models.assessors import GPT4Assessor
+from assess.models.assessors import DEFAULT_MAX_CONCURRENCY, Assessor, GPT4Assessor
 from assess.structures.criteria import AssessmentCriteria
 from assess.structures.medical_record import MedicalRecord
+from assess.structures.report import (
+    AssessmentReport,
+    Decision,
+    ReportSection,
+    SectionKind,
+    render_combined_markdown,
+    to_markdown,
+)
+from assess.utils import instrumentation
+from assess.utils.task_graph import TaskGraph
 
 
-class DocConstants:
-    INTRO = (
-        "This document summarises whether the treatment recommended by the doctor"
-        " meets the criteria for that assessment."
+class ReportConstants:
+    MEETS_CRITERIA = (
+        "The patient meets the criteria for the recommended treatment (see below)"
+    )
+    DOES_NOT_MEET_CRITERIA = "The patient does not meet the criteria for the recommended treatment (see below)"
+    TREATMENT_HELPED = (
+        "Previous conservative treatment has shown improvement and should be continued"
+        " (see below)"
     )
 
 
-class Orchestrator:
-
-    def __init__(self):
-        self.assessor = GPT4Assessor()
+class Stage:
+    PROFILE = "profile"
+    CPT_CODE_ANALYSIS = "cpt_code_analysis"
+    PREV_TREATMENT = "prev_treatment"
+    ASSESSMENT = "assessment"
+    EVIDENCE = "evidence"
 
-    def _add_cpt_code_analysis(self, record: MedicalRecord) -> str:
-        result = "## Recommended Procedure and CPT Codes\n"
-        codes = record.extract_and_validate_cpt_codes()
-        for title, llm_response in codes.items():
-            result += f"### {title}\n"
-            result += llm_response + "\n\n"
-        return result
 
-    def _add_previous_treatments(
-        self, result: str, prev_treatments: OrderedDict[str, str]
-    ) -> str:
-        result += "## Previous Treatments\n"
-        for key, val in prev_treatments.items():
-            result += f"### {key}\n{val}\n\n"
-        return result
+class Orchestrator:
 
-    def _handle_case_prev_treatment_helped(
-        self, record: MedicalRecord, result: str, prev_treatments: OrderedDict[str, str]
-    ) -> str:
-        logger.info(
-            "Previous treatment helped. Stopping pipeline execution and presenting evidence."
-        )
-        result += "**Assessment:** DENIED\n\n"
-        result += (
-            "**Reason:** Previous conservative treatment has shown improvement and "
-            "should be continued (see below)\n\n"
-        )
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        assessor: Optional[Assessor] = None,
+    ):
+        self.assessor = assessor or GPT4Assessor(max_concurrency=max_concurrency)
 
-        result = self._add_previous_treatments(result, prev_treatments)
+    def _add_cpt_code_analysis(self, record: MedicalRecord) -> ReportSection:
+        return self._cpt_code_section(record.extract_and_validate_cpt_codes())
 
-        result += "## Justification for Continuing Conservative Treatment\n"
-        result += record.present_evidence_treatment_helped() + "\n\n"
+    async def _aadd_cpt_code_analysis(self, record: MedicalRecord) -> ReportSection:
+        codes = await record.aextract_and_validate_cpt_codes()
+        return self._cpt_code_section(codes)
 
-        result += self._add_cpt_code_analysis(record)
-        return result
+    def _cpt_code_section(self, codes: OrderedDict[str, str]) -> ReportSection:
+        return ReportSection.from_items(
+            SectionKind.CPT_CODES, "Recommended Procedure and CPT Codes", codes
+        )
 
-    def _add_approved_stamp(self, result: str) -> str:
-        result += "**Assessment:** APPROVED\n\n"
-        result += "**Reason:** The patient meets the criteria for the recommended treatment (see below)\n\n"
-        return result
+    def _previous_treatments_section(
+        self, prev_treatments: OrderedDict[str, str]
+    ) -> ReportSection:
+        return ReportSection.from_items(
+            SectionKind.PREVIOUS_TREATMENTS, "Previous Treatments", prev_treatments
+        )
 
-    def _add_denied_stamp(self, result: str) -> str:
-        result += "**Assessment:** DENIED\n\n"
-        result += "**Reason:** The patient does not meet the criteria for the recommended treatment (see below)\n\n"
-        return result
+    def _criteria_section(self, criteria: AssessmentCriteria) -> ReportSection:
+        sections = OrderedDict(
+            (key.replace("-", " ").title(), val) for key, val in criteria.get_sections()
+        )
+        return ReportSection.from_items(
+            SectionKind.CRITERIA,
+            "Assessment Criteria",
+            sections,
+            body=criteria.get_description(),
+        )
 
-    def _add_criteria(self, result: str, criteria: AssessmentCriteria) -> str:
-        result += "## Assessment Criteria\n"
-        result += criteria.get_description() + "\n"
-        for key, val in criteria.get_sections():
-            result += f"### {key.replace('-', ' ').title()}\n{val}\n\n"
-        return result
+    def _handle_case_prev_treatment_helped(
+        self,
+        patient_name: str,
+        prev_treatments: OrderedDict[str, str],
+        evidence: str,
+        cpt_code_analysis: ReportSection,
+    ) -> AssessmentReport:
+        logger.info("Previous treatment helped. Presenting evidence.")
+        sections = [
+            self._previous_treatments_section(prev_treatments),
+            ReportSection(
+                SectionKind.JUSTIFICATION,
+                "Justification for Continuing Conservative Treatment",
+                evidence,
+            ),
+            cpt_code_analysis,
+        ]
+        return AssessmentReport(
+            patient_name, Decision.DENIED, ReportConstants.TREATMENT_HELPED, sections
+        )
 
     def _handle_case_prev_treatment_didnt_help(
         self,
         criteria: AssessmentCriteria,
-        record: MedicalRecord,
-        result: str,
+        patient_name: str,
         prev_treatments: OrderedDict[str, str],
-    ) -> str:
-        logger.info("Previous treatment did not help. Assessing against criteria.")
-        analysis_dict, approved = self.assessor.assess_criteria(criteria, record)
+        assessment: Tuple[OrderedDict[str, str], bool],
+        cpt_code_analysis: ReportSection,
+    ) -> AssessmentReport:
+        analysis_dict, approved = assessment
+
+        sections = [
+            self._previous_treatments_section(prev_treatments),
+            ReportSection(
+                SectionKind.FINAL_ASSESSMENT,
+                "Final Assessment",
+                analysis_dict["Final Assessment"],
+            ),
+        ]
+        sections += [
+            ReportSection(SectionKind.CRITERIA_ASSESSMENT, key, val)
+            for key, val in analysis_dict.items()
+            if key != "Final Assessment"
+        ]
+        sections += [cpt_code_analysis, self._criteria_section(criteria)]
 
         if approved:
-            result = self._add_approved_stamp(result)
-        else:
-            result = self._add_denied_stamp(result)
+            return AssessmentReport(
+                patient_name,
+                Decision.APPROVED,
+                ReportConstants.MEETS_CRITERIA,
+                sections,
+            )
+        return AssessmentReport(
+            patient_name,
+            Decision.DENIED,
+            ReportConstants.DOES_NOT_MEET_CRITERIA,
+            sections,
+        )
+
+    def _criteria_labels(self, criteria: List[AssessmentCriteria]) -> List[str]:
+        labels = [x.name or f"criteria-{i}" for i, x in enumerate(criteria)]
+        if len(set(labels)) != len(labels):
+            raise ValueError(f"Criteria names must be unique (received {labels})")
+        return labels
+
+    def _assessment_stages(self, criteria: List[AssessmentCriteria]) -> List[str]:
+        if len(criteria) == 1:
+            return [Stage.ASSESSMENT]
+        return [f"{Stage.ASSESSMENT}[{x}]" for x in self._criteria_labels(criteria)]
 
-        result = self._add_previous_treatments(result, prev_treatments)
+    def _build_stage_graph(
+        self, criteria: List[AssessmentCriteria], record: MedicalRecord
+    ) -> TaskGraph:
+        """
+        Each stage starts as soon as the stages it depends on have finished. Only the
+        criteria assessments and the evidence of improvement depend on the treatment
+        check, so the CPT code analysis overlaps with everything else. The record-level
+        stages run once however many criteria there are.
+        """
 
-        result += f"## Final Assessment\n{analysis_dict['Final Assessment']}\n\n"
+        def assessor_for(x: AssessmentCriteria) -> Callable:
+            def assess_criteria(
+                profile: Dict, prev_treatment: Tuple
+            ) -> Optional[Tuple]:
+                _, did_succeed = prev_treatment
+                if did_succeed:
+                    return None
+                logger.info(
+                    "Previous treatment did not help. Assessing against criteria."
+                )
+                return self.assessor.assess_criteria(x, record)
 
-        for key, val in analysis_dict.items():
-            if key == "Final Assessment":
-                continue
-            result += f"## {key}\n{val}\n\n"
+            return assess_criteria
 
-        result += self._add_cpt_code_analysis(record)
+        def present_evidence(prev_treatment: Tuple) -> Optional[str]:
+            _, did_succeed = prev_treatment
+            if not did_succeed:
+                return None
+            return record.present_evidence_treatment_helped()
 
-        result = self._add_criteria(result, criteria)
+        def add_stage(name: str, func: Callable, depends_on: Tuple[str, ...] = ()):
+            graph.add_task(name, instrumentation.staged(name)(func), depends_on)
 
-        return result
+        graph = TaskGraph()
+        add_stage(Stage.PROFILE, record.extract_patient_profile)
+        add_stage(Stage.CPT_CODE_ANALYSIS, lambda: self._add_cpt_code_analysis(record))
+        add_stage(
+            Stage.PREV_TREATMENT, record.check_for_previous_conservative_treatment
+        )
+        for name, x in zip(self._assessment_stages(criteria), criteria):
+            add_stage(
+                name, assessor_for(x), depends_on=(Stage.PROFILE, Stage.PREV_TREATMENT)
+            )
+        add_stage(Stage.EVIDENCE, present_evidence, depends_on=(Stage.PREV_TREATMENT,))
+        return graph
 
     def run_pipeline(self, criteria: AssessmentCriteria, record: MedicalRecord) -> str:
         """Runs the full assessment pipeline and returns the evidence as a Markdown string."""
-        patient_profile = record.extract_patient_profile()
+        report, _ = self.run_pipeline_with_decision(criteria=criteria, record=record)
+        return report
+
+    def run_pipeline_with_decision(
+        self, criteria: AssessmentCriteria, record: MedicalRecord
+    ) -> Tuple[str, bool]:
+        """Runs the full assessment pipeline and returns the report and whether it was approved."""
+        return _with_decision(self.build_report(criteria=criteria, record=record))
 
-        result = (
-            f"# Assessment of Recommended Procedure for {patient_profile['name']}\n"
+    def run_multi_criteria_pipeline(
+        self, criteria: List[AssessmentCriteria], record: MedicalRecord
+    ) -> OrderedDict[str, Tuple[str, bool]]:
+        """
+        Assesses the record against each criteria, deriving the record-level facts only
+        once. Returns the report and decision for each criteria, keyed by the criteria's
+        name, or by "criteria-<index>" for criteria without one.
+        """
+        reports = self.build_multi_criteria_reports(criteria, record)
+        return OrderedDict((k, _with_decision(v)) for k, v in reports.items())
+
+    def build_report(
+        self, criteria: AssessmentCriteria, record: MedicalRecord
+    ) -> AssessmentReport:
+        """Runs the full assessment pipeline and returns the report, ready to render."""
+        (report,) = self.build_multi_criteria_reports([criteria], record).values()
+        return report
+
+    def build_multi_criteria_reports(
+        self, criteria: List[AssessmentCriteria], record: MedicalRecord
+    ) -> OrderedDict[str, AssessmentReport]:
+        """The same as `run_multi_criteria_pipeline`, but returns the unrendered reports."""
+        stages = self._build_stage_graph(criteria, record).run()
+        return self._assemble_reports(criteria, stages)
+
+    async def arun_pipeline(
+        self, criteria: AssessmentCriteria, record: MedicalRecord
+    ) -> str:
+        """Asynchronously runs the full assessment pipeline and returns the report."""
+        report, _ = await self.arun_pipeline_with_decision(
+            criteria=criteria, record=record
         )
-        result += DocConstants.INTRO + "\n\n"
+        return report
+
+    async def arun_pipeline_with_decision(
+        self, criteria: AssessmentCriteria, record: MedicalRecord
+    ) -> Tuple[str, bool]:
+        """
+        Asynchronously runs the full assessment pipeline, with the stages overlapping in
+        the same way as `run_pipeline_with_decision`. Returns the report and whether it
+        was approved.
+        """
+        return _with_decision(await self.abuild_report(criteria, record))
 
-        prev_treatments, did_succeed = (
-            record.check_for_previous_conservative_treatment()
+    async def arun_multi_criteria_pipeline(
+        self, criteria: List[AssessmentCriteria], record: MedicalRecord
+    ) -> OrderedDict[str, Tuple[str, bool]]:
+        """The asynchronous counterpart of `run_multi_criteria_pipeline`."""
+        reports = await self.abuild_multi_criteria_reports(criteria, record)
+        return OrderedDict((k, _with_decision(v)) for k, v in reports.items())
+
+    async def abuild_report(
+        self, criteria: AssessmentCriteria, record: MedicalRecord
+    ) -> AssessmentReport:
+        """The asynchronous counterpart of `build_report`."""
+        reports = await self.abuild_multi_criteria_reports([criteria], record)
+        (report,) = reports.values()
+        return report
+
+    async def abuild_multi_criteria_reports(
+        self, criteria: List[AssessmentCriteria], record: MedicalRecord
+    ) -> OrderedDict[str, AssessmentReport]:
+        """The asynchronous counterpart of `build_multi_criteria_reports`."""
+        staged = instrumentation.staged
+        assessment_stages = self._assessment_stages(criteria)
+        profile = asyncio.ensure_future(
+            staged(Stage.PROFILE)(record.aextract_patient_profile)()
+        )
+        cpt_code_analysis = asyncio.ensure_future(
+            staged(Stage.CPT_CODE_ANALYSIS)(self._aadd_cpt_code_analysis)(record)
         )
+        pending = [profile, cpt_code_analysis]
+        try:
+            stages = {
+                Stage.PREV_TREATMENT: await staged(Stage.PREV_TREATMENT)(
+                    record.acheck_for_previous_conservative_treatment
+                )()
+            }
+            _, did_succeed = stages[Stage.PREV_TREATMENT]
+            if did_succeed:
+                stages[Stage.EVIDENCE] = await staged(Stage.EVIDENCE)(
+                    record.apresent_evidence_treatment_helped
+                )()
+            else:
+                logger.info(
+                    "Previous treatment did not help. Assessing against criteria."
+                )
+                assessments = [
+                    asyncio.ensure_future(
+                        staged(name)(self.assessor.aassess_criteria)(x, record)
+                    )
+                    for name, x in zip(assessment_stages, criteria)
+                ]
+                pending += assessments
+                for name, assessment in zip(assessment_stages, assessments):
+                    stages[name] = await assessment
+            stages[Stage.PROFILE] = await profile
+            stages[Stage.CPT_CODE_ANALYSIS] = await cpt_code_analysis
+        finally:
+            for task in pending:
+                task.cancel()
+        return self._assemble_reports(criteria, stages)
+
+    def _assemble_reports(
+        self, criteria: List[AssessmentCriteria], stages: Dict[str, Any]
+    ) -> OrderedDict[str, AssessmentReport]:
+        results = OrderedDict()
+        for label, name, x in zip(
+            self._criteria_labels(criteria), self._assessment_stages(criteria), criteria
+        ):
+            results[label] = self._assemble_report(
+                x, {**stages, Stage.ASSESSMENT: stages.get(name)}
+            )
+        return results
+
+    def _assemble_report(
+        self, criteria: AssessmentCriteria, stages: Dict[str, Any]
+    ) -> AssessmentReport:
+        patient_profile = stages[Stage.PROFILE]
+        prev_treatments, did_succeed = stages[Stage.PREV_TREATMENT]
 
         if did_succeed:
-            return self._handle_case_prev_treatment_helped(
-                record, result, prev_treatments
+            report = self._handle_case_prev_treatment_helped(
+                patient_name=patient_profile["name"],
+                prev_treatments=prev_treatments,
+                evidence=stages[Stage.EVIDENCE],
+                cpt_code_analysis=stages[Stage.CPT_CODE_ANALYSIS],
             )
         else:
-            return self._handle_case_prev_treatment_didnt_help(
+            report = self._handle_case_prev_treatment_didnt_help(
                 criteria=criteria,
-                record=record,
-                result=result,
+                patient_name=patient_profile["name"],
                 prev_treatments=prev_treatments,
+                assessment=stages[Stage.ASSESSMENT],
+                cpt_code_analysis=stages[Stage.CPT_CODE_ANALYSIS],
             )
+        report.criteria_name = criteria.name
+        return report
+
+
+def _with_decision(report: AssessmentReport) -> Tuple[str, bool]:
+    return to_markdown(report), report.approved
+
+
+def combine_reports(reports: Dict[str, AssessmentReport]) -> str:
+    """
+    Joins the reports for several criteria into one Markdown document, with each report's
+    headings moved down a level beneath a heading naming its criteria.
+    """
+    stream = io.StringIO()
+    render_combined_markdown(reports, stream)
+    return stream.getvalue()
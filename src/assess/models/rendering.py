@@ -0,0 +1,67 @@
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import BinaryIO, Callable, Optional
+
+from assess.structures.report import AssessmentReport, render_pdf, write_report
+
+PdfRenderer = Callable[[AssessmentReport, BinaryIO], None]
+
+
+def _warm_up():
+    """Runs on each worker as it starts, so that its first report is rendered warm."""
+
+
+class PdfRenderPool:
+    """
+    Renders reports to PDF files on `workers` long-lived processes, started once and
+    shared by every thread that submits to the pool. Workers are spawned rather than
+    forked, as reports are submitted from worker threads. With no workers, reports are
+    rendered on the calling thread instead.
+    """
+
+    def __init__(self, workers: int = 1, render: PdfRenderer = render_pdf):
+        if workers < 0:
+            raise ValueError(f"workers must not be negative (received {workers})")
+        self.workers = workers
+        self.render = render
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        if workers:
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            # Start every worker now, rather than on the first reports submitted
+            for future in [self._executor.submit(_warm_up) for _ in range(workers)]:
+                future.result()
+
+    def submit(self, report: AssessmentReport, path: str) -> Future:
+        """Starts rendering the report to `path`, returning a future for its completion."""
+        with self._lock:
+            if self._executor is not None:
+                return self._executor.submit(
+                    write_report, report, path, self.render, True
+                )
+        future = Future()
+        try:
+            write_report(report, path, self.render, binary=True)
+            future.set_result(None)
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def render_to_file(self, report: AssessmentReport, path: str):
+        """Renders the report to `path`, waiting until it is written."""
+        self.submit(report, path).result()
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def __enter__(self) -> "PdfRenderPool":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,368 @@
+import io
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from enum import Enum
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from loguru import logger
+
+from assess.models.orchestrator import Orchestrator
+from assess.structures.criteria import CriteriaRegistry, criteria_registry
+from assess.structures.medical_record import MedicalRecord
+from assess.structures.report import (
+    AssessmentReport,
+    render_html,
+    render_json,
+    render_markdown,
+    render_pdf,
+)
+
+
+class JobStatus(Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    ERROR = "ERROR"
+
+
+class ServiceConstant(Enum):
+    DEFAULT_HOST = "127.0.0.1"
+    DEFAULT_PORT = 8080
+    MAX_UPLOAD_BYTES = 50 * 2**20
+    MAX_FINISHED_JOBS = 1000
+    # Seconds a client is asked to wait before retrying when the queue is full
+    RETRY_AFTER = 5
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the service's queue is full."""
+
+
+class Job:
+    """A record submitted to the service, and its progress through the pipeline."""
+
+    def __init__(self, criteria_name: str, record_name: str, record_path: str):
+        self.id = uuid.uuid4().hex
+        self.criteria_name = criteria_name
+        self.record_name = record_name
+        self.record_path = record_path
+        self.status = JobStatus.QUEUED
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.report: Optional[AssessmentReport] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "criteria": self.criteria_name,
+            "record": self.record_name,
+            "status": self.status.value,
+            "approved": self.report.approved if self.report else None,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+        }
+
+
+class AssessmentService:
+    """
+    Assesses uploaded records on `workers` threads, sharing one orchestrator, one set of
+    LLM clients and the compiled criteria between every job. Jobs wait in a queue of at
+    most `queue_size`; once it is full, new jobs are refused until there is room.
+
+    Only the last `max_finished_jobs` finished jobs are kept for their results.
+    """
+
+    def __init__(
+        self,
+        orchestrator: Optional[Orchestrator] = None,
+        record_loader: Optional[Callable[[str], MedicalRecord]] = None,
+        workers: int = 2,
+        queue_size: int = 16,
+        max_finished_jobs: int = ServiceConstant.MAX_FINISHED_JOBS.value,
+        registry: CriteriaRegistry = criteria_registry,
+    ):
+        if workers < 1:
+            raise ValueError(f"workers must be at least 1 (received {workers})")
+        if queue_size < 1:
+            raise ValueError(f"queue_size must be at least 1 (received {queue_size})")
+        self.orchestrator = orchestrator or Orchestrator()
+        self.record_loader = record_loader or MedicalRecord.from_pdf
+        self.workers = workers
+        self.max_finished_jobs = max_finished_jobs
+        self.registry = registry
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue(maxsize=queue_size)
+        self._jobs: Dict[str, Job] = {}
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._upload_dir = tempfile.mkdtemp(prefix="assess-uploads-")
+
+    def warm_up(self):
+        """
+        Compiles every criteria, builds the shared clients and imports the PDF parser, so
+        that the first job doesn't pay for them.
+        """
+        import langchain.text_splitter  # noqa: F401
+        import pypdf  # noqa: F401
+
+        from assess.models.doc_readers import get_shared_advisor
+        from assess.models.llms import LlmType
+        from assess.structures.cpt_codes import get_shared_table
+
+        self.registry.compile_all()
+        get_shared_table()
+        get_shared_advisor(LlmType.GPT_3_5)
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._work, name=f"assess-worker-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Finishes the jobs already queued, then stops the workers."""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        shutil.rmtree(self._upload_dir, ignore_errors=True)
+
+    def submit(self, pdf: bytes, criteria_name: str, record_name: str) -> Job:
+        """
+        Queues a record for assessment against the named criteria. Raises KeyError for
+        an unknown criteria and QueueFullError if there is no room in the queue.
+        """
+        if criteria_name not in self.registry.names():
+            raise KeyError(f"Unknown criteria '{criteria_name}'")
+        path = os.path.join(self._upload_dir, f"{uuid.uuid4().hex}.pdf")
+        with open(path, "wb") as f:
+            f.write(pdf)
+        job = Job(criteria_name, record_name, path)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            os.remove(path)
+            raise QueueFullError(f"The queue is full ({self._queue.maxsize} jobs)")
+        logger.info(f"Queued job {job.id} for record '{record_name}'")
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            statuses = [x.status for x in self._jobs.values()]
+        return {
+            "workers": self.workers,
+            "queue_size": self._queue.maxsize,
+            **{x.value.lower(): statuses.count(x) for x in JobStatus},
+        }
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            self._run(job)
+
+    def _run(self, job: Job):
+        job.status = JobStatus.RUNNING
+        job.started = time.time()
+        try:
+            record = self.record_loader(job.record_path)
+            criteria = self.registry.get(job.criteria_name)
+            job.report = self.orchestrator.build_report(
+                criteria=criteria, record=record
+            )
+            job.status = JobStatus.DONE
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed")
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = JobStatus.ERROR
+        finally:
+            job.finished = time.time()
+            os.remove(job.record_path)
+            self._retire(job)
+
+    def _retire(self, job: Job):
+        with self._lock:
+            self._finished[job.id] = None
+            while len(self._finished) > self.max_finished_jobs:
+                oldest, _ = self._finished.popitem(last=False)
+                self._jobs.pop(oldest, None)
+
+
+REPORT_FORMATS = {
+    "md": ("text/markdown; charset=utf-8", render_markdown, False),
+    "html": ("text/html; charset=utf-8", render_html, False),
+    "json": ("application/json", render_json, False),
+    "pdf": ("application/pdf", render_pdf, True),
+}
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /jobs?criteria=<name>&name=<record name>  with the PDF as the body
+    GET  /jobs/<id>                                 the job's status
+    GET  /jobs/<id>/report?format=md|html|json|pdf  the finished report
+    GET  /criteria                                  the criteria available
+    GET  /health                                    the number of jobs in each status
+    """
+
+    server: "AssessmentServer"
+
+    def log_message(self, format: str, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def _send(
+        self,
+        status: HTTPStatus,
+        body: bytes,
+        content_type: str,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, val in (headers or {}).items():
+            self.send_header(key, val)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: HTTPStatus, data, headers=None):
+        self._send(status, json.dumps(data).encode(), "application/json", headers)
+
+    def _send_error(self, status: HTTPStatus, message: str, headers=None):
+        self._send_json(status, {"error": message}, headers)
+
+    def _route(self) -> Tuple[List[str], Dict[str, str]]:
+        url = urlparse(self.path)
+        parts = [x for x in url.path.split("/") if x]
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        return parts, query
+
+    def do_POST(self):
+        service = self.server.service
+        parts, query = self._route()
+        if parts != ["jobs"]:
+            return self._send_error(HTTPStatus.NOT_FOUND, f"No route {self.path}")
+        length = self.headers.get("Content-Length", "0").strip()
+        if not (length.isascii() and length.isdigit()):
+            # The body can't be read without its length, so the connection can't be reused
+            self.close_connection = True
+            return self._send_error(
+                HTTPStatus.BAD_REQUEST, "Content-Length must be a number of bytes"
+            )
+        length = int(length)
+        if not length:
+            return self._send_error(
+                HTTPStatus.BAD_REQUEST, "Upload the record as a PDF"
+            )
+        if length > self.server.max_upload_bytes:
+            return self._send_error(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                f"Records may be at most {self.server.max_upload_bytes} bytes",
+            )
+        pdf = self.rfile.read(length)
+        try:
+            job = service.submit(
+                pdf,
+                criteria_name=query.get("criteria", "colonoscopy"),
+                record_name=query.get("name", "record.pdf"),
+            )
+        except KeyError as e:
+            return self._send_error(HTTPStatus.BAD_REQUEST, str(e.args[0]))
+        except QueueFullError as e:
+            return self._send_error(
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                str(e),
+                {"Retry-After": str(ServiceConstant.RETRY_AFTER.value)},
+            )
+        self._send_json(
+            HTTPStatus.ACCEPTED, job.to_dict(), {"Location": f"/jobs/{job.id}"}
+        )
+
+    def do_GET(self):
+        service = self.server.service
+        parts, query = self._route()
+        if parts == ["health"]:
+            return self._send_json(HTTPStatus.OK, service.stats())
+        if parts == ["criteria"]:
+            return self._send_json(HTTPStatus.OK, service.registry.names())
+        if len(parts) not in (2, 3) or parts[0] != "jobs":
+            return self._send_error(HTTPStatus.NOT_FOUND, f"No route {self.path}")
+
+        job = service.get_job(parts[1])
+        if job is None:
+            return self._send_error(HTTPStatus.NOT_FOUND, f"No job {parts[1]}")
+        if len(parts) == 2:
+            return self._send_json(HTTPStatus.OK, job.to_dict())
+        if parts[2] != "report":
+            return self._send_error(HTTPStatus.NOT_FOUND, f"No route {self.path}")
+        if job.report is None:
+            return self._send_error(
+                HTTPStatus.CONFLICT, f"Job {job.id} is {job.status.value}"
+            )
+        fmt = query.get("format", "md")
+        if fmt not in REPORT_FORMATS:
+            return self._send_error(
+                HTTPStatus.BAD_REQUEST,
+                f"Unknown format '{fmt}' ({list(REPORT_FORMATS)})",
+            )
+        content_type, render, binary = REPORT_FORMATS[fmt]
+        stream = io.BytesIO() if binary else io.StringIO()
+        render(job.report, stream)
+        body = stream.getvalue()
+        self._send(HTTPStatus.OK, body if binary else body.encode(), content_type)
+
+
+class AssessmentServer(ThreadingHTTPServer):
+    """Serves an AssessmentService over HTTP, starting and stopping it with the server."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        service: AssessmentService,
+        host: str = ServiceConstant.DEFAULT_HOST.value,
+        port: int = ServiceConstant.DEFAULT_PORT.value,
+        max_upload_bytes: int = ServiceConstant.MAX_UPLOAD_BYTES.value,
+    ):
+        super().__init__((host, port), ServiceRequestHandler)
+        self.service = service
+        self.max_upload_bytes = max_upload_bytes
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self, poll_interval: float = 0.5):
+        self.service.start()
+        logger.info(f"Serving assessments at {self.url}")
+        try:
+            super().serve_forever(poll_interval)
+        finally:
+            self.service.stop()
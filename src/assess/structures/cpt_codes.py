@@ -0,0 +1,100 @@
+import bisect
+import re
+import threading
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+from assess.utils import serialize
+
+CPT_CODE_PATTERN = re.compile(r"\b\d{4}[0-9FTU]\b")
+
+
+class CptTableKey(Enum):
+    CODES = "codes"
+    RANGES = "ranges"
+    START = "start"
+    END = "end"
+    DESCRIPTION = "description"
+
+
+def parse_cpt_codes(text: str) -> List[str]:
+    """Finds the CPT codes in a piece of text, in order and without duplicates."""
+    return list(dict.fromkeys(CPT_CODE_PATTERN.findall(text)))
+
+
+class CptCodeTable:
+    """
+    A local dictionary of CPT code meanings, looked up by exact code and then by the range
+    of codes the code falls into. Meanings found elsewhere, such as by a web search, can be
+    remembered so that later lookups of the same code are answered locally.
+    """
+
+    def __init__(self, codes: Dict[str, str], ranges: List[Tuple[str, str, str]] = ()):
+        self._codes = {str(k): str(v) for k, v in codes.items()}
+        self._lock = threading.Lock()
+
+        ranges = sorted(
+            (int(start), int(end), str(desc)) for start, end, desc in ranges
+        )
+        for (_, prev_end, _), (start, _, _) in zip(ranges, ranges[1:]):
+            if start <= prev_end:
+                raise ValueError(f"CPT code ranges overlap at code {start}")
+        self._range_starts = [x[0] for x in ranges]
+        self._ranges = ranges
+
+    def lookup(self, code: str) -> Optional[str]:
+        """Returns the meaning of exactly this code, if it is known."""
+        with self._lock:
+            return self._codes.get(code)
+
+    def lookup_range(self, code: str) -> Optional[str]:
+        """Returns the meaning of the range of codes this code falls into, if any."""
+        if not code.isdigit():
+            return None
+        number = int(code)
+        i = bisect.bisect_right(self._range_starts, number) - 1
+        if i >= 0 and number <= self._ranges[i][1]:
+            return self._ranges[i][2]
+        return None
+
+    def describe(self, code: str) -> Optional[str]:
+        return self.lookup(code) or self.lookup_range(code)
+
+    def remember(self, code: str, meaning: str):
+        with self._lock:
+            self._codes[code] = meaning
+
+    def __contains__(self, code: str) -> bool:
+        return self.describe(code) is not None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CptCodeTable":
+        ranges = [
+            (
+                x[CptTableKey.START.value],
+                x[CptTableKey.END.value],
+                x[CptTableKey.DESCRIPTION.value],
+            )
+            for x in data.get(CptTableKey.RANGES.value, [])
+        ]
+        return cls(codes=data.get(CptTableKey.CODES.value, {}), ranges=ranges)
+
+    @classmethod
+    def from_file(cls, path: str) -> "CptCodeTable":
+        return cls.from_dict(serialize.read_toml_file(path))
+
+    @classmethod
+    def from_spec(cls, table_name: str = "default") -> "CptCodeTable":
+        return cls.from_dict(serialize.load_cpt_code_table(table_name))
+
+
+_shared_tables: Dict[str, CptCodeTable] = {}
+_shared_tables_lock = threading.Lock()
+
+
+def get_shared_table(table_name: str = "default") -> CptCodeTable:
+    """Returns a table shared by every record, so remembered meanings are reused between them."""
+    with _shared_tables_lock:
+        if table_name not in _shared_tables:
+            _shared_tables[table_name] = CptCodeTable.from_spec(table_name)
+        return _shared_tables[table_name]
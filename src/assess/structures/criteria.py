@@ -1,33 +1,227 @@
+import math
+import os
+import threading
 from enum import Enum
-from typing import Dict, List, Tuple, Union
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
 
 from assess.utils import serialize
 
 
+class InvalidCriteriaException(ValueError):
+    """To be raised if an assessment criteria is not in the expected format"""
+
+    pass
+
+
 class CriteriaKey(Enum):
     DESCRIPTION = "description"
     CRITERIA = "criteria"
+    ASSESSMENT_MODE = "assessment-mode"
+    GATE = "gate"
+    ORDER = "order"
+
+
+class AssessmentMode(Enum):
+    """How the sections of a criteria are sent to the model."""
+
+    # One request per section, sent concurrently
+    INDIVIDUAL = "individual"
+    # One request per section, sent through the chat model's batch API
+    BATCH = "batch"
+    # A single request asking for a verdict on every section
+    COMBINED = "combined"
+
+
+class SectionGate(Enum):
+    """Marks a section whose verdict alone decides the outcome of the assessment."""
+
+    # The patient must meet this section, so failing it denies the procedure
+    REQUIRED = "required"
+    # Meeting this section is enough to approve the procedure
+    SUFFICIENT = "sufficient"
+
+
+class _Immutable:
+    __slots__ = ()
+
+    def __setattr__(self, key: str, value: Any):
+        raise AttributeError(f"{type(self).__name__} objects are immutable")
+
+    def __delattr__(self, key: str):
+        raise AttributeError(f"{type(self).__name__} objects are immutable")
+
+
+class CriteriaSection(_Immutable):
+    """A single, validated section of an assessment criteria."""
+
+    __slots__ = ("name", "criteria", "gate", "order")
+
+    def __init__(
+        self,
+        name: str,
+        criteria: str,
+        gate: Optional[SectionGate] = None,
+        order: Optional[float] = None,
+    ):
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "criteria", criteria)
+        object.__setattr__(self, "gate", gate)
+        object.__setattr__(self, "order", order)
+
+    @classmethod
+    def from_dict(
+        cls, name: str, data: Mapping[str, Any], spec_name: Optional[str] = None
+    ) -> "CriteriaSection":
+        where = f"section '{name}' of criteria '{spec_name or 'unnamed'}'"
+        criteria = data.get(CriteriaKey.CRITERIA.value)
+        if not isinstance(criteria, str):
+            raise InvalidCriteriaException(f"The {where} has no 'criteria' text")
+
+        gate = data.get(CriteriaKey.GATE.value)
+        try:
+            gate = SectionGate(gate) if gate else None
+        except ValueError:
+            raise InvalidCriteriaException(f"The {where} has an unknown gate '{gate}'")
+
+        order = data.get(CriteriaKey.ORDER.value)
+        if order is not None and (
+            isinstance(order, bool) or not isinstance(order, (int, float))
+        ):
+            raise InvalidCriteriaException(f"The {where} has a non-numeric order")
+        return cls(name, criteria, gate, order)
 
 
-class AssessmentCriteria:
-    """Class providing access to the data stored in an assessment TOML."""
+class AssessmentCriteria(_Immutable):
+    """
+    Class providing access to the data stored in an assessment TOML. The data is validated
+    and compiled when the object is created, and can't be changed afterwards.
+    """
 
-    def __init__(self, critera: Dict[str, Union[str, Dict[str, str]]]):
-        self.critera = critera
+    __slots__ = (
+        "critera",
+        "name",
+        "description",
+        "assessment_mode",
+        "sections",
+        "_evaluation_order",
+        "_gates",
+    )
+
+    def __init__(
+        self,
+        critera: Mapping[str, Union[str, Mapping[str, Any]]],
+        name: Optional[str] = None,
+    ):
+        sections = []
+        raw = {}
+        for key, val in critera.items():
+            if isinstance(val, str):
+                raw[key] = val
+            elif isinstance(val, Mapping):
+                sections.append(CriteriaSection.from_dict(key, val, name))
+                raw[key] = MappingProxyType(dict(val))
+            else:
+                raise InvalidCriteriaException(
+                    f"The key '{key}' of criteria '{name or 'unnamed'}' must be text or a section"
+                )
+
+        description = raw.get(CriteriaKey.DESCRIPTION.value)
+        if description is None:
+            raise InvalidCriteriaException(
+                f"Criteria '{name or 'unnamed'}' has no description"
+            )
+        mode = raw.get(CriteriaKey.ASSESSMENT_MODE.value)
+        try:
+            mode = AssessmentMode(mode) if mode else AssessmentMode.INDIVIDUAL
+        except ValueError:
+            raise InvalidCriteriaException(
+                f"Criteria '{name or 'unnamed'}' has an unknown assessment mode '{mode}'"
+            )
+
+        # Sections without an order come last, otherwise they keep the order they are written
+        evaluation_order = sorted(
+            range(len(sections)),
+            key=lambda i: (
+                math.inf if sections[i].order is None else sections[i].order,
+                i,
+            ),
+        )
+
+        object.__setattr__(self, "critera", MappingProxyType(raw))
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "description", description)
+        object.__setattr__(self, "assessment_mode", mode)
+        object.__setattr__(self, "sections", tuple(sections))
+        object.__setattr__(
+            self,
+            "_evaluation_order",
+            tuple((sections[i].name, sections[i].criteria) for i in evaluation_order),
+        )
+        object.__setattr__(
+            self, "_gates", MappingProxyType({x.name: x.gate for x in sections})
+        )
 
     def get_sections(self) -> List[Tuple[str, str]]:
         """Returns the section titles and their descriptions."""
-        result = []
-        for key, val in self.critera.items():
-            if isinstance(val, str):
-                continue
-            result.append((key, val[CriteriaKey.CRITERIA.value]))
-        return result
+        return [(x.name, x.criteria) for x in self.sections]
+
+    def get_section_gate(self, section_name: str) -> Optional[SectionGate]:
+        return self._gates[section_name]
+
+    def has_gates(self) -> bool:
+        return any(self._gates.values())
+
+    def get_evaluation_order(self) -> List[Tuple[str, str]]:
+        """
+        Returns the sections in the order they should be assessed: by their `order` key,
+        and then in the order they are written. Sections without an `order` come last.
+        """
+        return list(self._evaluation_order)
 
     def get_description(self) -> str:
-        return self.critera[CriteriaKey.DESCRIPTION.value]
+        return self.description
+
+    def get_assessment_mode(self) -> AssessmentMode:
+        return self.assessment_mode
+
+    @classmethod
+    def from_file(cls, path: str, name: Optional[str] = None) -> "AssessmentCriteria":
+        return cls(critera=serialize.read_toml_file(path), name=name)
 
     @classmethod
     def from_spec(cls, spec_name: str) -> "AssessmentCriteria":
-        raw_data = serialize.load_assesment_criteria(spec_name)
-        return cls(critera=raw_data)
+        """Returns the named spec, compiled once per process and again if its file changes."""
+        return criteria_registry.get(spec_name)
+
+
+class CriteriaRegistry:
+    """
+    The criteria specs in a directory. Each spec is compiled the first time it is used
+    and shared from then on, until its file is modified.
+    """
+
+    def __init__(self, directory: str = serialize.CRITERIA_DIR):
+        self.directory = directory
+        self._compiled: Dict[str, Tuple[int, AssessmentCriteria]] = {}
+        self._lock = threading.Lock()
+
+    def names(self) -> List[str]:
+        return serialize.list_criteria_specs(self.directory)
+
+    def get(self, spec_name: str) -> AssessmentCriteria:
+        path = os.path.join(self.directory, f"{spec_name}{serialize.TOML_SUFFIX}")
+        modified = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._compiled.get(spec_name)
+            if cached is None or cached[0] != modified:
+                cached = (modified, AssessmentCriteria.from_file(path, spec_name))
+                self._compiled[spec_name] = cached
+            return cached[1]
+
+    def compile_all(self) -> Dict[str, AssessmentCriteria]:
+        """Compiles every spec, so that a badly written one is found straight away."""
+        return {x: self.get(x) for x in self.names()}
+
+
+criteria_registry = CriteriaRegistry()
@@ -1,15 +1,26 @@
+from __future__ import annotations
+
+import asyncio
+import threading
 from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
-from langchain_core.documents import Document
 from langchain_core.pydantic_v1 import BaseModel, Field
 from loguru import logger
 
-from assess.models.doc_readers import GPT3_5SingleDocumentInterpreter
+from assess.models.doc_readers import SingleDocumentInterpreter, get_shared_advisor
+from assess.models.llms import LlmType
+from assess.models.map_reduce import MapReduceReader
 from assess.structures import prompts
+from assess.structures.cpt_codes import CptCodeTable, get_shared_table, parse_cpt_codes
 from assess.structures.prompts import PromptConstant
-from assess.utils import retry_tools, serialize
+from assess.utils import cache_tools, instrumentation, retry_tools, serialize
+from assess.utils.context_packing import ContextPacker, PackingStats, fits_prompt
+from assess.utils.retrieval import BM25Index, ContextSelector
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
 
 
 class PatientProfile(BaseModel):
@@ -17,67 +28,309 @@ class PatientProfile(BaseModel):
     dob: str = Field(description="The patient's date of birth")
 
 
+def _summary_document(summary: str) -> Document:
+    from langchain_core.documents import Document
+
+    return Document(page_content=summary)
+
+
 class MedicalRecord:
+    """
+    A patient's medical record. Facts derived from the record by the LLM are cached on the
+    record, and the cache is discarded whenever `pages` is reassigned.
+
+    By default every prompt is sent with the whole record. Given a `context_selector`,
+    records too large for its token budget instead send only the chunks most relevant to
+    each prompt. Given a `context_packer`, duplicate pages and boilerplate are removed
+    before anything is sent. Context is never trimmed: a prompt too large for its model
+    raises ContextBudgetExceededError instead.
 
-    def __init__(self, pages: List[Document]):
+    Given a `map_reduce` reader, records too long for one of the advisor's prompts are
+    instead read in parts, in parallel, to summarise the treatment so far, present
+    evidence that it helped, and extract and check the CPT codes. The stages which can't
+    be read in parts, the patient profile and the criteria assessments, then send only
+    the most relevant chunks, chosen by `context_selector` or a default ContextSelector.
+    """
+
+    def __init__(
+        self,
+        pages: List[Document],
+        advisor: Optional[SingleDocumentInterpreter] = None,
+        context_selector: Optional[ContextSelector] = None,
+        cpt_code_table: Optional[CptCodeTable] = None,
+        context_packer: Optional[ContextPacker] = None,
+        map_reduce: Optional[MapReduceReader] = None,
+    ):
+        if context_selector is None and map_reduce is not None:
+            context_selector = ContextSelector()
+        self.context_selector = context_selector
+        self.context_packer = context_packer
+        self.map_reduce = map_reduce
+        # Guards what is derived from the pages on first use, as stages run concurrently
+        self._lock = threading.Lock()
         self.pages = pages
-        self.advisor = GPT3_5SingleDocumentInterpreter()
+        self.advisor = advisor or get_shared_advisor(LlmType.GPT_3_5)
+        self.cpt_code_table = cpt_code_table or get_shared_table()
 
-    def extract_requested_cpt_codes(self) -> str:
-        """Reads the document to extract the CPT codes of the recommended procedure."""
-        result = self.advisor.ask(prompts.ASK_FOR_CPT_CODES, context=self.pages)
-        return result
+    @property
+    def pages(self) -> List[Document]:
+        return self._pages
 
-    def extract_and_validate_cpt_codes(self) -> OrderedDict[str, str]:
+    @pages.setter
+    def pages(self, pages: List[Document]):
+        self._pages = pages
+        self.invalidate_cache()
+
+    def invalidate_cache(self):
+        """Discards all cached facts so that they are re-derived from the pages on next use."""
+        self._retrieval_index = None
+        self._packed = None
+        self._parts = None
+        cache_tools.invalidate_cached_results(self)
+
+    def _pack(self) -> Tuple[List[Document], Optional[PackingStats]]:
+        if self.context_packer is None:
+            return self.pages, None
+        with self._lock:
+            if self._packed is None:
+                pages, stats = self.context_packer.deduplicate(self.pages)
+                logger.info(f"Packed the record's pages: {stats.to_dict()}")
+                instrumentation.record_packing(stats)
+                self._packed = pages, stats
+            return self._packed
+
+    @property
+    def packed_pages(self) -> List[Document]:
+        """The pages sent to the model, without duplicate pages and boilerplate."""
+        return self._pack()[0]
+
+    @property
+    def packing_stats(self) -> Optional[PackingStats]:
+        return self._pack()[1]
+
+    def _get_retrieval_index(self, pages: List[Document]) -> BM25Index:
+        with self._lock:
+            if self._retrieval_index is None:
+                self._retrieval_index = self.context_selector.build_index(pages)
+            return self._retrieval_index
+
+    def context_for(self, query: str) -> List[Document]:
+        """Returns the parts of the record to send as context with the given prompt."""
+        pages = self.packed_pages
+        selector = self.context_selector
+        if selector is None or not selector.needs_retrieval(pages):
+            return pages
+        return selector.select(self._get_retrieval_index(pages), query)
+
+    def _record_context(
+        self, prompt: str
+    ) -> Tuple[List[Document], List[List[Document]]]:
         """
-        Reads the CPT codes then checks that the procedure they correspond to aligns with the note description.
+        The context to send with a question about the whole record, and the parts to read
+        it in instead if it is too long for one of the advisor's prompts. With a map-reduce
+        reader, the whole record is read rather than the chunks chosen for the prompt.
         """
-        result = OrderedDict()
-        summary = self.advisor.ask(prompts.SUMMARISE_DOCTORS_ORDERS, context=self.pages)
-        result["Summary of Recommended Treatment"] = summary
-        logger.info(f"Summary of Doctor's Recommended Treatment: {summary}")
+        if self.map_reduce is None:
+            return self.context_for(prompt), []
+        pages = self.packed_pages
+        if fits_prompt(self.advisor.llm_type, pages):
+            return pages, []
+        with self._lock:
+            if self._parts is None:
+                self._parts = self.map_reduce.split(pages)
+            return pages, self._parts
 
-        codes = self.extract_requested_cpt_codes()
-        result["Extracted CPT Codes"] = codes
-        logger.info(f"Extracted CPT codes: {codes}")
+    def _ask_record(self, prompt: str) -> str:
+        """Asks about the whole record, in parts if it is too long for one prompt."""
+        context, parts = self._record_context(prompt)
+        if parts:
+            return self.map_reduce.ask(prompt, parts)
+        return self.advisor.ask(prompt, context=context)
+
+    async def _aask_record(self, prompt: str) -> str:
+        context, parts = self._record_context(prompt)
+        if parts:
+            return await self.map_reduce.aask(prompt, parts)
+        return await self.advisor.aask(prompt, context=context)
+
+    @cache_tools.cached_result
+    @instrumentation.staged("summarise_doctors_orders")
+    def summarise_doctors_orders(self) -> str:
+        """Summarises the treatment the doctor has recommended."""
+        return self._ask_record(prompts.SUMMARISE_DOCTORS_ORDERS)
+
+    @cache_tools.cached_async_result("summarise_doctors_orders")
+    @instrumentation.staged("summarise_doctors_orders")
+    async def asummarise_doctors_orders(self) -> str:
+        return await self._aask_record(prompts.SUMMARISE_DOCTORS_ORDERS)
+
+    @cache_tools.cached_result
+    @instrumentation.staged("extract_requested_cpt_codes")
+    def extract_requested_cpt_codes(self) -> str:
+        """Reads the document to extract the CPT codes of the recommended procedure."""
+        return self._ask_record(prompts.ASK_FOR_CPT_CODES)
+
+    @cache_tools.cached_async_result("extract_requested_cpt_codes")
+    @instrumentation.staged("extract_requested_cpt_codes")
+    async def aextract_requested_cpt_codes(self) -> str:
+        return await self._aask_record(prompts.ASK_FOR_CPT_CODES)
 
-        code_meaning = self.advisor.web_search(
+    def _search_for_code_meaning(self, codes: str) -> str:
+        search_results = self.advisor.web_search(
             prompts.CPT_WEB_SEARCH.format(codes=codes)
         )
-        code_meaning = self.advisor.ask(
+        return self.advisor.ask(
             prompts.SUMMARISE_CODE_MEANINGS.format(codes=codes),
-            search_results=code_meaning,
-        )
-        result["Search Results For Code Meanings"] = code_meaning
-        logger.info(
-            f"Found and summarised the following online regarding these codes: {code_meaning}"
+            search_results=search_results,
         )
 
-        does_match = self.advisor.ask(
-            s=prompts.DETERMINE_MATCH.format(
-                summary=summary, codes=codes, code_meaning=code_meaning
-            ),
-            context=self.pages,
+    async def _asearch_for_code_meaning(self, codes: str) -> str:
+        search_results = await self.advisor.aweb_search(
+            prompts.CPT_WEB_SEARCH.format(codes=codes)
         )
-        result["Codes Match Suggested Treatment"] = does_match
+        return await self.advisor.aask(
+            prompts.SUMMARISE_CODE_MEANINGS.format(codes=codes),
+            search_results=search_results,
+        )
+
+    @instrumentation.staged("describe_cpt_codes")
+    def describe_cpt_codes(self, codes: str) -> str:
+        """
+        Describes what each of the CPT codes means. Codes in the local CPT code table are
+        described from the table, and only unknown codes are searched for online. The
+        meanings found online are remembered by the table for the next record.
+        """
+        parsed = parse_cpt_codes(codes)
+        if not parsed:
+            logger.info(f"No CPT codes recognised in '{codes}', searching online.")
+            return self._search_for_code_meaning(codes)
+
+        meanings = []
+        for code in parsed:
+            meaning = self.cpt_code_table.describe(code)
+            if meaning is None:
+                logger.info(
+                    f"CPT code {code} is not in the local table, searching online."
+                )
+                meaning = self._search_for_code_meaning(code)
+                self.cpt_code_table.remember(code, meaning)
+            meanings.append(f"{code}: {meaning}")
+        return "\n".join(meanings)
+
+    @instrumentation.staged("describe_cpt_codes")
+    async def adescribe_cpt_codes(self, codes: str) -> str:
+        """As `describe_cpt_codes`, searching for all of the unknown codes at once."""
+        parsed = parse_cpt_codes(codes)
+        if not parsed:
+            logger.info(f"No CPT codes recognised in '{codes}', searching online.")
+            return await self._asearch_for_code_meaning(codes)
+
+        meanings = {code: self.cpt_code_table.describe(code) for code in parsed}
+        missing = [code for code, meaning in meanings.items() if meaning is None]
+        if missing:
+            logger.info(
+                f"CPT codes {', '.join(missing)} are not in the local table, searching online."
+            )
+            found = await asyncio.gather(
+                *(self._asearch_for_code_meaning(code) for code in missing)
+            )
+            for code, meaning in zip(missing, found):
+                self.cpt_code_table.remember(code, meaning)
+                meanings[code] = meaning
+        return "\n".join(f"{code}: {meaning}" for code, meaning in meanings.items())
+
+    def _log_cpt_code_analysis(self, summary: str, codes: str, code_meaning: str):
+        logger.info(f"Summary of Doctor's Recommended Treatment: {summary}")
+        logger.info(f"Extracted CPT codes: {codes}")
+        logger.info(f"The meanings of these codes: {code_meaning}")
+
+    def _cpt_code_analysis(
+        self, summary: str, codes: str, code_meaning: str, does_match: str
+    ) -> OrderedDict[str, str]:
         logger.info(
             f"Confirming that those codes match what the doctor has said in the text: {does_match}"
         )
+        result = OrderedDict()
+        result["Summary of Recommended Treatment"] = summary
+        result["Extracted CPT Codes"] = codes
+        result["Meanings of CPT Codes"] = code_meaning
+        result["Codes Match Suggested Treatment"] = does_match
         return result
 
+    def extract_and_validate_cpt_codes(self) -> OrderedDict[str, str]:
+        """
+        Reads the CPT codes then checks that the procedure they correspond to aligns with the note description.
+        """
+        summary = self.summarise_doctors_orders()
+        codes = self.extract_requested_cpt_codes()
+        code_meaning = self.describe_cpt_codes(codes)
+        self._log_cpt_code_analysis(summary, codes, code_meaning)
+
+        match_prompt = prompts.DETERMINE_MATCH.format(
+            summary=summary, codes=codes, code_meaning=code_meaning
+        )
+        does_match = self._ask_record(match_prompt)
+        return self._cpt_code_analysis(summary, codes, code_meaning, does_match)
+
+    async def aextract_and_validate_cpt_codes(self) -> OrderedDict[str, str]:
+        """
+        As `extract_and_validate_cpt_codes`. The summary of the doctor's orders and the
+        codes are extracted concurrently.
+        """
+
+        async def describe_codes() -> Tuple[str, str]:
+            codes = await self.aextract_requested_cpt_codes()
+            return codes, await self.adescribe_cpt_codes(codes)
+
+        summary, (codes, code_meaning) = await asyncio.gather(
+            self.asummarise_doctors_orders(), describe_codes()
+        )
+        self._log_cpt_code_analysis(summary, codes, code_meaning)
+
+        match_prompt = prompts.DETERMINE_MATCH.format(
+            summary=summary, codes=codes, code_meaning=code_meaning
+        )
+        does_match = await self._aask_record(match_prompt)
+        return self._cpt_code_analysis(summary, codes, code_meaning, does_match)
+
+    @cache_tools.cached_result
+    @instrumentation.staged("summarise_treatment_so_far")
+    def summarise_treatment_so_far(self) -> str:
+        """Summarises the treatments attempted so far and whether any of them helped."""
+        return self._ask_record(prompts.SUMMARY_OF_TREATMENT_SO_FAR)
+
+    @cache_tools.cached_async_result("summarise_treatment_so_far")
+    @instrumentation.staged("summarise_treatment_so_far")
+    async def asummarise_treatment_so_far(self) -> str:
+        return await self._aask_record(prompts.SUMMARY_OF_TREATMENT_SO_FAR)
+
     def check_for_previous_conservative_treatment(
         self,
     ) -> Tuple[OrderedDict[str, str], bool]:
-        result = OrderedDict()
-        summary = self.advisor.ask(
-            prompts.SUMMARY_OF_TREATMENT_SO_FAR, context=self.pages
-        )
-        result["Summary of Treatment Received To Date"] = summary
+        summary = self.summarise_treatment_so_far()
         logger.info(f"Summarised attempts to help the patient so far: {summary}")
 
         confirmation = self.advisor.ask(
-            prompts.YES_NO_DID_ANYTHING_HELP, context=[Document(page_content=summary)]
+            prompts.YES_NO_DID_ANYTHING_HELP, context=[_summary_document(summary)]
+        )
+        return self._interpret_previous_treatment(summary, confirmation)
+
+    async def acheck_for_previous_conservative_treatment(
+        self,
+    ) -> Tuple[OrderedDict[str, str], bool]:
+        summary = await self.asummarise_treatment_so_far()
+        logger.info(f"Summarised attempts to help the patient so far: {summary}")
+
+        confirmation = await self.advisor.aask(
+            prompts.YES_NO_DID_ANYTHING_HELP, context=[_summary_document(summary)]
         )
+        return self._interpret_previous_treatment(summary, confirmation)
+
+    def _interpret_previous_treatment(
+        self, summary: str, confirmation: str
+    ) -> Tuple[OrderedDict[str, str], bool]:
+        result = OrderedDict()
+        result["Summary of Treatment Received To Date"] = summary
         result["Has Any Previous Treatment Helped the Patient?"] = confirmation
         logger.info(f"Interpretation: did anything help the patient? {confirmation}")
 
@@ -91,19 +344,32 @@ class MedicalRecord:
             )
 
     def present_evidence_treatment_helped(self):
-        evidence = self.advisor.ask(
-            "Please extract evidence which shows that there has been an improvement in the patient's condition, especially as the result of any treatment. QUOTE THE RELEVANT EVIDENCE VERBATIM. Present each piece of evidence in a numbered list. Each item should contain THE VERBATIM QUOTE FROM THE CONTEXT and an explanation of why this constitutes evidence that the patient's condition improved.",
-            context=self.pages,
-        )
-        return evidence
+        return self._ask_record(prompts.PRESENT_EVIDENCE_TREATMENT_HELPED)
+
+    async def apresent_evidence_treatment_helped(self) -> str:
+        return await self._aask_record(prompts.PRESENT_EVIDENCE_TREATMENT_HELPED)
 
-    @retry_tools.retry_on_failure(tolerance=3)
+    @cache_tools.cached_result
+    @retry_tools.retry_malformed_output
     def extract_patient_profile(self) -> Dict:
         extracted = self.advisor.extract_json(
-            "Extract the patient's name and date of birth in JSON format.",
+            prompts.EXTRACT_PATIENT_PROFILE,
             json_structure=PatientProfile,
-            context=self.pages,
+            context=self.context_for(prompts.EXTRACT_PATIENT_PROFILE),
         )
+        return self._add_age_to_profile(extracted)
+
+    @cache_tools.cached_async_result("extract_patient_profile")
+    @retry_tools.retry_malformed_output
+    async def aextract_patient_profile(self) -> Dict:
+        extracted = await self.advisor.aextract_json(
+            prompts.EXTRACT_PATIENT_PROFILE,
+            json_structure=PatientProfile,
+            context=self.context_for(prompts.EXTRACT_PATIENT_PROFILE),
+        )
+        return self._add_age_to_profile(extracted)
+
+    def _add_age_to_profile(self, extracted: Dict) -> Dict:
         dob_dt = extracted["dob"]
         dob_dt = datetime.strptime(dob_dt, "%m/%d/%Y")
         age = (datetime.now() - dob_dt).days // 365
@@ -114,6 +380,20 @@ class MedicalRecord:
         return self.extract_patient_profile()["name"]
 
     @classmethod
-    def from_pdf(cls, pdf_path: str) -> "MedicalRecord":
-        data = serialize.load_pdf_file(pdf_path)
-        return cls(pages=data)
+    def from_pdf(
+        cls,
+        pdf_path: str,
+        advisor: Optional[SingleDocumentInterpreter] = None,
+        context_selector: Optional[ContextSelector] = None,
+        pdf_workers: int = 1,
+        context_packer: Optional[ContextPacker] = None,
+        map_reduce: Optional[MapReduceReader] = None,
+    ) -> "MedicalRecord":
+        data = serialize.load_pdf_file(pdf_path, workers=pdf_workers)
+        return cls(
+            pages=data,
+            advisor=advisor,
+            context_selector=context_selector,
+            context_packer=context_packer,
+            map_reduce=map_reduce,
+        )
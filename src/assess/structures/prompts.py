@@ -1,5 +1,7 @@
 from enum import Enum
 
+from assess.utils.prompt_builder import SplitPrompt
+
 
 class PromptConstant(Enum):
     YES = "YES"
@@ -18,7 +20,7 @@ CPT_WEB_SEARCH = "What procedures do the following CPT codes correspond to: {cod
 SUMMARISE_DOCTORS_ORDERS = "Summarise the treatment the doctor has recommended."
 
 SUMMARISE_CODE_MEANINGS = (
-    "Summarise what the CPT codes {codes} mean based on the context."
+    "Summarise what the CPT codes {codes} mean based on the search results."
 )
 
 DETERMINE_MATCH = (
@@ -42,70 +44,118 @@ YES_NO_DID_ANYTHING_HELP = (
     "WHETHER ANYTHING HAS HELPED THE PATIENT'S CURRENT CONDITION."
 )
 
+PRESENT_EVIDENCE_TREATMENT_HELPED = (
+    "Please extract evidence which shows that there has been an improvement in the patient's condition, "
+    "especially as the result of any treatment. QUOTE THE RELEVANT EVIDENCE VERBATIM. "
+    "Present each piece of evidence in a numbered list. Each item should contain THE VERBATIM QUOTE "
+    "FROM THE CONTEXT and an explanation of why this constitutes evidence that the patient's condition improved."
+)
 
-BASIC_NO_CONTEXT = """Provide an appropriate, concise answer to the user's question.
+EXTRACT_PATIENT_PROFILE = "Extract the patient's name and date of birth in JSON format."
 
-Question: {question}
-"""
+# Long records are read in parts (see assess.models.map_reduce): each part is given the
+# task, then the answers from every part are combined
+MAP_RECORD_PART = (
+    "The medical record above is part {part} of {parts} of a longer record. "
+    "Complete the task below using this part alone. "
+    "If this part holds nothing relevant to the task, say so in one sentence."
+    "\n\nTask: {task}"
+)
 
-BASIC_CONTEXT = """Answer the question based only on the provided context and nothing else.
+REDUCE_PARTIAL_ANSWERS = (
+    "Each section of the medical record above is the answer to the task below from one "
+    "part of a record too long to read at once. Combine them into the single answer you "
+    "would give for the whole record, in the form the task asks for. Leave out parts "
+    "which found nothing relevant."
+    "\n\nTask: {task}"
+)
 
-<context>
-{context}
-</context>
+
+BASIC_NO_CONTEXT = """Provide an appropriate, concise answer to the user's question.
 
 Question: {question}
 """
 
-CONTEXT_AND_SEARCH_RESULTS = """Read the context and the search results, then answer the question:
-
-<context>
-{context}
-</context>
-
-<search-results>
-{search_result}
-</search-results>
-
-Question: {input}"""
-
-
-JSON_EXTRACTION_PROMPT = """Read the context then extract the JSON data as described in the prompt.
+# Every prompt about a record begins with RECORD_PREFIX, rendered once per record by
+# assess.utils.prompt_builder, and puts everything which varies between calls after it
+RECORD_PREFIX = (
+    "Below is a patient's medical record, followed by a task. "
+    "Complete the task based only on the medical record and anything given with the task, "
+    "and nothing else.\n\n"
+    "<medical-record>\n"
+    "{context}\n"
+    "</medical-record>\n\n"
+)
 
-<prompt>
-{prompt}
-</prompt>
+BASIC_CONTEXT = SplitPrompt(RECORD_PREFIX, "Question: {question}\n")
 
-<context>
-{context}
-</context>
+SEARCH_RESULTS_ONLY = (
+    "Answer the question based only on the web search results below and nothing else.\n\n"
+    "<search-results>\n"
+    "{search_result}\n"
+    "</search-results>\n\n"
+    "Question: {question}\n"
+)
 
-<json-format-instructions>
-{format_instructions}
-</json-format-instructions>
-"""
+CONTEXT_AND_SEARCH_RESULTS = SplitPrompt(
+    RECORD_PREFIX,
+    "Read the medical record and the search results, then answer the question:\n\n"
+    "<search-results>\n"
+    "{search_result}\n"
+    "</search-results>\n\n"
+    "Question: {question}",
+)
 
+JSON_EXTRACTION_PROMPT = SplitPrompt(
+    RECORD_PREFIX,
+    "Extract the JSON data as described in the prompt.\n\n"
+    "<prompt>\n"
+    "{prompt}\n"
+    "</prompt>\n\n"
+    "<json-format-instructions>\n"
+    "{format_instructions}\n"
+    "</json-format-instructions>\n",
+)
 
-ASSESS_AGAINST_INDIVIDUAL_CRITERIA = (
-    "Below is a patient profile, an assessment criteria, and the raw medical record. "
-    "It is your task to assess whether the patient meets the assessment criteria "
-    "for the recommended procedure. "
+_ASSESSMENT_RULES = (
     "IT IS ESSENTIAL THAT YOU QUOTE YOUR EVIDENCE FOR EACH DEDUCTION VERBATIM "
     "FROM THE PATIENT PROFILE OR MEDICAL RECORD. "
     "UNDER NO CIRCUMSTANCES SHOULD YOU MAKE AN INFERENCE, "
     "ALL OF YOUR CONCLUSIONS MUST BE DIRECTLY SUPPORTED BY EVIDENCE. "
     "Remember, a patient has not been diagnoses with a condition UNLESS IT IS DIRECTLY STATED IN THE MEDICAL RECORD. "
-    "Show your reasoning in detail. "
+)
+
+ASSESS_AGAINST_INDIVIDUAL_CRITERIA = SplitPrompt(
+    RECORD_PREFIX,
+    "Below is a patient profile and an assessment criteria. "
+    "It is your task to assess whether the patient meets the assessment criteria "
+    "for the recommended procedure. "
+    + _ASSESSMENT_RULES
+    + "Show your reasoning in detail. "
     'START YOUR RESPONSE WITH EITHER "[YES]" OR "[NO]" INDICATING IF THEY MEET THAT CRITERIA.\n\n'
     "<patient-profile>\n"
     "{profile}\n"
     "</patient-profile>\n\n"
     "<criteria>\n"
     "{criteria}\n"
-    "</criteria>\n\n"
-    "<medical-record>\n"
-    "{context}\n"
-    "</medical-record>\n\n"
+    "</criteria>\n\n",
+)
+
+ASSESS_AGAINST_ALL_CRITERIA = SplitPrompt(
+    RECORD_PREFIX,
+    "Below is a patient profile and several assessment criteria. "
+    "It is your task to assess whether the patient meets EACH of the assessment criteria "
+    "for the recommended procedure, independently of the others. "
+    + _ASSESSMENT_RULES
+    + "Respond with a JSON object with one key for each criteria, named exactly as the criteria is named. "
+    "The value of each key is your assessment of that criteria, showing your reasoning in detail. "
+    'START EACH ASSESSMENT WITH EITHER "[YES]" OR "[NO]" INDICATING IF THEY MEET THAT CRITERIA.\n\n'
+    "<patient-profile>\n"
+    "{profile}\n"
+    "</patient-profile>\n\n"
+    "<criteria>\n"
+    "{criteria}\n"
+    "</criteria>\n\n",
 )
 
 FINAL_ASSESSMENT = (
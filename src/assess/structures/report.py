@@ -0,0 +1,313 @@
+import html
+import io
+import json
+import re
+from enum import Enum
+from typing import IO, BinaryIO, Callable, Dict, List, Optional, Sequence, TextIO
+
+from assess.utils.pdf_writer import BOLD_FONT, PdfWriter
+
+HEADING_SIZES = {1: 18, 2: 14, 3: 12}
+BODY_SIZE = 11
+BULLET_INDENT = 14
+_BULLET = re.compile(r"^\s*[-*+]\s+")
+_NUMBERED = re.compile(r"^\s*(\d+)[.)]\s+")
+_TABLE_ROW = re.compile(r"^\s*\|")
+_TABLE_SEPARATOR = re.compile(r"^[\s|:-]*-[\s|:-]*$")
+_MARKDOWN_EMPHASIS = re.compile(r"\*\*|__|`")
+_MARKDOWN_ITALIC = re.compile(
+    r"(?<![\w*])\*(?=\S)([^*\n]+?)(?<=\S)\*(?![\w*])"
+    r"|(?<![\w_])_(?=\S)([^_\n]+?)(?<=\S)_(?![\w_])"
+)
+_MARKDOWN_HEADING = re.compile(r"^#+\s*")
+
+INTRO = (
+    "This document summarises whether the treatment recommended by the doctor"
+    " meets the criteria for that assessment."
+)
+
+
+class Decision(Enum):
+    APPROVED = "APPROVED"
+    DENIED = "DENIED"
+
+
+class SectionKind(Enum):
+    PREVIOUS_TREATMENTS = "previous_treatments"
+    JUSTIFICATION = "justification"
+    FINAL_ASSESSMENT = "final_assessment"
+    CRITERIA_ASSESSMENT = "criteria_assessment"
+    CPT_CODES = "cpt_codes"
+    CRITERIA = "criteria"
+    # A subsection of one of the above
+    ITEM = "item"
+
+
+class ReportSection:
+    """A titled block of a report: some text, a list of subsections, or both."""
+
+    def __init__(
+        self,
+        kind: SectionKind,
+        title: str,
+        body: str = "",
+        subsections: Sequence["ReportSection"] = (),
+    ):
+        self.kind = kind
+        self.title = title
+        self.body = body
+        self.subsections = list(subsections)
+
+    @classmethod
+    def from_items(
+        cls, kind: SectionKind, title: str, items: Dict[str, str], body: str = ""
+    ) -> "ReportSection":
+        """A section with one subsection per item, titled by the item's key."""
+        subsections = [cls(SectionKind.ITEM, k, v) for k, v in items.items()]
+        return cls(kind, title, body, subsections)
+
+    def to_dict(self) -> Dict:
+        return {
+            "kind": self.kind.value,
+            "title": self.title,
+            "body": self.body,
+            "subsections": [x.to_dict() for x in self.subsections],
+        }
+
+
+class AssessmentReport:
+    """
+    The outcome of assessing one record against one criteria, assembled once from the
+    pipeline's stages and rendered to Markdown, HTML or JSON by the functions below.
+    """
+
+    def __init__(
+        self,
+        patient_name: str,
+        decision: Decision,
+        reason: str,
+        sections: Sequence[ReportSection] = (),
+        criteria_name: Optional[str] = None,
+    ):
+        self.patient_name = patient_name
+        self.decision = decision
+        self.reason = reason
+        self.sections = list(sections)
+        self.criteria_name = criteria_name
+
+    @property
+    def title(self) -> str:
+        return f"Assessment of Recommended Procedure for {self.patient_name}"
+
+    @property
+    def approved(self) -> bool:
+        return self.decision == Decision.APPROVED
+
+    def get_sections(self, kind: SectionKind) -> List[ReportSection]:
+        return [x for x in self.sections if x.kind == kind]
+
+    def to_dict(self) -> Dict:
+        return {
+            "title": self.title,
+            "patient_name": self.patient_name,
+            "criteria": self.criteria_name,
+            "decision": self.decision.value,
+            "approved": self.approved,
+            "reason": self.reason,
+            "sections": [x.to_dict() for x in self.sections],
+        }
+
+
+def _write_markdown_section(section: ReportSection, level: int, stream: TextIO):
+    stream.write(f"{'#' * level} {section.title}\n")
+    if section.body:
+        stream.write(section.body)
+        stream.write("\n" if section.subsections else "\n\n")
+    for x in section.subsections:
+        _write_markdown_section(x, level + 1, stream)
+
+
+def render_markdown(report: AssessmentReport, stream: TextIO, heading_offset: int = 0):
+    """Writes the report as Markdown, with every heading `heading_offset` levels deeper."""
+    stream.write(f"{'#' * (1 + heading_offset)} {report.title}\n{INTRO}\n\n")
+    stream.write(f"**Assessment:** {report.decision.value}\n\n")
+    stream.write(f"**Reason:** {report.reason}\n\n")
+    for x in report.sections:
+        _write_markdown_section(x, 2 + heading_offset, stream)
+
+
+def render_combined_markdown(reports: Dict[str, AssessmentReport], stream: TextIO):
+    """Writes the reports for several criteria as one document, each beneath its name."""
+    for name, report in reports.items():
+        stream.write(f"# {name}\n\n")
+        render_markdown(report, stream, heading_offset=1)
+        stream.write("\n")
+
+
+def _markdown_to_html(text: str) -> str:
+    import markdown2
+
+    # The text may quote the record, so any HTML in it is escaped rather than rendered
+    return markdown2.markdown(text, safe_mode="escape")
+
+
+def _write_html_section(
+    section: ReportSection,
+    level: int,
+    stream: TextIO,
+    body_to_html: Callable[[str], str],
+):
+    stream.write(f"<h{level}>{html.escape(section.title)}</h{level}>\n")
+    if section.body:
+        stream.write(body_to_html(section.body))
+    for x in section.subsections:
+        _write_html_section(x, min(level + 1, 6), stream, body_to_html)
+
+
+def render_html(
+    report: AssessmentReport,
+    stream: TextIO,
+    body_to_html: Callable[[str], str] = _markdown_to_html,
+):
+    """
+    Writes the report as an HTML fragment. The text of each section was written by the
+    LLM in Markdown, so it is converted with `body_to_html`, which by default escapes any
+    HTML in it.
+    """
+    stream.write(f"<h1>{html.escape(report.title)}</h1>\n<p>{html.escape(INTRO)}</p>\n")
+    stream.write(
+        f"<p><strong>Assessment:</strong> {report.decision.value}</p>\n"
+        f"<p><strong>Reason:</strong> {html.escape(report.reason)}</p>\n"
+    )
+    for x in report.sections:
+        _write_html_section(x, 2, stream, body_to_html)
+
+
+def render_json(report: AssessmentReport, stream: TextIO):
+    json.dump(report.to_dict(), stream, indent=4)
+
+
+def _strip_emphasis(text: str) -> str:
+    text = _MARKDOWN_EMPHASIS.sub("", text)
+    return _MARKDOWN_ITALIC.sub(lambda x: x.group(1) or x.group(2), text)
+
+
+def _table_cells(line: str) -> List[str]:
+    return [x.strip() for x in line.strip().strip("|").split("|")]
+
+
+def _write_pdf_table(lines: List[str], writer: PdfWriter):
+    # Only a table whose second row is a separator has a header
+    header = len(lines) > 1 and bool(_TABLE_SEPARATOR.match(lines[1]))
+    rows = [_table_cells(x) for x in lines if not _TABLE_SEPARATOR.match(x)]
+    writer.add_table(rows, BODY_SIZE, header=header, space_after=BODY_SIZE / 2)
+
+
+def _write_pdf_body(text: str, writer: PdfWriter):
+    """
+    Lays out the LLM's Markdown as plain paragraphs: emphasis is dropped, bulleted and
+    numbered lists are indented, tables are laid out in columns and headings are bold.
+    """
+    paragraph: List[str] = []
+    table: List[str] = []
+
+    def end_paragraph():
+        if paragraph:
+            writer.add_text(" ".join(paragraph), BODY_SIZE, space_after=BODY_SIZE / 2)
+            paragraph.clear()
+        if table:
+            _write_pdf_table(table, writer)
+            table.clear()
+
+    for line in _strip_emphasis(text).splitlines():
+        if _TABLE_ROW.match(line):
+            if not table:
+                end_paragraph()
+            table.append(line)
+            continue
+        if table:
+            end_paragraph()
+        number = _NUMBERED.match(line)
+        item = number or _BULLET.match(line)
+        if item:
+            end_paragraph()
+            marker = f"{number.group(1)}." if number else "\u2022"
+            writer.add_text(
+                f"{marker} {line[item.end():]}",
+                BODY_SIZE,
+                indent=BULLET_INDENT,
+                space_after=BODY_SIZE / 4,
+            )
+        elif _MARKDOWN_HEADING.match(line):
+            end_paragraph()
+            writer.add_text(_MARKDOWN_HEADING.sub("", line), BODY_SIZE, BOLD_FONT)
+        elif line.strip():
+            paragraph.append(line.strip())
+        else:
+            end_paragraph()
+    end_paragraph()
+
+
+def _write_pdf_heading(title: str, level: int, writer: PdfWriter):
+    size = HEADING_SIZES.get(level, BODY_SIZE)
+    writer.add_space(size / 2)
+    writer.add_text(title, size, BOLD_FONT, space_after=size / 3)
+
+
+def _write_pdf_section(section: ReportSection, level: int, writer: PdfWriter):
+    _write_pdf_heading(section.title, level, writer)
+    if section.body:
+        _write_pdf_body(section.body, writer)
+    for x in section.subsections:
+        _write_pdf_section(x, level + 1, writer)
+
+
+def _layout_pdf(report: AssessmentReport, writer: PdfWriter, heading_offset: int = 0):
+    _write_pdf_heading(report.title, 1 + heading_offset, writer)
+    _write_pdf_body(INTRO, writer)
+    writer.add_text(f"Assessment: {report.decision.value}", BODY_SIZE, BOLD_FONT)
+    _write_pdf_body(f"Reason: {report.reason}", writer)
+    for x in report.sections:
+        _write_pdf_section(x, 2 + heading_offset, writer)
+
+
+def render_pdf(report: AssessmentReport, stream: BinaryIO):
+    """Writes the report as a PDF, laid out in-process without an external renderer."""
+    writer = PdfWriter()
+    _layout_pdf(report, writer)
+    writer.write(stream)
+
+
+def render_combined_pdf(reports: Dict[str, AssessmentReport], stream: BinaryIO):
+    """The PDF counterpart of `render_combined_markdown`."""
+    writer = PdfWriter()
+    for name, report in reports.items():
+        _write_pdf_heading(name, 1, writer)
+        _layout_pdf(report, writer, heading_offset=1)
+    writer.write(stream)
+
+
+def write_report(
+    report: AssessmentReport,
+    path: str,
+    render: Callable[[AssessmentReport, IO], None] = render_markdown,
+    binary: bool = False,
+):
+    """
+    Renders the report straight to a file, without building it as a string first. Set
+    `binary` for renderers which write bytes, such as `render_pdf`.
+    """
+    with open(path, "wb" if binary else "w") as f:
+        render(report, f)
+
+
+def to_markdown(report: AssessmentReport) -> str:
+    stream = io.StringIO()
+    render_markdown(report, stream)
+    return stream.getvalue()
+
+
+def to_html(report: AssessmentReport) -> str:
+    stream = io.StringIO()
+    render_html(report, stream)
+    return stream.getvalue()
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+DEFAULT_MAX_CONCURRENT_LLM_REQUESTS = 16
+
+
+class LlmRequestLimiter:
+    """
+    Limits how many LLM requests are in flight at once across every coroutine in the
+    process. asyncio semaphores belong to a single event loop, so one is kept per loop.
+    """
+
+    def __init__(self, max_requests: int = DEFAULT_MAX_CONCURRENT_LLM_REQUESTS):
+        self.max_requests = max_requests
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def set_max_requests(self, max_requests: int):
+        """Changes the limit. Takes effect for event loops which haven't made a request yet."""
+        if max_requests < 1:
+            raise ValueError(
+                f"max_requests must be at least 1 (received {max_requests})"
+            )
+        with self._lock:
+            self.max_requests = max_requests
+            self._semaphores = weakref.WeakKeyDictionary()
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._semaphores:
+                self._semaphores[loop] = asyncio.Semaphore(self.max_requests)
+            return self._semaphores[loop]
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        async with self._get_semaphore():
+            yield
+
+
+llm_request_limiter = LlmRequestLimiter()
+
+
+def llm_request_slot():
+    """Waits for a free slot in the global limit on concurrent LLM requests."""
+    return llm_request_limiter.slot()
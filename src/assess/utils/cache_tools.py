@@ -0,0 +1,94 @@
+import asyncio
+import copy
+import functools
+import threading
+from typing import Any, Callable, Dict
+
+CACHE_ATTRIBUTE = "_cached_results"
+LOCK_ATTRIBUTE = "_cached_results_lock"
+IN_FLIGHT_ATTRIBUTE = "_cached_results_in_flight"
+
+
+def _get_cache(instance: Any) -> Dict[str, Any]:
+    # The instance lock guards creation of the cache and of the per-key locks
+    lock = instance.__dict__.setdefault(LOCK_ATTRIBUTE, threading.Lock())
+    with lock:
+        return instance.__dict__.setdefault(CACHE_ATTRIBUTE, {})
+
+
+def _get_key_lock(instance: Any, key: str) -> threading.Lock:
+    with instance.__dict__[LOCK_ATTRIBUTE]:
+        locks = instance.__dict__.setdefault(f"{LOCK_ATTRIBUTE}_keys", {})
+        return locks.setdefault(key, threading.Lock())
+
+
+def cached_result(func: Callable):
+    """
+    Caches the return value of an argument-free method on the instance it was called on,
+    so that repeated calls cost nothing after the first. Concurrent first calls wait for a single
+    computation rather than each running it. Use `invalidate_cached_results` to reset.
+    """
+    key = func.__name__
+
+    @functools.wraps(func)
+    def function_wrapper(self):
+        cache = _get_cache(self)
+        if key not in cache:
+            with _get_key_lock(self, key):
+                if key not in cache:
+                    cache[key] = func(self)
+        return copy.deepcopy(cache[key])
+
+    return function_wrapper
+
+
+def _get_in_flight(instance: Any) -> Dict[str, asyncio.Future]:
+    _get_cache(instance)
+    with instance.__dict__[LOCK_ATTRIBUTE]:
+        return instance.__dict__.setdefault(IN_FLIGHT_ATTRIBUTE, {})
+
+
+def _store_result(instance: Any, key: str, task: asyncio.Future):
+    in_flight = _get_in_flight(instance)
+    # Results which finish after the cache was invalidated are discarded
+    if in_flight.get(key) is not task:
+        return
+    del in_flight[key]
+    if not task.cancelled() and task.exception() is None:
+        _get_cache(instance)[key] = task.result()
+
+
+def cached_async_result(key: str):
+    """
+    The coroutine counterpart of `cached_result`. Results are stored under `key`, which
+    should be the name of the equivalent synchronous method so that both share a cache.
+    Concurrent first calls on the same event loop await a single computation.
+    """
+
+    def the_actual_decorator(func: Callable):
+
+        @functools.wraps(func)
+        async def function_wrapper(self):
+            cache = _get_cache(self)
+            if key in cache:
+                return copy.deepcopy(cache[key])
+
+            in_flight = _get_in_flight(self)
+            task = in_flight.get(key)
+            if task is None or task.get_loop() is not asyncio.get_running_loop():
+                task = asyncio.ensure_future(func(self))
+                in_flight[key] = task
+                task.add_done_callback(functools.partial(_store_result, self, key))
+            # Shielded so that one caller being cancelled doesn't cancel the others
+            result = await asyncio.shield(task)
+            return copy.deepcopy(result)
+
+        return function_wrapper
+
+    return the_actual_decorator
+
+
+def invalidate_cached_results(instance: Any):
+    """Discards every result cached on the instance by `cached_result`."""
+    _get_cache(instance).clear()
+    _get_in_flight(instance).clear()
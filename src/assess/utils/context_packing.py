@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import functools
+import os
+import re
+import threading
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from assess.models.llms import LlmType
+from assess.utils.retrieval import CHARS_PER_TOKEN, chunk_documents
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+# tiktoken downloads encodings it hasn't cached, so it is only used once they have been
+# fetched into this directory (see the Dockerfile)
+TIKTOKEN_CACHE_ENV = "TIKTOKEN_CACHE_DIR"
+# Left in the prompt budget for the instructions, question, profile and criteria sent
+# alongside the record
+DEFAULT_RESERVED_TOKENS = 1500
+BOILERPLATE_MIN_PAGES = 3
+BOILERPLATE_PAGE_FRACTION = 0.5
+# Only lines this close to the top or bottom of a page are taken for headers and footers
+BOILERPLATE_EDGE_LINES = 3
+# Splits aim under the budget, as the length of a chunk only estimates its tokens
+SPLIT_MARGIN = 0.9
+WHITESPACE = re.compile(r"\s+")
+
+
+class ContextBudgetExceededError(Exception):
+    """Raised instead of sending a prompt which is larger than the model accepts."""
+
+
+class TokenCounter:
+    """
+    Counts tokens with a tiktoken `encoding`, or estimates them from the length of the
+    text without one. The counts of recent texts are remembered, as the same rendered
+    record is counted for every prompt about the record.
+    """
+
+    def __init__(self, encoding: Optional[Any] = None, max_entries: int = 64):
+        self.encoding = encoding
+        self._count = functools.lru_cache(maxsize=max_entries)(self._count_text)
+
+    @property
+    def exact(self) -> bool:
+        return self.encoding is not None
+
+    def _count_text(self, text: str) -> int:
+        if self.encoding is None:
+            return -(-len(text) // CHARS_PER_TOKEN)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def count(self, text: str) -> int:
+        return self._count(text)
+
+    def count_documents(self, documents: List[Document]) -> int:
+        return sum(self.count(x.page_content) for x in documents)
+
+    def count_inputs(self, value: Any) -> int:
+        """Counts the tokens of every string and document in a chain's inputs."""
+        if isinstance(value, str):
+            return self.count(value)
+        if isinstance(value, dict):
+            return sum(self.count_inputs(x) for x in value.values())
+        if isinstance(value, (list, tuple)):
+            return sum(self.count_inputs(x) for x in value)
+        return self.count(getattr(value, "page_content", ""))
+
+
+def load_token_counter(llm_type: LlmType) -> TokenCounter:
+    """
+    Loads the model's tiktoken encoding when it has been fetched into TIKTOKEN_CACHE_DIR,
+    so that counting never touches the network. Otherwise tokens are estimated.
+    """
+    if os.environ.get(TIKTOKEN_CACHE_ENV):
+        try:
+            import tiktoken
+
+            return TokenCounter(tiktoken.encoding_for_model(llm_type.value))
+        except Exception as e:
+            logger.warning(
+                f"Could not load the tokenizer for {llm_type.value}, estimating tokens "
+                f"instead ({type(e).__name__}: {e})"
+            )
+    return TokenCounter()
+
+
+_token_counters: Dict[LlmType, TokenCounter] = {}
+_token_counters_lock = threading.Lock()
+
+
+def configure_token_counter(llm_type: LlmType, counter: Optional[TokenCounter]):
+    """Counts the tokens of prompts to `llm_type` with `counter`. Pass None to reload it."""
+    with _token_counters_lock:
+        if counter is None:
+            _token_counters.pop(llm_type, None)
+        else:
+            _token_counters[llm_type] = counter
+
+
+def get_token_counter(llm_type: LlmType) -> TokenCounter:
+    with _token_counters_lock:
+        if llm_type not in _token_counters:
+            _token_counters[llm_type] = load_token_counter(llm_type)
+        return _token_counters[llm_type]
+
+
+def fits_prompt(
+    llm_type: Optional[LlmType],
+    documents: List[Document],
+    reserved_tokens: int = DEFAULT_RESERVED_TOKENS,
+) -> bool:
+    """
+    Whether the documents fit in a prompt to `llm_type`, leaving `reserved_tokens` for
+    the rest of the prompt. Without a model type, they are assumed to.
+    """
+    if llm_type is None:
+        return True
+    tokens = get_token_counter(llm_type).count_documents(documents)
+    return tokens <= llm_type.prompt_budget - reserved_tokens
+
+
+def check_prompt_budget(llm_type: LlmType, inputs: Any) -> int:
+    """
+    Counts the tokens of a chain's inputs, raising ContextBudgetExceededError if they
+    alone are more than the model accepts in a prompt.
+    """
+    tokens = get_token_counter(llm_type).count_inputs(inputs)
+    if tokens > llm_type.prompt_budget:
+        raise ContextBudgetExceededError(
+            f"The prompt uses {tokens} tokens, more than the {llm_type.prompt_budget} "
+            f"{llm_type.value} accepts"
+        )
+    return tokens
+
+
+class PackingStats:
+    """How much of a record was left out as duplicate pages and boilerplate."""
+
+    def __init__(self):
+        self.pages_in = 0
+        self.pages_out = 0
+        self.duplicate_pages = 0
+        self.empty_pages = 0
+        self.boilerplate_lines = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.tokens_exact = False
+
+    def to_dict(self) -> Dict:
+        return {
+            "pages_in": self.pages_in,
+            "pages_out": self.pages_out,
+            "duplicate_pages": self.duplicate_pages,
+            "empty_pages": self.empty_pages,
+            "boilerplate_lines": self.boilerplate_lines,
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "tokens_exact": self.tokens_exact,
+        }
+
+
+def _normalise(text: str) -> str:
+    return WHITESPACE.sub(" ", text).strip().lower()
+
+
+def _edge_lines(lines: List[str]) -> Set[int]:
+    """The indices of the first and last few non-empty lines of a page."""
+    filled = [i for i, x in enumerate(lines) if x.strip()]
+    return set(filled[:BOILERPLATE_EDGE_LINES] + filled[-BOILERPLATE_EDGE_LINES:])
+
+
+def find_boilerplate(pages: List[Document]) -> Set[str]:
+    """
+    Finds the lines, normalised, which are repeated at the top or bottom of at least half
+    of the pages (and at least BOILERPLATE_MIN_PAGES): headers, footers and fax banners.
+    Lines repeated in the body of the pages, such as the same finding at each visit, are
+    not boilerplate.
+    """
+    counts = Counter()
+    for page in pages:
+        lines = page.page_content.splitlines()
+        counts.update({_normalise(lines[i]) for i in _edge_lines(lines)})
+    threshold = max(BOILERPLATE_MIN_PAGES, len(pages) * BOILERPLATE_PAGE_FRACTION)
+    return {line for line, n in counts.items() if n >= threshold}
+
+
+class ContextPacker:
+    """
+    Fits a record into the prompts of `llm_type`, leaving `reserved_tokens` of the
+    model's prompt budget for the rest of the prompt.
+
+    Pages are first deduplicated: boilerplate lines are kept only where they first
+    appear, and pages which are then empty or repeat an earlier page are dropped. Context
+    still over the budget can be split into parts which each fit, but is never trimmed.
+    """
+
+    def __init__(
+        self,
+        llm_type: LlmType = LlmType.GPT_4,
+        reserved_tokens: int = DEFAULT_RESERVED_TOKENS,
+        counter: Optional[TokenCounter] = None,
+    ):
+        self.llm_type = llm_type
+        self.budget = llm_type.prompt_budget - reserved_tokens
+        if self.budget < 1:
+            raise ValueError(
+                f"reserved_tokens leaves no room for context in {llm_type.value} "
+                f"(received {reserved_tokens})"
+            )
+        self._counter = counter
+
+    @property
+    def counter(self) -> TokenCounter:
+        return self._counter or get_token_counter(self.llm_type)
+
+    def deduplicate(self, pages: List[Document]) -> Tuple[List[Document], PackingStats]:
+        from langchain_core.documents import Document
+
+        stats = PackingStats()
+        stats.pages_in = len(pages)
+        stats.tokens_in = self.counter.count_documents(pages)
+        stats.tokens_exact = self.counter.exact
+
+        boilerplate = find_boilerplate(pages)
+        seen_lines = set()
+        seen_pages = set()
+        packed = []
+        for page in pages:
+            lines = []
+            page_lines = page.page_content.splitlines()
+            edges = _edge_lines(page_lines)
+            for i, line in enumerate(page_lines):
+                normalised = _normalise(line)
+                if i in edges and normalised in boilerplate:
+                    if normalised in seen_lines:
+                        stats.boilerplate_lines += 1
+                        continue
+                    seen_lines.add(normalised)
+                lines.append(line)
+            content = "\n".join(lines)
+            normalised = _normalise(content)
+            if not normalised:
+                stats.empty_pages += 1
+            elif normalised in seen_pages:
+                stats.duplicate_pages += 1
+            else:
+                seen_pages.add(normalised)
+                # Unchanged pages are kept as they are, so that they keep their identity
+                if len(lines) < len(page_lines):
+                    page = Document(page_content=content, metadata=dict(page.metadata))
+                packed.append(page)
+
+        stats.pages_out = len(packed)
+        stats.tokens_out = self.counter.count_documents(packed)
+        return packed, stats
+
+    def _split_document(self, document: Document, budget: int) -> List[Document]:
+        tokens = self.counter.count(document.page_content)
+        if tokens <= budget:
+            return [document]
+        chunk_size = int(len(document.page_content) * budget / tokens * SPLIT_MARGIN)
+        chunks = chunk_documents(
+            [document], chunk_size=max(chunk_size, 1), chunk_overlap=0
+        )
+        return [x for chunk in chunks for x in self._split_document(chunk, budget)]
+
+    def split(self, documents: List[Document]) -> List[List[Document]]:
+        """Splits the documents, in order, into parts which each fit within the budget."""
+        parts = [[]]
+        used = 0
+        for document in documents:
+            for x in self._split_document(document, self.budget):
+                tokens = self.counter.count(x.page_content)
+                if parts[-1] and used + tokens > self.budget:
+                    parts.append([])
+                    used = 0
+                parts[-1].append(x)
+                used += tokens
+        return parts
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional
+
+from assess.utils import instrumentation
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+HASH_CHUNK_BYTES = 1 << 20
+PLAIN_SUFFIX = ".jsonl"
+COMPRESSED_SUFFIX = ".jsonl.gz"
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_document_key(file_hash: str, parser_version: str) -> str:
+    """Keys parsed pages by the file's content and the parser which produced them."""
+    digest = hashlib.sha256()
+    digest.update(parser_version.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(file_hash.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ParsedDocumentCache:
+    """
+    An on-disk cache of the pages parsed from each file, stored one JSON line per page
+    and gzip-compressed if `compress` is set. Entries are keyed by a hash of the file's
+    contents and the parser version, so a renamed copy of a file is a hit and an edited
+    file or upgraded parser is a miss.
+
+    Once the cache holds more than `max_entries` files or `max_bytes` bytes, the least
+    recently used entries are evicted.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        compress: bool = True,
+    ):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry_path(self, key: str) -> str:
+        suffix = COMPRESSED_SUFFIX if self.compress else PLAIN_SUFFIX
+        return os.path.join(self.directory, f"{key}{suffix}")
+
+    def _find_entry(self, key: str) -> Optional[str]:
+        # Entries written with the other compression setting are still readable
+        for suffix in (COMPRESSED_SUFFIX, PLAIN_SUFFIX):
+            path = os.path.join(self.directory, f"{key}{suffix}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    @staticmethod
+    def _open(path: str):
+        if path.endswith(COMPRESSED_SUFFIX):
+            return gzip.open(path, "rt", encoding="utf-8")
+        return open(path, encoding="utf-8")
+
+    def get(self, key: str) -> Optional[List[Document]]:
+        from langchain_core.documents import Document
+
+        path = self._find_entry(key)
+        if path is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            with self._open(path) as f:
+                pages = [Document(**json.loads(line)) for line in f]
+            # The modification time records when the entry was last used
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        instrumentation.record_cache_hit()
+        return pages
+
+    def _write(self, key: str, pages: Iterable[Document]) -> Iterator[Document]:
+        """
+        Yields the pages as it writes them to the entry for `key`. The entry is only
+        added once every page has been written, so it is never added if the caller stops
+        early.
+        """
+        path = self._entry_path(key)
+        # Written to a temporary file first so that readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw:
+                f = gzip.GzipFile(fileobj=raw, mode="wb") if self.compress else raw
+                with f:
+                    for page in pages:
+                        row = {
+                            "page_content": page.page_content,
+                            "metadata": page.metadata,
+                        }
+                        f.write((json.dumps(row) + "\n").encode("utf-8"))
+                        yield page
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        with self._lock:
+            self._evict()
+
+    def put(self, key: str, pages: Iterable[Document]):
+        for _ in self._write(key, pages):
+            pass
+
+    def iter_load(
+        self, path: str, parser_version: str, parse: Callable[[], Iterable[Document]]
+    ) -> Iterator[Document]:
+        """
+        Yields the cached pages of the file at `path`. On a miss, the pages are cached as
+        they are parsed and yielded, so they are never all held in memory at once. The
+        entry may have been parsed from a copy of the file, so cached pages are given
+        `path` as their source.
+        """
+        key = make_document_key(hash_file(path), parser_version)
+        pages = self.get(key)
+        if pages is None:
+            yield from self._write(key, parse())
+            return
+        for page in pages:
+            if "source" in page.metadata:
+                page.metadata["source"] = path
+            yield page
+
+    def load(
+        self, path: str, parser_version: str, parse: Callable[[], Iterable[Document]]
+    ) -> List[Document]:
+        """Returns the cached pages of the file at `path`, parsing and caching them on a miss."""
+        return list(self.iter_load(path, parser_version, parse))
+
+    def _entries(self) -> Iterator[os.DirEntry]:
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith((PLAIN_SUFFIX, COMPRESSED_SUFFIX)):
+                yield entry
+
+    def _evict(self):
+        if self.max_entries is None and self.max_bytes is None:
+            return
+        entries = []
+        for entry in self._entries():
+            try:
+                entries.append(
+                    (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                )
+            except FileNotFoundError:
+                # Another process evicted it first
+                continue
+        entries.sort(reverse=True)
+
+        total_bytes = 0
+        for i, (_, size, path) in enumerate(entries):
+            total_bytes += size
+            too_many = self.max_entries is not None and i >= self.max_entries
+            too_big = self.max_bytes is not None and total_bytes > self.max_bytes
+            if too_many or too_big:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+
+    def clear(self):
+        with self._lock:
+            for entry in list(self._entries()):
+                os.remove(entry.path)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._entries())
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of hits, misses and entries since the cache was opened."""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+
+_document_cache: Optional[ParsedDocumentCache] = None
+
+
+def configure_document_cache(cache: Optional[ParsedDocumentCache]):
+    """Caches the pages of every PDF loaded from now on in `cache`. Pass None to stop."""
+    global _document_cache
+    _document_cache = cache
+
+
+def get_document_cache() -> Optional[ParsedDocumentCache]:
+    return _document_cache
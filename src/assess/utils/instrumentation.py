@@ -0,0 +1,344 @@
+import contextvars
+import functools
+import inspect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+STAGE_SEPARATOR = "/"
+HISTOGRAM_BINS = 10
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar(
+    "current_trace", default=None
+)
+_current_stage: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "current_stage", default=""
+)
+_current_event: contextvars.ContextVar[Optional["Event"]] = contextvars.ContextVar(
+    "current_event", default=None
+)
+_current_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "current_deadline", default=None
+)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage or call starts after the deadline of the work it belongs to."""
+
+
+class Operation:
+    LLM = "llm"
+    WEB_SEARCH = "web_search"
+    LOAD_PDF = "load_pdf"
+
+
+class Metric:
+    WALL_TIME = "wall_time"
+    CALLS = "calls"
+    PROMPT_TOKENS = "prompt_tokens"
+    COMPLETION_TOKENS = "completion_tokens"
+    CONTEXT_CHARS = "context_chars"
+    CONTEXT_PAGES = "context_pages"
+    RETRIES = "retries"
+    CACHE_HITS = "cache_hits"
+
+
+class Event:
+    """A single call to an LLM, the search tool or the PDF loader."""
+
+    def __init__(self, stage: str, operation: str):
+        self.stage = stage
+        self.operation = operation
+        self.wall_time = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.tokens_estimated = False
+        self.context_chars = 0
+        self.context_pages = 0
+        self.cache_hit = False
+        self.error: Optional[str] = None
+
+    def set_context(self, context: Any):
+        """Records the size of the documents or text sent with the call."""
+        if not context:
+            return
+        if isinstance(context, str):
+            self.context_chars += len(context)
+        else:
+            self.context_pages += len(context)
+            self.context_chars += sum(len(x.page_content) for x in context)
+
+    @property
+    def config(self) -> Dict:
+        """A runnable config which attributes the call's token usage to this event."""
+        from assess.utils.token_usage import TokenUsageHandler
+
+        return {"callbacks": [TokenUsageHandler(self)]}
+
+    def to_dict(self) -> Dict:
+        return {
+            "stage": self.stage,
+            "operation": self.operation,
+            "wall_time": round(self.wall_time, 4),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "tokens_estimated": self.tokens_estimated,
+            "context_chars": self.context_chars,
+            "context_pages": self.context_pages,
+            "cache_hit": self.cache_hit,
+            "error": self.error,
+        }
+
+
+class Trace:
+    """
+    Everything instrumented while producing one report: each event, plus the wall time
+    and retries of each named stage.
+    """
+
+    def __init__(self, name: Optional[str] = None):
+        self.name = name
+        self.events: List[Event] = []
+        self.stage_times: Dict[str, float] = {}
+        self.retries: Dict[str, int] = {}
+        # The PackingStats of the record, if its pages were packed
+        self.packing: Optional[Any] = None
+        self._lock = threading.Lock()
+
+    def add_event(self, event: Event):
+        with self._lock:
+            self.events.append(event)
+
+    def add_stage_time(self, stage: str, seconds: float):
+        with self._lock:
+            self.stage_times[stage] = self.stage_times.get(stage, 0.0) + seconds
+
+    def add_retry(self, stage: str):
+        with self._lock:
+            self.retries[stage] = self.retries.get(stage, 0) + 1
+
+    def stage_totals(self) -> Dict[str, Dict[str, float]]:
+        """Sums the metrics of every stage. Events count towards their enclosing stages."""
+        with self._lock:
+            events = list(self.events)
+            stage_times = dict(self.stage_times)
+            retries = dict(self.retries)
+
+        names = set(stage_times) | set(retries)
+        for x in events:
+            names.update(_enclosing_stages(x.stage))
+
+        totals = {}
+        for name in sorted(names):
+            inner = [x for x in events if name in _enclosing_stages(x.stage)]
+            totals[name] = {
+                Metric.WALL_TIME: round(stage_times.get(name, 0.0), 4),
+                Metric.CALLS: len(inner),
+                Metric.PROMPT_TOKENS: sum(x.prompt_tokens for x in inner),
+                Metric.COMPLETION_TOKENS: sum(x.completion_tokens for x in inner),
+                Metric.CONTEXT_CHARS: sum(x.context_chars for x in inner),
+                Metric.CONTEXT_PAGES: sum(x.context_pages for x in inner),
+                Metric.RETRIES: sum(
+                    n for x, n in retries.items() if name in _enclosing_stages(x)
+                ),
+                Metric.CACHE_HITS: sum(x.cache_hit for x in inner),
+            }
+        return totals
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            events = [x.to_dict() for x in self.events]
+        return {
+            "name": self.name,
+            "stages": self.stage_totals(),
+            "events": events,
+            "packing": self.packing.to_dict() if self.packing else None,
+        }
+
+
+def _enclosing_stages(stage: str) -> List[str]:
+    """'a/b/c' is enclosed by 'a', 'a/b' and 'a/b/c'. Unnamed stages are not reported."""
+    if not stage:
+        return []
+    parts = stage.split(STAGE_SEPARATOR)
+    return [STAGE_SEPARATOR.join(parts[: i + 1]) for i in range(len(parts))]
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def tracing(name: Optional[str] = None) -> Iterator[Trace]:
+    """Records everything instrumented within the block, in this thread or task, to a new trace."""
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Gives the work within the block, in this thread or task and any it propagates its
+    context to, `seconds` to finish. Once they are up, every stage or call started raises
+    DeadlineExceeded, so the work stops at its next step. None sets no deadline.
+    """
+    if seconds is None:
+        yield
+        return
+    token = _current_deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _current_deadline.reset(token)
+
+
+def check_deadline():
+    """Raises DeadlineExceeded if the current deadline has passed."""
+    limit = _current_deadline.get()
+    if limit is not None and time.monotonic() > limit:
+        raise DeadlineExceeded("The deadline passed before the work was finished")
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Names the stage of the pipeline running within the block. Stages nest, so a stage
+    started within another is recorded as 'outer/inner'. Raises DeadlineExceeded if the
+    current deadline has passed.
+    """
+    check_deadline()
+    parent = _current_stage.get()
+    full_name = f"{parent}{STAGE_SEPARATOR}{name}" if parent else name
+    token = _current_stage.set(full_name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_stage_time(full_name, time.perf_counter() - start)
+
+
+def staged(name: str):
+    """Runs the decorated function or coroutine function as a named stage."""
+
+    def the_actual_decorator(func: Callable):
+
+        @functools.wraps(func)
+        def function_wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+
+        @functools.wraps(func)
+        async def async_function_wrapper(*args, **kwargs):
+            with stage(name):
+                return await func(*args, **kwargs)
+
+        if inspect.iscoroutinefunction(func):
+            return async_function_wrapper
+        return function_wrapper
+
+    return the_actual_decorator
+
+
+@contextmanager
+def event(operation: str, context: Any = None) -> Iterator[Event]:
+    """
+    Times a call within the block and adds it to the current trace, if there is one.
+    Raises DeadlineExceeded, without making the call, if the current deadline has passed.
+    """
+    check_deadline()
+    recorded = Event(_current_stage.get(), operation)
+    recorded.set_context(context)
+    token = _current_event.set(recorded)
+    start = time.perf_counter()
+    try:
+        yield recorded
+    except Exception as e:
+        recorded.error = type(e).__name__
+        raise
+    finally:
+        recorded.wall_time = time.perf_counter() - start
+        _current_event.reset(token)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_event(recorded)
+
+
+def record_cache_hit():
+    """Marks the call in progress as answered from the response cache."""
+    recorded = _current_event.get()
+    if recorded is not None:
+        recorded.cache_hit = True
+
+
+def record_retry():
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_retry(_current_stage.get())
+
+
+def record_packing(stats: Any):
+    """Adds the statistics of packing the record into its prompts to the current trace."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.packing = stats
+
+
+def propagate_context(func: Callable) -> Callable:
+    """
+    Wraps a function about to be handed to another thread so that it runs within the
+    caller's trace and stage. Wrap once per submission.
+    """
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    i = max(math.ceil(q * len(ordered)) - 1, 0)
+    return ordered[i]
+
+
+def histogram(values: Iterable[float], bins: int = HISTOGRAM_BINS) -> Dict:
+    """Summarises a set of values with their percentiles and equal-width bucket counts."""
+    ordered = sorted(values)
+    if not ordered:
+        return {"count": 0}
+    low, high = ordered[0], ordered[-1]
+    width = (high - low) / bins or 1
+    counts = [0] * bins
+    for x in ordered:
+        counts[min(int((x - low) / width), bins - 1)] += 1
+    return {
+        "count": len(ordered),
+        "min": low,
+        "max": high,
+        "mean": sum(ordered) / len(ordered),
+        "p50": _percentile(ordered, 0.5),
+        "p95": _percentile(ordered, 0.95),
+        "buckets": [
+            {"start": low + i * width, "end": low + (i + 1) * width, "count": n}
+            for i, n in enumerate(counts)
+            if n
+        ],
+    }
+
+
+def aggregate_traces(traces: Iterable[Trace]) -> Dict[str, Dict[str, Dict]]:
+    """Builds a histogram of each metric of each stage, with one value per trace."""
+    per_stage: Dict[str, Dict[str, List[float]]] = {}
+    for trace in traces:
+        for name, totals in trace.stage_totals().items():
+            metrics = per_stage.setdefault(name, {})
+            for metric, value in totals.items():
+                metrics.setdefault(metric, []).append(value)
+    return {
+        name: {metric: histogram(values) for metric, values in metrics.items()}
+        for name, metrics in per_stage.items()
+    }
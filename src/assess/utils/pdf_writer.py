@@ -0,0 +1,272 @@
+import unicodedata
+import zlib
+from typing import BinaryIO, Dict, List, Sequence
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+MARGIN = 72
+LINE_SPACING = 1.3
+ENCODING = "cp1252"
+
+REGULAR_FONT = "F1"
+BOLD_FONT = "F2"
+BASE_FONTS = {REGULAR_FONT: "Helvetica", BOLD_FONT: "Helvetica-Bold"}
+
+# Glyph widths, in thousandths of the font size, of the printable ASCII characters
+# from the standard Helvetica metrics. Other characters use DEFAULT_WIDTH.
+_ASCII = "".join(chr(x) for x in range(32, 127))
+# fmt: off
+_REGULAR_WIDTHS = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)
+_BOLD_WIDTHS = (
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+)
+# fmt: on
+GLYPH_WIDTHS = {
+    REGULAR_FONT: dict(zip(_ASCII, _REGULAR_WIDTHS)),
+    BOLD_FONT: dict(zip(_ASCII, _BOLD_WIDTHS)),
+}
+DEFAULT_WIDTH = 556
+# Space between the text of neighbouring table cells
+CELL_PADDING = 8
+
+# Symbols the LLM writes which the fonts' encoding lacks, and what to write instead
+SUBSTITUTIONS = str.maketrans(
+    {
+        "\u2265": ">=",
+        "\u2264": "<=",
+        "\u2260": "!=",
+        "\u2248": "~",
+        "\u2192": "->",
+        "\u2190": "<-",
+        "\u2194": "<->",
+        "\u21d2": "=>",
+        "\u2713": "Yes",
+        "\u2714": "Yes",
+        "\u2705": "Yes",
+        "\u2717": "No",
+        "\u2718": "No",
+        "\u274c": "No",
+        "\u2010": "-",
+        "\u2011": "-",
+        "\u2012": "-",
+        "\u2212": "-",
+        "\u2032": "'",
+        "\u2033": '"',
+        "\u25cf": "\u2022",
+        "\u25aa": "\u2022",
+        "\u202f": " ",
+        "\u2009": " ",
+    }
+)
+
+
+def text_width(text: str, font: str, size: float) -> float:
+    widths = GLYPH_WIDTHS[font]
+    return sum(widths.get(x, DEFAULT_WIDTH) for x in text) * size / 1000
+
+
+def wrap_text(text: str, font: str, size: float, max_width: float) -> List[str]:
+    """Breaks text into lines no wider than `max_width`, between words where possible."""
+    lines = []
+    line = ""
+    for word in text.split():
+        candidate = f"{line} {word}" if line else word
+        if text_width(candidate, font, size) <= max_width:
+            line = candidate
+            continue
+        if line:
+            lines.append(line)
+        # A word too long for a line of its own is broken wherever it overflows
+        while text_width(word, font, size) > max_width:
+            i = 1
+            while text_width(word[: i + 1], font, size) <= max_width:
+                i += 1
+            lines.append(word[:i])
+            word = word[i:]
+        line = word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def to_encodable(text: str) -> str:
+    """
+    Replaces the characters which the fonts' encoding lacks: common symbols with their
+    usual spelling, and accented letters with the letter alone. Anything else becomes "?".
+    """
+    text = text.translate(SUBSTITUTIONS)
+    try:
+        text.encode(ENCODING)
+        return text
+    except UnicodeEncodeError:
+        pass
+    result = []
+    for x in text:
+        try:
+            x.encode(ENCODING)
+        except UnicodeEncodeError:
+            decomposed = unicodedata.normalize("NFKD", x)
+            x = "".join(y for y in decomposed if not unicodedata.combining(y))
+            x = x.encode(ENCODING, errors="replace").decode(ENCODING)
+        result.append(x)
+    return "".join(result)
+
+
+def _escape(text: str) -> bytes:
+    encoded = text.encode(ENCODING, errors="replace")
+    return encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+class PdfWriter:
+    """
+    Lays out wrapped lines of Helvetica text onto Letter pages and writes them as a PDF,
+    without any external renderer.
+    """
+
+    def __init__(
+        self,
+        page_width: float = PAGE_WIDTH,
+        page_height: float = PAGE_HEIGHT,
+        margin: float = MARGIN,
+    ):
+        self.page_width = page_width
+        self.page_height = page_height
+        self.margin = margin
+        self.pages: List[List[bytes]] = []
+        self._y = 0.0
+        self._new_page()
+
+    def _new_page(self):
+        self.pages.append([])
+        self._y = self.page_height - self.margin
+
+    def add_space(self, points: float):
+        self._y -= points
+
+    def add_text(
+        self,
+        text: str,
+        size: float = 11,
+        font: str = REGULAR_FONT,
+        indent: float = 0,
+        space_after: float = 0,
+    ):
+        """Adds a paragraph of text, wrapped to the page width and onto new pages."""
+        max_width = self.page_width - 2 * self.margin - indent
+        for line in wrap_text(to_encodable(text), font, size, max_width):
+            self._new_line(size)
+            self._draw(line, font, size, self.margin + indent)
+        self._y -= space_after
+
+    def add_table(
+        self,
+        rows: Sequence[Sequence[str]],
+        size: float = 11,
+        header: bool = True,
+        indent: float = 0,
+        space_after: float = 0,
+    ):
+        """
+        Adds rows of cells in columns of equal width, each cell wrapped to its column.
+        With `header`, the first row is bold.
+        """
+        n_columns = max((len(x) for x in rows), default=0)
+        if not n_columns:
+            return
+        column_width = (self.page_width - 2 * self.margin - indent) / n_columns
+        for i, row in enumerate(rows):
+            font = BOLD_FONT if header and i == 0 else REGULAR_FONT
+            cells = [
+                wrap_text(to_encodable(x), font, size, column_width - CELL_PADDING)
+                for x in row
+            ]
+            for j in range(max((len(x) for x in cells), default=0)):
+                self._new_line(size)
+                for k, lines in enumerate(cells):
+                    if j < len(lines):
+                        x = self.margin + indent + k * column_width
+                        self._draw(lines[j], font, size, x)
+            self._y -= size * (LINE_SPACING - 1)
+        self._y -= space_after
+
+    def _new_line(self, size: float):
+        line_height = size * LINE_SPACING
+        if self._y - line_height < self.margin:
+            self._new_page()
+        self._y -= line_height
+
+    def _draw(self, line: str, font: str, size: float, x: float):
+        self.pages[-1].append(
+            f"BT /{font} {size} Tf {x:.2f} {self._y:.2f} Td (".encode()
+            + _escape(line)
+            + b") Tj ET"
+        )
+
+    def _objects(self) -> Dict[int, bytes]:
+        # Objects: 1 catalog, 2 page tree, then the fonts, then a page and its content
+        # per page
+        font_ids = {name: 3 + i for i, name in enumerate(BASE_FONTS)}
+        first_page_id = 3 + len(font_ids)
+        page_ids = [first_page_id + 2 * i for i in range(len(self.pages))]
+        fonts = " ".join(f"/{name} {x} 0 R" for name, x in font_ids.items())
+        objects = {
+            1: b"<< /Type /Catalog /Pages 2 0 R >>",
+            2: (
+                f"<< /Type /Pages /Kids [{' '.join(f'{x} 0 R' for x in page_ids)}]"
+                f" /Count {len(page_ids)} >>"
+            ).encode(),
+        }
+        for name, font_id in font_ids.items():
+            objects[font_id] = (
+                f"<< /Type /Font /Subtype /Type1 /BaseFont /{BASE_FONTS[name]}"
+                " /Encoding /WinAnsiEncoding >>"
+            ).encode()
+        for page_id, commands in zip(page_ids, self.pages):
+            stream = zlib.compress(b"\n".join(commands))
+            objects[page_id] = (
+                "<< /Type /Page /Parent 2 0 R"
+                f" /MediaBox [0 0 {self.page_width} {self.page_height}]"
+                f" /Resources << /Font << {fonts} >> >> /Contents {page_id + 1} 0 R >>"
+            ).encode()
+            objects[page_id + 1] = (
+                f"<< /Length {len(stream)} /Filter /FlateDecode >>\nstream\n".encode()
+                + stream
+                + b"\nendstream"
+            )
+        return objects
+
+    def write(self, stream: BinaryIO):
+        objects = self._objects()
+        offsets: List[int] = []
+        written = 0
+
+        def emit(data: bytes):
+            nonlocal written
+            stream.write(data)
+            written += len(data)
+
+        emit(b"%PDF-1.4\n")
+        for obj_id in sorted(objects):
+            offsets.append(written)
+            emit(f"{obj_id} 0 obj\n".encode() + objects[obj_id] + b"\nendobj\n")
+        xref_offset = written
+        emit(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+        for offset in offsets:
+            emit(f"{offset:010d} 00000 n \n".encode())
+        emit(
+            (
+                f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+                f"startxref\n{xref_offset}\n%%EOF\n"
+            ).encode()
+        )
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Tuple, Union
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+DOCUMENT_SEPARATOR = "\n\n"
+PREFIX_VARIABLE = "prefix"
+CONTEXT_VARIABLE = "context"
+DEFAULT_MAX_ENTRIES = 32
+
+Context = Union[str, List["Document"]]
+
+
+class SplitPrompt:
+    """
+    A prompt in two parts: a `prefix` holding the context, which is the same for every call
+    about the same record, and a `suffix` holding everything which changes between calls.
+    The prefix may only use the {context} variable.
+    """
+
+    def __init__(self, prefix: str, suffix: str):
+        self.prefix = prefix
+        self.suffix = suffix
+
+    @property
+    def template(self) -> str:
+        """A template for the whole prompt, taking the rendered prefix as {prefix}."""
+        return f"{{{PREFIX_VARIABLE}}}{self.suffix}"
+
+    def render_prefix(self, context: Context) -> str:
+        if not isinstance(context, str):
+            context = DOCUMENT_SEPARATOR.join(x.page_content for x in context)
+        return self.prefix.format(**{CONTEXT_VARIABLE: context})
+
+
+class PromptBuilder:
+    """
+    Renders the prefix of each SplitPrompt once per context and hands back the same
+    string to every later call with that context. Every call about a record then begins
+    with byte-identical text, so provider-side prompt caching and the response cache can
+    hit, and the record is only joined into text once.
+
+    Contexts are recognised by the identity of their documents. The last `max_entries`
+    prefixes are kept, along with their documents, so an identity can't be reused while
+    its prefix is cached.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._prefixes: OrderedDict[Tuple, Tuple[Context, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, prompt: SplitPrompt, context: Context) -> Tuple:
+        if isinstance(context, str):
+            return prompt.prefix, context
+        return prompt.prefix, tuple(id(x) for x in context)
+
+    def prefix(self, prompt: SplitPrompt, context: Context) -> str:
+        key = self._key(prompt, context)
+        with self._lock:
+            if key in self._prefixes:
+                self._prefixes.move_to_end(key)
+                self.hits += 1
+                return self._prefixes[key][1]
+        rendered = prompt.render_prefix(context)
+        with self._lock:
+            self.misses += 1
+            # Another thread may have rendered it first; keep one copy so that it is shared
+            _, rendered = self._prefixes.setdefault(key, (context, rendered))
+            self._prefixes.move_to_end(key)
+            while len(self._prefixes) > self.max_entries:
+                self._prefixes.popitem(last=False)
+        return rendered
+
+    def inputs(self, prompt: SplitPrompt, context: Context, /, **values) -> Dict:
+        """The inputs for a chain built from `prompt.template`."""
+        return {PREFIX_VARIABLE: self.prefix(prompt, context), **values}
+
+    def build(self, prompt: SplitPrompt, context: Context, /, **values) -> str:
+        """Renders the whole prompt as text."""
+        return self.prefix(prompt, context) + prompt.suffix.format(**values)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._prefixes)
+
+    def clear(self):
+        with self._lock:
+            self._prefixes.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+prompt_builder = PromptBuilder()
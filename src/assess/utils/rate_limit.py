@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from assess.utils.retrieval import CHARS_PER_TOKEN
+
+SECONDS_PER_MINUTE = 60.0
+
+
+class TokenBucket:
+    """
+    Refills at `per_minute` units a minute, holding at most `capacity` (a minute's worth
+    by default). Callers reserve units up front and the bucket may go into debt, so each
+    caller waits behind those who reserved before it.
+    """
+
+    def __init__(
+        self,
+        per_minute: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if per_minute <= 0:
+            raise ValueError(f"per_minute must be positive (received {per_minute})")
+        self.rate = per_minute / SECONDS_PER_MINUTE
+        self.capacity = capacity if capacity is not None else per_minute
+        self._clock = clock
+        self._available = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Takes `amount` units, returning how many seconds to wait before using them."""
+        with self._lock:
+            now = self._clock()
+            refilled = self._available + (now - self._updated) * self.rate
+            self._available = min(self.capacity, refilled) - amount
+            self._updated = now
+            return max(0.0, -self._available / self.rate)
+
+
+class RateLimiter:
+    """
+    Limits the requests and tokens sent per minute. One limiter is shared by every thread
+    and asyncio task in the process, as the limits are set per API key.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.requests = (
+            TokenBucket(requests_per_minute, clock=clock)
+            if requests_per_minute
+            else None
+        )
+        self.tokens = (
+            TokenBucket(tokens_per_minute, clock=clock) if tokens_per_minute else None
+        )
+
+    def reserve(self, tokens: int = 0) -> float:
+        """Reserves one request of `tokens` tokens, returning how many seconds to wait."""
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+    def acquire(self, tokens: int = 0):
+        wait = self.reserve(tokens)
+        if wait:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int = 0):
+        wait = self.reserve(tokens)
+        if wait:
+            await asyncio.sleep(wait)
+
+
+_rate_limiters: Dict[str, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def configure_rate_limiter(operation: str, limiter: Optional[RateLimiter]):
+    """Limits every call of `operation` made from now on. Pass None to remove the limit."""
+    with _rate_limiters_lock:
+        if limiter is None:
+            _rate_limiters.pop(operation, None)
+        else:
+            _rate_limiters[operation] = limiter
+
+
+def get_rate_limiter(operation: str) -> Optional[RateLimiter]:
+    with _rate_limiters_lock:
+        return _rate_limiters.get(operation)
+
+
+def acquire(operation: str, tokens: int = 0):
+    """Waits until a call of `operation` using `tokens` tokens is within its limit."""
+    limiter = get_rate_limiter(operation)
+    if limiter is not None:
+        limiter.acquire(tokens)
+
+
+async def aacquire(operation: str, tokens: int = 0):
+    limiter = get_rate_limiter(operation)
+    if limiter is not None:
+        await limiter.aacquire(tokens)
+
+
+def _count_chars(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_count_chars(x) for x in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_count_chars(x) for x in value)
+    # Documents
+    return len(getattr(value, "page_content", ""))
+
+
+def estimate_input_tokens(inputs: Any) -> int:
+    """Estimates the prompt tokens a chain's inputs will use, before they are sent."""
+    return _count_chars(inputs) // CHARS_PER_TOKEN
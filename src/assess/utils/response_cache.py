@@ -0,0 +1,140 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.globals import set_llm_cache
+from langchain_core.load import dumps, loads
+
+from assess.utils import instrumentation
+
+
+class CacheMissInReplayMode(Exception):
+    """To be raised if a response is not cached and the cache is replaying only"""
+
+    pass
+
+
+def make_cache_key(prompt: str, llm_string: str) -> str:
+    """
+    Hashes the model's configuration (which includes the model name) together with the
+    rendered prompt. The stuffed context documents are part of the rendered prompt, so a
+    change to any page of the record produces a different key.
+    """
+    digest = hashlib.sha256()
+    digest.update(llm_string.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SqliteResponseCache(BaseCache):
+    """
+    An on-disk cache of LLM responses backed by SQLite.
+
+    Entries older than `ttl_seconds` are treated as missing, and once the cache holds more
+    than `max_entries` the least recently used entries are evicted. In `replay` mode the
+    cache is never written to and a miss raises `CacheMissInReplayMode` instead of calling
+    the model, so a re-run is guaranteed to cost no tokens.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        replay: bool = False,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+
+    def _is_expired(self, created: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created > self.ttl_seconds
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = make_cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT value, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self._is_expired(row[1], now):
+                if not self.replay:
+                    self._connection.execute(
+                        "DELETE FROM responses WHERE key = ?", (key,)
+                    )
+                row = None
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                instrumentation.record_cache_hit()
+                if not self.replay:
+                    self._connection.execute(
+                        "UPDATE responses SET accessed = ? WHERE key = ?", (now, key)
+                    )
+
+        if row is None:
+            if self.replay:
+                raise CacheMissInReplayMode(
+                    "No cached response found for this prompt and the cache is in replay mode."
+                )
+            return None
+        return loads(row[0])
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE):
+        if self.replay:
+            return
+        key = make_cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, dumps(list(return_val)), now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float):
+        if self.ttl_seconds is not None:
+            self._connection.execute(
+                "DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,)
+            )
+        if self.max_entries is not None:
+            self._connection.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY accessed DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self, **kwargs: Any):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM responses"
+            ).fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of hits, misses and entries since the cache was opened."""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+
+def configure_response_cache(cache: Optional[BaseCache]):
+    """Routes every LLM call through `cache`. Pass None to stop caching."""
+    set_llm_cache(cache)
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+CHARS_PER_TOKEN = 4
+
+
+def tokenise(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def estimate_tokens(documents: List[Document]) -> int:
+    """A rough estimate of how many tokens the documents will use in a prompt."""
+    return sum(len(x.page_content) for x in documents) // CHARS_PER_TOKEN
+
+
+def chunk_documents(
+    pages: List[Document], chunk_size: int = 1500, chunk_overlap: int = 200
+) -> List[Document]:
+    """Splits pages into overlapping chunks, keeping each page's metadata on its chunks."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True
+    )
+    chunks = splitter.split_documents(pages)
+    for i, chunk in enumerate(chunks):
+        chunk.metadata["chunk"] = i
+    return chunks
+
+
+class BM25Index:
+    """An in-process BM25 index over a list of documents."""
+
+    def __init__(self, documents: List[Document], k1: float = 1.5, b: float = 0.75):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self._term_frequencies = [Counter(tokenise(x.page_content)) for x in documents]
+        self._lengths = [sum(x.values()) for x in self._term_frequencies]
+        self._mean_length = sum(self._lengths) / max(len(self._lengths), 1)
+        document_frequencies = Counter()
+        for frequencies in self._term_frequencies:
+            document_frequencies.update(frequencies.keys())
+        n = len(documents)
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in document_frequencies.items()
+        }
+
+    def scores(self, query: str) -> List[float]:
+        terms = set(tokenise(query))
+        result = []
+        for frequencies, length in zip(self._term_frequencies, self._lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / (self._mean_length or 1))
+            for term in terms:
+                tf = frequencies.get(term)
+                if tf:
+                    score += self._idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            result.append(score)
+        return result
+
+    def rank(self, query: str) -> List[int]:
+        """Returns the indices of the documents, most relevant first."""
+        scores = self.scores(query)
+        return sorted(range(len(scores)), key=lambda i: (-scores[i], i))
+
+
+class ContextSelector:
+    """
+    Chooses which parts of a record to send with a prompt. Records that fit within
+    `token_budget` are sent whole. Larger records are chunked and indexed, and only the
+    chunks most relevant to the prompt are sent, up to `top_k` chunks and the token budget.
+    The chosen chunks are returned in the order they appear in the record.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 6000,
+        top_k: Optional[int] = None,
+        chunk_size: int = 1500,
+        chunk_overlap: int = 200,
+    ):
+        self.token_budget = token_budget
+        self.top_k = top_k
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def needs_retrieval(self, pages: List[Document]) -> bool:
+        return estimate_tokens(pages) > self.token_budget
+
+    def build_index(self, pages: List[Document]) -> BM25Index:
+        return BM25Index(chunk_documents(pages, self.chunk_size, self.chunk_overlap))
+
+    def select(self, index: BM25Index, query: str) -> List[Document]:
+        selected = []
+        used = 0
+        for i in index.rank(query):
+            if self.top_k is not None and len(selected) >= self.top_k:
+                break
+            cost = estimate_tokens([index.documents[i]])
+            if used + cost > self.token_budget:
+                continue
+            selected.append(i)
+            used += cost
+        return [index.documents[i] for i in sorted(selected)]
@@ -1,21 +1,152 @@
-from typing import Callable
+import asyncio
+import functools
+import inspect
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional, Tuple, Type
 
+from loguru import logger
 
-def retry_on_failure(tolerance: int = 3):
+from assess.utils import instrumentation
+
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30.0
+DEFAULT_CALL_ATTEMPTS = 5
+TRANSIENT_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+
+def _transient_search_errors() -> Tuple[Type[BaseException], ...]:
+    """
+    The search's rate limit and timeout errors. Versions of duckduckgo_search before 5
+    raise DuckDuckGoSearchException for every failure, including these.
+    """
+    from duckduckgo_search import exceptions
+
+    errors = tuple(
+        getattr(exceptions, x)
+        for x in ("RatelimitException", "TimeoutException")
+        if hasattr(exceptions, x)
+    )
+    return errors or (exceptions.DuckDuckGoSearchException,)
+
+
+def is_transient_error(e: BaseException) -> bool:
+    """Rate limits, timeouts, dropped connections and server errors are worth retrying."""
+    import openai
+
+    if isinstance(
+        e,
+        (TimeoutError, ConnectionError, openai.APIConnectionError)
+        + _transient_search_errors(),
+    ):
+        return True
+    return getattr(e, "status_code", None) in TRANSIENT_STATUS_CODES
+
+
+def is_malformed_output(e: BaseException) -> bool:
+    """
+    Output which couldn't be parsed or validated, which the model may get right if asked
+    again. Transient errors are left to the chain's own retries.
+    """
+    return isinstance(e, (ValueError, KeyError)) and not is_transient_error(e)
+
+
+def retry_after_seconds(e: BaseException) -> Optional[float]:
+    """Reads how long the server asked us to wait from the error's Retry-After header."""
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    if not headers:
+        return None
+    if headers.get("retry-after-ms") is not None:
+        try:
+            return max(float(headers["retry-after-ms"]) / 1000, 0.0)
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if retry_after is None:
+        return None
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+    # Otherwise it is an HTTP date
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def backoff_delay(fails: int, base_delay: float, max_delay: float) -> float:
+    """Exponential backoff with full jitter, so that concurrent callers spread out."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (fails - 1)))
+
+
+def retry_on_failure(
+    tolerance: int = 3,
+    base_delay: float = DEFAULT_BASE_DELAY,
+    max_delay: float = DEFAULT_MAX_DELAY,
+    retry_if: Optional[Callable[[Exception], bool]] = None,
+):
+    """
+    Calls the decorated function or coroutine function up to `tolerance` times, waiting
+    with exponential backoff between attempts, or for as long as the server asked. Only
+    errors for which `retry_if` is true are retried (all of them, by default). The last
+    error is raised once the attempts are used up.
+    """
+    if tolerance < 1:
+        raise ValueError(f"tolerance must be at least 1 (received {tolerance})")
+
+    def retry_delay(e: Exception, fails: int) -> Optional[float]:
+        if fails >= tolerance or (retry_if is not None and not retry_if(e)):
+            return None
+        instrumentation.record_retry()
+        delay = retry_after_seconds(e)
+        if delay is None:
+            delay = backoff_delay(fails, base_delay, max_delay)
+        logger.warning(
+            f"Attempt {fails} of {tolerance} failed ({type(e).__name__}: {e}). "
+            f"Retrying in {delay:.2f}s..."
+        )
+        return delay
 
     def the_actual_decorator(func: Callable):
 
+        @functools.wraps(func)
         def function_wrapper(*args, **kwargs):
             fails = 0
-            while fails < tolerance:
+            while True:
                 try:
-                    result = func(*args, **kwargs)
-                    return result
+                    return func(*args, **kwargs)
                 except Exception as e:
                     fails += 1
-                    if fails > tolerance:
-                        raise e
+                    delay = retry_delay(e, fails)
+                    if delay is None:
+                        raise
+                    time.sleep(delay)
 
+        @functools.wraps(func)
+        async def async_function_wrapper(*args, **kwargs):
+            fails = 0
+            while True:
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    fails += 1
+                    delay = retry_delay(e, fails)
+                    if delay is None:
+                        raise
+                    await asyncio.sleep(delay)
+
+        if inspect.iscoroutinefunction(func):
+            return async_function_wrapper
         return function_wrapper
 
     return the_actual_decorator
+
+
+retry_transient_failures = retry_on_failure(
+    tolerance=DEFAULT_CALL_ATTEMPTS, retry_if=is_transient_error
+)
+retry_malformed_output = retry_on_failure(tolerance=3, retry_if=is_malformed_output)
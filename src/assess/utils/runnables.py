@@ -0,0 +1,49 @@
+from typing import Any, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from assess.models.llms import LlmType
+from assess.utils import context_packing, rate_limit
+from assess.utils.instrumentation import Operation
+from assess.utils.retry_tools import retry_transient_failures
+
+
+class RateLimitedRunnable(Runnable):
+    """
+    Wraps a chain so that every call to it, including each call of a batch, first waits
+    for the rate limit configured for `operation`, and transient failures are retried.
+    Given the `llm_type` the chain calls, inputs too large for its prompts are refused
+    before they are sent.
+    """
+
+    def __init__(
+        self,
+        bound: Runnable,
+        operation: str = Operation.LLM,
+        llm_type: Optional[LlmType] = None,
+    ):
+        self.bound = bound
+        self.operation = operation
+        self.llm_type = llm_type
+
+    def _check_budget(self, input: Any):
+        if self.llm_type is not None:
+            context_packing.check_prompt_budget(self.llm_type, input)
+
+    @retry_transient_failures
+    def invoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Any:
+        self._check_budget(input)
+        rate_limit.acquire(self.operation, rate_limit.estimate_input_tokens(input))
+        return self.bound.invoke(input, config, **kwargs)
+
+    @retry_transient_failures
+    async def ainvoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Any:
+        self._check_budget(input)
+        await rate_limit.aacquire(
+            self.operation, rate_limit.estimate_input_tokens(input)
+        )
+        return await self.bound.ainvoke(input, config, **kwargs)
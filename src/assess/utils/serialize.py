@@ -1,10 +1,33 @@
+from __future__ import annotations
+
 import json
+import multiprocessing
 import os
-from typing import Dict, List, Union
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from importlib.metadata import version
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Union
+
+from assess.utils import document_cache, instrumentation
+from assess.utils.instrumentation import Operation
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+try:
+    import tomllib
+except ModuleNotFoundError:
+    # Python < 3.11
+    tomllib = None
 
-import tomlkit
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_core.documents import Document
+PDF_PAGES_PER_RANGE = 25
+# Bump the suffix whenever a change to the parsing or splitting changes the pages produced
+PDF_PARSER_VERSION = f"pypdf-{version('pypdf')}-split-1"
+TOML_SUFFIX = ".toml"
+CRITERIA_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "criteria"
+)
 
 
 def load_text_file(path: str) -> str:
@@ -19,11 +42,28 @@ def write_text_file(text: str, path: str):
 
 
 def load_toml_file(path: str) -> Dict:
+    import tomlkit
+
     raw = load_text_file(path)
     return tomlkit.parse(raw)
 
 
+def read_toml_file(path: str) -> Dict:
+    """
+    Reads a TOML file into plain dicts and lists. Much faster than `load_toml_file`, but
+    the result can't be written back out with its formatting intact.
+    """
+    if tomllib is None:
+        import tomlkit
+
+        return tomlkit.parse(load_text_file(path)).unwrap()
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
 def write_toml_file(data: Dict, path: str):
+    import tomlkit
+
     with open(path, "w") as f:
         f.write(tomlkit.dumps(data))
 
@@ -39,19 +79,149 @@ def write_json_file(data: Union[Dict, List], path: str):
         json.dump(data, f, indent=4)
 
 
-def load_pdf_file(path: str, as_raw_text: bool = False) -> List[Document]:
-    loader = PyPDFLoader(path)
-    result = loader.load_and_split()
-    if as_raw_text:
-        return "\n\n".join(x.page_content for x in result)
-    else:
-        return result
+def _parse_pdf_pages(path: str, start: int = 0, stop: Optional[int] = None):
+    from langchain_core.documents import Document
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    stop = len(reader.pages) if stop is None else min(stop, len(reader.pages))
+    for page_number in range(start, stop):
+        yield Document(
+            page_content=reader.pages[page_number].extract_text(),
+            metadata={"source": path, "page": page_number},
+        )
+
+
+def _split_pages(pages: Iterable[Document]) -> Iterator[Document]:
+    # Splits exactly as PyPDFLoader.load_and_split does, but one page at a time
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter()
+    for page in pages:
+        yield from splitter.split_documents([page])
+
+
+def _parse_pdf_page_range(path: str, start: int, stop: int) -> List[Document]:
+    return list(_split_pages(_parse_pdf_pages(path, start, stop)))
+
+
+_pdf_parse_pool: Optional[ProcessPoolExecutor] = None
+_pdf_parse_pool_workers = 0
+_pdf_parse_pool_lock = threading.Lock()
+
+
+def get_pdf_parse_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Returns the process pool on which PDFs are parsed, shared by every file and thread.
+    It is started on first use, and restarted larger if more `workers` are asked for.
+    Workers are spawned rather than forked, as PDFs are loaded from worker threads and
+    forking a multi-threaded process can deadlock the child.
+    """
+    global _pdf_parse_pool, _pdf_parse_pool_workers
+    with _pdf_parse_pool_lock:
+        if _pdf_parse_pool is None or _pdf_parse_pool_workers < workers:
+            if _pdf_parse_pool is not None:
+                # Ranges already submitted to the old pool are still parsed
+                _pdf_parse_pool.shutdown(wait=False)
+            _pdf_parse_pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            _pdf_parse_pool_workers = workers
+        return _pdf_parse_pool
+
+
+def close_pdf_parse_pool():
+    global _pdf_parse_pool, _pdf_parse_pool_workers
+    with _pdf_parse_pool_lock:
+        pool, _pdf_parse_pool = _pdf_parse_pool, None
+        _pdf_parse_pool_workers = 0
+    if pool is not None:
+        pool.shutdown()
+
+
+def _iter_page_ranges_in_parallel(
+    path: str, n_pages: int, workers: int, pages_per_range: int
+) -> Iterator[Document]:
+    ranges = [
+        (start, min(start + pages_per_range, n_pages))
+        for start in range(0, n_pages, pages_per_range)
+    ]
+    executor = get_pdf_parse_pool(workers)
+    # Only a few ranges are parsed ahead of the consumer, which bounds memory
+    pending = deque()
+    try:
+        for start, stop in ranges:
+            pending.append(executor.submit(_parse_pdf_page_range, path, start, stop))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def iter_pdf_file(
+    path: str, workers: int = 1, pages_per_range: int = PDF_PAGES_PER_RANGE
+) -> Iterator[Document]:
+    """
+    Yields the split pages of a PDF in order as they are parsed, so callers can start on
+    the first pages before the last are read. With `workers` above 1, files of more than
+    `pages_per_range` pages are parsed in ranges of that many pages on the shared pool of
+    `get_pdf_parse_pool`.
+    """
+    if workers > 1:
+        from pypdf import PdfReader
+
+        n_pages = len(PdfReader(path).pages)
+        if n_pages > pages_per_range:
+            yield from _iter_page_ranges_in_parallel(
+                path, n_pages, workers, pages_per_range
+            )
+            return
+    yield from _split_pages(_parse_pdf_pages(path))
+
+
+def load_pdf_file(
+    path: str, as_raw_text: bool = False, workers: int = 1
+) -> Union[List[Document], str]:
+    """
+    Loads the split pages of a PDF. If a document cache has been configured, pages parsed
+    before are read from it instead of the PDF. Either way the pages are streamed, so
+    only the list returned, or only the raw text, is ever held in memory.
+    """
+    with instrumentation.event(Operation.LOAD_PDF) as load:
+        cache = document_cache.get_document_cache()
+        if cache is None:
+            pages = iter_pdf_file(path, workers=workers)
+        else:
+            pages = cache.iter_load(
+                path, PDF_PARSER_VERSION, lambda: iter_pdf_file(path, workers=workers)
+            )
+        result = []
+        for x in pages:
+            load.set_context([x])
+            result.append(x.page_content if as_raw_text else x)
+    return "\n\n".join(result) if as_raw_text else result
+
+
+def get_criteria_path(criteria_for: str) -> str:
+    return os.path.join(CRITERIA_DIR, f"{criteria_for}{TOML_SUFFIX}")
+
+
+def list_criteria_specs(directory: str = CRITERIA_DIR) -> List[str]:
+    """Returns the names of the criteria specs in `directory`, in alphabetical order."""
+    return sorted(
+        x[: -len(TOML_SUFFIX)] for x in os.listdir(directory) if x.endswith(TOML_SUFFIX)
+    )
 
 
 def load_assesment_criteria(criteria_for: str) -> Dict:
+    return read_toml_file(get_criteria_path(criteria_for))
+
+
+def load_cpt_code_table(table_name: str) -> Dict:
     this_file_dirname = os.path.dirname(os.path.abspath(__file__))
     package_root = os.path.dirname(this_file_dirname)
-    crieria_path = os.path.join(
-        package_root, "models", "criteria", f"{criteria_for}.toml"
-    )
-    return load_toml_file(crieria_path)
+    table_path = os.path.join(package_root, "models", "cpt_codes", f"{table_name}.toml")
+    return read_toml_file(table_path)
@@ -0,0 +1,61 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from assess.utils import instrumentation
+
+
+class TaskGraph:
+    """
+    A small dependency graph of named tasks. Each task is started on a thread pool as soon
+    as every task it depends on has finished, and receives their results as keyword
+    arguments named after those tasks. Tasks run within the caller's trace.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers
+        self._tasks: Dict[str, Tuple[Callable, Tuple[str, ...]]] = {}
+
+    def add_task(self, name: str, func: Callable, depends_on: Iterable[str] = ()):
+        if name in self._tasks:
+            raise KeyError(f'A task named "{name}" has already been added')
+        depends_on = tuple(depends_on)
+        for dependency in depends_on:
+            if dependency not in self._tasks:
+                raise KeyError(
+                    f'Task "{name}" depends on "{dependency}", which must be added first'
+                )
+        self._tasks[name] = (func, depends_on)
+
+    def _ready_tasks(self, results: Dict[str, Any], started: List[str]) -> List[str]:
+        return [
+            name
+            for name, (_, depends_on) in self._tasks.items()
+            if name not in started and all(x in results for x in depends_on)
+        ]
+
+    def run(self) -> Dict[str, Any]:
+        """Runs every task and returns their results keyed by task name."""
+        results: Dict[str, Any] = {}
+        started: List[str] = []
+        running: Dict[Future, str] = {}
+        max_workers = self.max_workers or max(len(self._tasks), 1)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while len(results) < len(self._tasks):
+                for name in self._ready_tasks(results, started):
+                    func, depends_on = self._tasks[name]
+                    kwargs = {x: results[x] for x in depends_on}
+                    func = instrumentation.propagate_context(func)
+                    running[executor.submit(func, **kwargs)] = name
+                    started.append(name)
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception:
+                        for pending in running:
+                            pending.cancel()
+                        raise
+        return results
@@ -0,0 +1,47 @@
+import threading
+from typing import Any, Dict, List
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from assess.utils.instrumentation import Event
+from assess.utils.retrieval import CHARS_PER_TOKEN
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """
+    Adds the tokens used by an LLM call to its event. Counts reported by the API are used
+    where available, otherwise they are estimated from the text. Cache hits cost nothing.
+    """
+
+    run_inline = True
+
+    def __init__(self, event: Event):
+        self.event = event
+        # Keyed by run, as one event can cover a batch of concurrent calls
+        self._estimated_prompt_tokens: Dict[Any, int] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized: Dict, messages: List[List], **kwargs):
+        chars = sum(len(str(x.content)) for batch in messages for x in batch)
+        with self._lock:
+            self._estimated_prompt_tokens[kwargs.get("run_id")] = (
+                chars // CHARS_PER_TOKEN
+            )
+
+    def on_llm_end(self, response: LLMResult, **kwargs):
+        with self._lock:
+            estimated_prompt_tokens = self._estimated_prompt_tokens.pop(
+                kwargs.get("run_id"), 0
+            )
+            if self.event.cache_hit:
+                return
+            usage = (response.llm_output or {}).get("token_usage")
+            if usage:
+                self.event.prompt_tokens += usage.get("prompt_tokens", 0)
+                self.event.completion_tokens += usage.get("completion_tokens", 0)
+                return
+            self.event.tokens_estimated = True
+            self.event.prompt_tokens += estimated_prompt_tokens
+            chars = sum(len(x.text) for batch in response.generations for x in batch)
+            self.event.completion_tokens += chars // CHARS_PER_TOKEN
@@ -0,0 +1,223 @@
+"""
+Benchmarks the full pipeline offline, with a fake LLM and a stub search tool standing in
+for OpenAI and DuckDuckGo. Run with:
+
+    python -m tests.benchmarks.benchmark_pipeline --output benchmark.json
+
+Pass a previous output as --baseline to fail when throughput drops by more than
+--tolerance.
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from assess.models.assessors import DEFAULT_MAX_CONCURRENCY
+from assess.models.batch import BatchRunner, BatchStatus
+from assess.structures.criteria import AssessmentCriteria
+from tests.tools.offline_pipeline import OfflinePipeline
+from tests.tools.synthetic_records import write_synthetic_records
+
+DEFAULT_PAGE_COUNTS = (1, 5, 20)
+DEFAULT_RECORDS_PER_SIZE = 3
+
+
+class BenchmarkMode:
+    SINGLE = "single"
+    BATCH = "batch"
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q * len(ordered)) - 1, 0)]
+
+
+def summarise(latencies: List[float], seconds: float, peak_bytes: int) -> Dict:
+    return {
+        "records": len(latencies),
+        "seconds": round(seconds, 4),
+        "throughput": round(len(latencies) / seconds, 4),
+        "p50": round(percentile(latencies, 0.5), 4),
+        "p95": round(percentile(latencies, 0.95), 4),
+        "peak_memory_mb": round(peak_bytes / 2**20, 2),
+    }
+
+
+def _measure(run: Callable[[], List[float]]) -> Dict:
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        latencies = run()
+        seconds = time.perf_counter() - start
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return summarise(latencies, seconds, peak_bytes)
+
+
+def benchmark_single(
+    pipeline: OfflinePipeline, criteria: AssessmentCriteria, paths: List[str]
+) -> Dict:
+    """Runs `Orchestrator.run_pipeline` on each record in turn."""
+
+    def run() -> List[float]:
+        latencies = []
+        for path in paths:
+            start = time.perf_counter()
+            pipeline.orchestrator.run_pipeline(
+                criteria=criteria, record=pipeline.load_record(path)
+            )
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    return _measure(run)
+
+
+def benchmark_batch(
+    pipeline: OfflinePipeline,
+    criteria: AssessmentCriteria,
+    paths: List[str],
+    workers: int,
+    write_loc: str,
+) -> Dict:
+    """Runs the records through a `BatchRunner` with `workers` records at a time."""
+    runner = BatchRunner(
+        criteria=criteria,
+        orchestrator=pipeline.orchestrator,
+        record_loader=pipeline.load_record,
+        workers=workers,
+    )
+
+    def run() -> List[float]:
+        results = runner.run(paths, write_loc)
+        failed = [x for x in results if x.status == BatchStatus.ERROR]
+        if failed:
+            raise RuntimeError(f"{len(failed)} records failed: {failed[0].error}")
+        return [x.seconds for x in results]
+
+    return _measure(run)
+
+
+def run_benchmarks(
+    page_counts: List[int] = DEFAULT_PAGE_COUNTS,
+    records_per_size: int = DEFAULT_RECORDS_PER_SIZE,
+    latency: float = 0.05,
+    workers: int = 4,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    criteria_name: str = "colonoscopy",
+) -> Dict:
+    """Benchmarks single and batched runs for each record size, and for all sizes mixed."""
+    criteria = AssessmentCriteria.from_spec(criteria_name)
+    results = {
+        "config": {
+            "page_counts": list(page_counts),
+            "records_per_size": records_per_size,
+            "latency": latency,
+            "workers": workers,
+            "max_concurrency": max_concurrency,
+        },
+        BenchmarkMode.SINGLE: {},
+        BenchmarkMode.BATCH: {},
+    }
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths_by_size = {
+            n: write_synthetic_records(
+                os.path.join(temp_dir, f"records-{n}p"), [n] * records_per_size
+            )
+            for n in page_counts
+        }
+        # One unmeasured run first, so that one-off imports and set up aren't counted
+        warm_up = write_synthetic_records(os.path.join(temp_dir, "warm-up"), [1])
+        benchmark_single(OfflinePipeline(), criteria, warm_up)
+
+        for n, paths in paths_by_size.items():
+            pipeline = OfflinePipeline(latency, max_concurrency)
+            results[BenchmarkMode.SINGLE][f"{n}p"] = benchmark_single(
+                pipeline, criteria, paths
+            )
+
+        all_paths = [x for paths in paths_by_size.values() for x in paths]
+        pipeline = OfflinePipeline(latency, max_concurrency)
+        results[BenchmarkMode.BATCH]["mixed"] = benchmark_batch(
+            pipeline, criteria, all_paths, workers, os.path.join(temp_dir, "reports")
+        )
+    return results
+
+
+def find_regressions(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Lists each benchmark whose throughput fell by more than `tolerance` (a fraction)."""
+    regressions = []
+    for mode in (BenchmarkMode.SINGLE, BenchmarkMode.BATCH):
+        for name, result in results.get(mode, {}).items():
+            previous = baseline.get(mode, {}).get(name)
+            if previous is None:
+                continue
+            floor = previous["throughput"] * (1 - tolerance)
+            if result["throughput"] < floor:
+                regressions.append(
+                    f"{mode}/{name}: {result['throughput']} records/s "
+                    f"(baseline {previous['throughput']})"
+                )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline offline.")
+    parser.add_argument(
+        "--page-counts",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_PAGE_COUNTS),
+        help="The sizes, in pages, of the synthetic records",
+    )
+    parser.add_argument(
+        "--records-per-size", type=int, default=DEFAULT_RECORDS_PER_SIZE
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.05,
+        help="Seconds the fake LLM and search take to answer each request",
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument("--output", type=str, help="Path to write the results as JSON")
+    parser.add_argument("--baseline", type=str, help="Results of a previous run")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="The fraction by which throughput may fall below the baseline",
+    )
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(
+        page_counts=args.page_counts,
+        records_per_size=args.records_per_size,
+        latency=args.latency,
+        workers=args.workers,
+        max_concurrency=args.max_concurrency,
+    )
+    print(json.dumps(results, indent=4))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Throughput regression: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
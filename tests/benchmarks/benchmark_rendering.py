@@ -0,0 +1,169 @@
+"""
+Benchmarks rendering reports to PDF: in-process, on a pool of worker processes, and
+with wkhtmltopdf through pdfkit (the previous path) when both are installed. pdfkit is
+in the "benchmark" extra (`pip install -e ".[benchmark]"`). Run with:
+
+    python -m tests.benchmarks.benchmark_rendering --output rendering.json
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from assess.models.rendering import PdfRenderPool
+from assess.structures.report import (
+    AssessmentReport,
+    Decision,
+    ReportSection,
+    SectionKind,
+    render_pdf,
+    to_markdown,
+    write_report,
+)
+from tests.benchmarks.benchmark_pipeline import percentile
+from tests.tools.synthetic_records import CLINICAL_SENTENCES
+
+DEFAULT_SECTION_COUNTS = (5, 20)
+DEFAULT_REPORTS_PER_SIZE = 10
+SENTENCES_PER_SECTION = 12
+
+
+class RenderMode:
+    IN_PROCESS = "in_process"
+    POOL = "pool"
+    WKHTMLTOPDF = "wkhtmltopdf"
+
+
+def synthetic_report(n_sections: int) -> AssessmentReport:
+    body = " ".join(
+        CLINICAL_SENTENCES[i % len(CLINICAL_SENTENCES)]
+        for i in range(SENTENCES_PER_SECTION)
+    )
+    sections = [
+        ReportSection(SectionKind.CRITERIA_ASSESSMENT, f"Criteria {i}", body)
+        for i in range(n_sections)
+    ]
+    return AssessmentReport("Jane Doe", Decision.APPROVED, "A reason", sections)
+
+
+def write_pdf_with_wkhtmltopdf(report: AssessmentReport, path: str):
+    """What run.py did before: converts the Markdown to HTML and starts wkhtmltopdf."""
+    import markdown2
+    import pdfkit
+
+    pdfkit.from_string(markdown2.markdown(to_markdown(report)), path)
+
+
+def write_pdf_in_process(report: AssessmentReport, path: str):
+    write_report(report, path, render=render_pdf, binary=True)
+
+
+def benchmark_renderer(
+    write_pdf: Callable[[AssessmentReport, str], None],
+    reports: List[AssessmentReport],
+    write_loc: str,
+    threads: int = 1,
+) -> Dict:
+    """Renders every report with `threads` at a time, timing each one."""
+
+    def render(i: int) -> float:
+        start = time.perf_counter()
+        write_pdf(reports[i], os.path.join(write_loc, f"report-{i}.pdf"))
+        return time.perf_counter() - start
+
+    os.makedirs(write_loc, exist_ok=True)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = list(executor.map(render, range(len(reports))))
+    seconds = time.perf_counter() - start
+    return {
+        "reports": len(reports),
+        "seconds": round(seconds, 4),
+        "throughput": round(len(reports) / seconds, 4),
+        "p50": round(percentile(latencies, 0.5), 4),
+        "p95": round(percentile(latencies, 0.95), 4),
+    }
+
+
+def run_benchmarks(
+    section_counts: List[int] = DEFAULT_SECTION_COUNTS,
+    reports_per_size: int = DEFAULT_REPORTS_PER_SIZE,
+    workers: int = 2,
+) -> Dict:
+    """
+    Benchmarks each renderer for each report size. wkhtmltopdf is skipped, and reported
+    as None, when it or pdfkit isn't installed.
+    """
+    has_wkhtmltopdf = (
+        shutil.which("wkhtmltopdf") is not None
+        and importlib.util.find_spec("pdfkit") is not None
+    )
+    results = {
+        "config": {
+            "section_counts": list(section_counts),
+            "reports_per_size": reports_per_size,
+            "workers": workers,
+        },
+        RenderMode.IN_PROCESS: {},
+        RenderMode.POOL: {},
+        RenderMode.WKHTMLTOPDF: {},
+    }
+    with tempfile.TemporaryDirectory() as temp_dir, PdfRenderPool(workers) as pool:
+        for n in section_counts:
+            reports = [synthetic_report(n) for _ in range(reports_per_size)]
+            name = f"{n}s"
+            results[RenderMode.IN_PROCESS][name] = benchmark_renderer(
+                write_pdf_in_process, reports, os.path.join(temp_dir, "in-process")
+            )
+            results[RenderMode.POOL][name] = benchmark_renderer(
+                pool.render_to_file, reports, os.path.join(temp_dir, "pool"), workers
+            )
+            results[RenderMode.WKHTMLTOPDF][name] = (
+                benchmark_renderer(
+                    write_pdf_with_wkhtmltopdf,
+                    reports,
+                    os.path.join(temp_dir, "wkhtmltopdf"),
+                )
+                if has_wkhtmltopdf
+                else None
+            )
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark rendering reports to PDF.")
+    parser.add_argument(
+        "--section-counts",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_SECTION_COUNTS),
+        help="The sizes, in sections, of the synthetic reports",
+    )
+    parser.add_argument(
+        "--reports-per-size", type=int, default=DEFAULT_REPORTS_PER_SIZE
+    )
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--output", type=str, help="Path to write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(
+        section_counts=args.section_counts,
+        reports_per_size=args.reports_per_size,
+        workers=args.workers,
+    )
+    print(json.dumps(results, indent=4))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+import shutil
+import tempfile
+import unittest
+
+from assess.structures.criteria import AssessmentCriteria
+from tests.benchmarks.benchmark_pipeline import (
+    BenchmarkMode,
+    find_regressions,
+    run_benchmarks,
+)
+from tests.tools.offline_pipeline import OfflinePipeline
+from tests.tools.synthetic_records import write_synthetic_records
+
+
+class BenchmarkPipelineTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def test_that_the_offline_pipeline_produces_a_full_report(self):
+        pipeline = OfflinePipeline()
+        (path,) = write_synthetic_records(self.temp_dir, [2])
+        record = pipeline.load_record(path)
+        report, approved = pipeline.orchestrator.run_pipeline_with_decision(
+            criteria=AssessmentCriteria.from_spec("colonoscopy"), record=record
+        )
+        self.assertTrue(approved)
+        self.assertIn(record.get_name(), report)
+        self.assertIn("45378", report)
+        self.assertEqual(2, len(record.pages))
+
+    def test_that_the_benchmarks_report_throughput_latency_and_memory(self):
+        results = run_benchmarks(page_counts=[1, 2], records_per_size=2, latency=0)
+        for result in [
+            results[BenchmarkMode.SINGLE]["1p"],
+            results[BenchmarkMode.SINGLE]["2p"],
+            results[BenchmarkMode.BATCH]["mixed"],
+        ]:
+            self.assertGreater(result["throughput"], 0)
+            self.assertLessEqual(result["p50"], result["p95"])
+            self.assertGreater(result["peak_memory_mb"], 0)
+        self.assertEqual(4, results[BenchmarkMode.BATCH]["mixed"]["records"])
+
+    def test_that_throughput_regressions_are_found(self):
+        baseline = {BenchmarkMode.BATCH: {"mixed": {"throughput": 10.0}}}
+        results = {BenchmarkMode.BATCH: {"mixed": {"throughput": 7.0}}}
+        self.assertEqual(1, len(find_regressions(results, baseline, tolerance=0.2)))
+        self.assertEqual([], find_regressions(results, baseline, tolerance=0.5))
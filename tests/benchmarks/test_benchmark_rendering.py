@@ -0,0 +1,16 @@
+import unittest
+
+from tests.benchmarks.benchmark_rendering import RenderMode, run_benchmarks
+
+
+class BenchmarkRenderingTestCase(unittest.TestCase):
+
+    def test_that_the_benchmarks_report_render_latency(self):
+        results = run_benchmarks(section_counts=[1, 3], reports_per_size=2, workers=1)
+        for mode in (RenderMode.IN_PROCESS, RenderMode.POOL):
+            for name in ("1s", "3s"):
+                result = results[mode][name]
+                self.assertEqual(2, result["reports"])
+                self.assertGreater(result["throughput"], 0)
+                self.assertLessEqual(result["p50"], result["p95"])
+        self.assertListEqual(["1s", "3s"], list(results[RenderMode.WKHTMLTOPDF]))
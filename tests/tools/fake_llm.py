@@ -0,0 +1,174 @@
+import asyncio
+import json
+import re
+import threading
+import time
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models import SimpleChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.pydantic_v1 import PrivateAttr
+
+from assess.structures import prompts
+from assess.structures.prompts import PromptConstant
+
+CRITERIA_NAME = re.compile(r"<criteria>\n([\w-]+):")
+
+
+class CriteriaEchoChatModel(SimpleChatModel):
+    """
+    Fake chat model which answers "[YES] <criteria name>" to each individual criteria prompt
+    (or "[NO] <criteria name>" for sections listed in `failed_sections`) and "[YES] Final"
+    to anything else. Sections listed in `slow_sections` take `latency` seconds to answer,
+    so later sections can finish before earlier ones.
+    """
+
+    latency: float = 0.0
+    slow_sections: List[str] = []
+    failed_sections: List[str] = []
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _in_flight: int = PrivateAttr(default=0)
+    _max_in_flight: int = PrivateAttr(default=0)
+    _calls: int = PrivateAttr(default=0)
+
+    @property
+    def _llm_type(self) -> str:
+        return "criteria-echo"
+
+    @property
+    def max_in_flight(self) -> int:
+        return self._max_in_flight
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    def _call(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        with self._lock:
+            self._calls += 1
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+        try:
+            match = CRITERIA_NAME.search(messages[-1].content)
+            if not match:
+                return "[YES] Final"
+            if match.group(1) in self.slow_sections:
+                time.sleep(self.latency)
+            if match.group(1) in self.failed_sections:
+                return f"[NO] {match.group(1)}"
+            return f"[YES] {match.group(1)}"
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+PATIENT_NAME = re.compile(r"Patient Name: ([A-Za-z][A-Za-z ]*[A-Za-z])")
+DEFAULT_PATIENT_NAME = "Jane Doe"
+
+
+class ClinicalFakeChatModel(SimpleChatModel):
+    """
+    Fake chat model which gives a canned, well-formed answer to each prompt the pipeline
+    sends, after `latency` seconds. The patient's name is read from a "Patient Name:" line
+    in the prompt where there is one. `treatment_helped` sets the answer to whether any
+    previous treatment helped, and so which branch of the pipeline runs. The first
+    `malformed_profiles` patient profiles have a date of birth in the wrong format.
+    """
+
+    latency: float = 0.0
+    treatment_helped: bool = False
+    cpt_codes: str = "45378"
+    malformed_profiles: int = 0
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _calls: int = PrivateAttr(default=0)
+    _prompts: List[str] = PrivateAttr(default_factory=list)
+
+    @property
+    def _llm_type(self) -> str:
+        return "clinical-fake"
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    @property
+    def prompts(self) -> List[str]:
+        """Every prompt received, in the order received."""
+        with self._lock:
+            return list(self._prompts)
+
+    def _answer(self, prompt: str) -> str:
+        criteria = CRITERIA_NAME.search(prompt)
+        if criteria:
+            return f"[YES] The patient meets the {criteria.group(1)} criteria."
+        if prompts.EXTRACT_PATIENT_PROFILE in prompt:
+            match = PATIENT_NAME.search(prompt)
+            name = match.group(1) if match else DEFAULT_PATIENT_NAME
+            with self._lock:
+                malformed = self.malformed_profiles > 0
+                self.malformed_profiles -= malformed
+            return json.dumps(
+                {"name": name, "dob": "1970" if malformed else "01/01/1970"}
+            )
+        if prompts.ASK_FOR_CPT_CODES in prompt:
+            return self.cpt_codes
+        if prompts.SUMMARISE_DOCTORS_ORDERS in prompt:
+            return "The doctor has recommended a diagnostic colonoscopy."
+        if "Summarise what the CPT codes" in prompt:
+            return "A colonoscopy procedure."
+        if "Does the meaning of the codes match" in prompt:
+            return "The codes match the doctor's recommended treatment."
+        if prompts.SUMMARY_OF_TREATMENT_SO_FAR in prompt:
+            return "1. Fibre supplements were tried.\n2. Nothing has improved."
+        if prompts.YES_NO_DID_ANYTHING_HELP in prompt:
+            if self.treatment_helped:
+                return PromptConstant.YES.value
+            return PromptConstant.NO.value
+        if prompts.PRESENT_EVIDENCE_TREATMENT_HELPED in prompt:
+            return '1. "The pain has improved." The patient reports less pain.'
+        return "[YES] The patient meets every criteria."
+
+    def _call(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        with self._lock:
+            self._calls += 1
+            self._prompts.append(messages[-1].content)
+        if self.latency:
+            time.sleep(self.latency)
+        return self._answer(messages[-1].content)
+
+
+class StubSearch:
+    """Stands in for the web search tool, answering every query after `latency` seconds."""
+
+    def __init__(self, latency: float = 0.0, answer: str = "45378: Colonoscopy"):
+        self.latency = latency
+        self.answer = answer
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def run(self, query: str) -> str:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return self.answer
+
+    async def arun(self, query: str) -> str:
+        with self._lock:
+            self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self.answer
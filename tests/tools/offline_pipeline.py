@@ -0,0 +1,29 @@
+from assess.models.assessors import DEFAULT_MAX_CONCURRENCY, GPT4Assessor
+from assess.models.doc_readers import GPT3_5SingleDocumentInterpreter
+from assess.models.orchestrator import Orchestrator
+from assess.structures.medical_record import MedicalRecord
+from tests.tools.fake_llm import ClinicalFakeChatModel, StubSearch
+
+
+class OfflinePipeline:
+    """The real pipeline, wired to a fake chat model and a stub search tool."""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        treatment_helped: bool = False,
+    ):
+        self.model = ClinicalFakeChatModel(
+            latency=latency, treatment_helped=treatment_helped
+        )
+        self.search = StubSearch(latency=latency)
+        self.advisor = GPT3_5SingleDocumentInterpreter(
+            model=self.model, search=self.search
+        )
+        self.orchestrator = Orchestrator(
+            assessor=GPT4Assessor(max_concurrency=max_concurrency, model=self.model)
+        )
+
+    def load_record(self, path: str) -> MedicalRecord:
+        return MedicalRecord.from_pdf(path, advisor=self.advisor)
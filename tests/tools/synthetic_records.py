@@ -0,0 +1,101 @@
+import os
+import random
+from typing import List
+
+FIRST_NAMES = ("Alex", "Jordan", "Sam", "Taylor", "Morgan", "Casey", "Robin", "Jamie")
+LAST_NAMES = ("Smith", "Patel", "Garcia", "Nguyen", "Okafor", "Schmidt", "Kowalski")
+CLINICAL_SENTENCES = (
+    "The patient reports intermittent abdominal pain over the past six months.",
+    "There is a family history of colorectal cancer in a first degree relative.",
+    "Fibre supplements and dietary changes were tried without improvement.",
+    "Blood tests show mild iron deficiency anaemia.",
+    "The patient denies weight loss, fever or night sweats.",
+    "Stool has been intermittently positive for occult blood.",
+    "A diagnostic colonoscopy is recommended, CPT code 45378.",
+    "Previous imaging of the abdomen was unremarkable.",
+    "The patient takes no regular medication and has no known allergies.",
+)
+LINES_PER_PAGE = 45
+LINE_HEIGHT = 15
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_stream(lines: List[str]) -> bytes:
+    commands = ["BT", "/F1 10 Tf", f"{LINE_HEIGHT} TL", f"50 {PAGE_HEIGHT - 60} Td"]
+    commands += [f"({_escape(x)}) '" for x in lines]
+    commands.append("ET")
+    return "\n".join(commands).encode("latin-1")
+
+
+def write_text_pdf(pages: List[List[str]], path: str):
+    """Writes a minimal PDF with one page of Helvetica text per list of lines."""
+    n_pages = len(pages)
+    # Objects: 1 catalog, 2 page tree, 3 font, then a page and its content per page
+    page_ids = [4 + 2 * i for i in range(n_pages)]
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: (
+            f"<< /Type /Pages /Kids [{' '.join(f'{x} 0 R' for x in page_ids)}]"
+            f" /Count {n_pages} >>"
+        ).encode(),
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    for page_id, lines in zip(page_ids, pages):
+        stream = _page_stream(lines)
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}]"
+            f" /Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>"
+        ).encode()
+        objects[page_id + 1] = (
+            f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream"
+        )
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = len(output)
+        output += f"{obj_id} 0 obj\n".encode() + objects[obj_id] + b"\nendobj\n"
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for obj_id in sorted(objects):
+        output += f"{offsets[obj_id]:010d} 00000 n \n".encode()
+    output += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref_offset}\n%%EOF\n"
+    ).encode()
+    with open(path, "wb") as f:
+        f.write(bytes(output))
+
+
+def synthetic_record_pages(n_pages: int, seed: int) -> List[List[str]]:
+    """Lines of text for a medical record of `n_pages` pages, the same for the same seed."""
+    rng = random.Random(seed)
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    header = [
+        f"Patient Name: {name}",
+        "Date of Birth: 01/01/1970",
+        "Referral for gastroenterology assessment",
+        "",
+    ]
+    pages = []
+    for i in range(n_pages):
+        body = [rng.choice(CLINICAL_SENTENCES) for _ in range(LINES_PER_PAGE)]
+        pages.append((header if i == 0 else []) + body)
+    return pages
+
+
+def write_synthetic_records(
+    write_loc: str, page_counts: List[int], seed: int = 0
+) -> List[str]:
+    """Writes one synthetic record per entry in `page_counts` and returns their paths."""
+    os.makedirs(write_loc, exist_ok=True)
+    paths = []
+    for i, n_pages in enumerate(page_counts):
+        path = os.path.join(write_loc, f"synthetic-record-{i}-{n_pages}p.pdf")
+        write_text_pdf(synthetic_record_pages(n_pages, seed + i), path)
+        paths.append(path)
+    return paths
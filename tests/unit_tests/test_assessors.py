@@ -0,0 +1,290 @@
+import json
+import time
+import unittest
+from typing import Dict, List
+
+from langchain_community.chat_models.fake import FakeListChatModel
+from langchain_core.documents import Document
+
+from assess.models.assessors import SKIPPED_SECTION_RESPONSE, OpenAiAssessmentEngine
+from assess.structures.criteria import (
+    AssessmentCriteria,
+    AssessmentMode,
+    CriteriaKey,
+    SectionGate,
+)
+from tests.tools.fake_llm import CriteriaEchoChatModel
+
+
+class FakeRecord:
+    def __init__(self):
+        self.pages = [Document(page_content="The patient is 50 years old.")]
+
+    def context_for(self, query: str) -> List[Document]:
+        return self.pages
+
+    def extract_patient_profile(self) -> Dict:
+        return {"name": "Jane Doe", "dob": "01/01/1970", "age": "50"}
+
+    async def aextract_patient_profile(self) -> Dict:
+        return self.extract_patient_profile()
+
+
+def with_mode(criteria: AssessmentCriteria, mode: AssessmentMode) -> AssessmentCriteria:
+    spec = dict(criteria.critera)
+    spec[CriteriaKey.ASSESSMENT_MODE.value] = mode.value
+    return AssessmentCriteria(spec, name=criteria.name)
+
+
+def with_gates(
+    criteria: AssessmentCriteria, gates: Dict[str, SectionGate]
+) -> AssessmentCriteria:
+    """Gates the given sections, to be assessed in the order they are listed."""
+    spec = {
+        key: val if isinstance(val, str) else dict(val)
+        for key, val in criteria.critera.items()
+    }
+    for i, (name, gate) in enumerate(gates.items()):
+        spec[name][CriteriaKey.GATE.value] = gate.value
+        spec[name][CriteriaKey.ORDER.value] = i
+    return AssessmentCriteria(spec, name=criteria.name)
+
+
+def section_responses(result: Dict) -> List[str]:
+    return [val for key, val in result.items() if key != "Final Assessment"]
+
+
+class AssessmentEngineTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.criteria = AssessmentCriteria.from_spec("colonoscopy")
+        self.section_names = [name for name, _ in self.criteria.get_sections()]
+
+    def test_that_concurrent_assessments_are_returned_in_section_order(self):
+        model = CriteriaEchoChatModel(latency=0.2, slow_sections=self.section_names[:2])
+        engine = OpenAiAssessmentEngine(model, max_concurrency=4)
+        result, approved = engine.assess_criteria(self.criteria, FakeRecord())
+
+        self.assertTrue(approved)
+        keys = list(result.keys())
+        self.assertEqual("Final Assessment", keys[0])
+        responses = [result[key] for key in keys[1:]]
+        expected = [f"[YES] {name}" for name in self.section_names]
+        self.assertListEqual(expected, responses)
+        self.assertGreater(model.max_in_flight, 1)
+
+    def test_that_max_concurrency_limits_in_flight_requests(self):
+        model = CriteriaEchoChatModel(latency=0.05, slow_sections=self.section_names)
+        engine = OpenAiAssessmentEngine(model, max_concurrency=2)
+        engine.assess_criteria(self.criteria, FakeRecord())
+        self.assertLessEqual(model.max_in_flight, 2)
+
+        model = CriteriaEchoChatModel(latency=0.05, slow_sections=self.section_names)
+        engine = OpenAiAssessmentEngine(model, max_concurrency=1)
+        engine.assess_criteria(self.criteria, FakeRecord())
+        self.assertEqual(1, model.max_in_flight)
+
+    def test_that_batched_assessments_are_returned_in_section_order(self):
+        criteria = with_mode(self.criteria, AssessmentMode.BATCH)
+        model = CriteriaEchoChatModel(latency=0.2, slow_sections=self.section_names[:2])
+        engine = OpenAiAssessmentEngine(model, max_concurrency=4)
+        result, approved = engine.assess_criteria(criteria, FakeRecord())
+
+        self.assertTrue(approved)
+        responses = [val for key, val in result.items() if key != "Final Assessment"]
+        expected = [f"[YES] {name}" for name in self.section_names]
+        self.assertListEqual(expected, responses)
+        self.assertGreater(model.max_in_flight, 1)
+
+    def test_that_a_combined_assessment_makes_a_single_section_request(self):
+        criteria = with_mode(self.criteria, AssessmentMode.COMBINED)
+        verdicts = {name: f"[NO] {name}" for name in self.section_names}
+        model = FakeListChatModel(responses=[json.dumps(verdicts), "[NO] Final"])
+        engine = OpenAiAssessmentEngine(model)
+        result, approved = engine.assess_criteria(criteria, FakeRecord())
+
+        self.assertFalse(approved)
+        self.assertListEqual(list(verdicts.values()), section_responses(result))
+
+    def test_that_sections_missing_from_a_combined_assessment_are_assessed_alone(self):
+        criteria = with_mode(self.criteria, AssessmentMode.COMBINED)
+        first = self.section_names[0]
+        verdicts = {name: f"[YES] {name}" for name in self.section_names[1:]}
+        model = FakeListChatModel(
+            responses=[json.dumps(verdicts), f"[YES] {first}", "[YES] Final"]
+        )
+        engine = OpenAiAssessmentEngine(model)
+        result, approved = engine.assess_criteria(criteria, FakeRecord())
+
+        self.assertTrue(approved)
+        expected = [f"[YES] {first}"] + list(verdicts.values())
+        self.assertListEqual(expected, section_responses(result))
+
+    def test_that_a_combined_assessment_which_is_not_an_object_falls_back(self):
+        criteria = with_mode(self.criteria, AssessmentMode.COMBINED)
+        verdicts = [f"[YES] {name}" for name in self.section_names]
+        model = FakeListChatModel(
+            responses=[json.dumps(verdicts)] + verdicts + ["[YES] Final"]
+        )
+        engine = OpenAiAssessmentEngine(model, max_concurrency=1)
+        result, approved = engine.assess_criteria(criteria, FakeRecord())
+
+        self.assertTrue(approved)
+        self.assertListEqual(verdicts, section_responses(result))
+
+    def test_that_an_unparseable_combined_assessment_falls_back_to_sections(self):
+        criteria = with_mode(self.criteria, AssessmentMode.COMBINED)
+        model = CriteriaEchoChatModel()
+        engine = OpenAiAssessmentEngine(model)
+        result, approved = engine.assess_criteria(criteria, FakeRecord())
+
+        self.assertTrue(approved)
+        responses = [val for key, val in result.items() if key != "Final Assessment"]
+        expected = [f"[YES] {name}" for name in self.section_names]
+        self.assertListEqual(expected, responses)
+        # The combined request, one per section, then the final assessment
+        self.assertEqual(len(self.section_names) + 2, model.calls)
+
+    def test_that_a_failed_required_section_denies_without_assessing_the_rest(self):
+        last = self.section_names[-1]
+        criteria = with_gates(self.criteria, {last: SectionGate.REQUIRED})
+        model = CriteriaEchoChatModel(failed_sections=[last])
+        engine = OpenAiAssessmentEngine(model, max_concurrency=1)
+        result, approved = engine.assess_criteria(criteria, FakeRecord())
+
+        self.assertFalse(approved)
+        self.assertTrue(result["Final Assessment"].startswith("[NO]"))
+        expected = [SKIPPED_SECTION_RESPONSE] * (len(self.section_names) - 1)
+        self.assertListEqual(expected + [f"[NO] {last}"], section_responses(result))
+        self.assertEqual(1, model.calls)
+
+    def test_that_gates_are_assessed_in_order_until_one_decides(self):
+        first, second = self.section_names[2], self.section_names[0]
+        criteria = with_gates(
+            self.criteria, {first: SectionGate.REQUIRED, second: SectionGate.SUFFICIENT}
+        )
+        model = CriteriaEchoChatModel()
+        engine = OpenAiAssessmentEngine(model, max_concurrency=1)
+        result, approved = engine.assess_criteria(criteria, FakeRecord())
+
+        self.assertTrue(approved)
+        responses = section_responses(result)
+        self.assertEqual(f"[YES] {first}", responses[2])
+        self.assertEqual(f"[YES] {second}", responses[0])
+        self.assertEqual(2, responses.count(SKIPPED_SECTION_RESPONSE))
+        self.assertEqual(2, model.calls)
+
+    def test_that_a_failed_required_section_overrides_a_sufficient_one(self):
+        fast, slow = self.section_names[0], self.section_names[1]
+        criteria = with_gates(
+            self.criteria, {fast: SectionGate.SUFFICIENT, slow: SectionGate.REQUIRED}
+        )
+        model = CriteriaEchoChatModel(
+            latency=0.2, slow_sections=[slow], failed_sections=[slow]
+        )
+        engine = OpenAiAssessmentEngine(model, max_concurrency=4)
+        result, approved = engine.assess_criteria(criteria, FakeRecord())
+
+        self.assertFalse(approved)
+        self.assertTrue(result["Final Assessment"].startswith("[NO]"))
+        responses = section_responses(result)
+        self.assertEqual(f"[YES] {fast}", responses[0])
+        self.assertEqual(f"[NO] {slow}", responses[1])
+
+    def test_that_every_section_is_assessed_when_the_gates_do_not_decide(self):
+        criteria = with_gates(
+            self.criteria, {self.section_names[0]: SectionGate.REQUIRED}
+        )
+        model = CriteriaEchoChatModel()
+        engine = OpenAiAssessmentEngine(model)
+        result, approved = engine.assess_criteria(criteria, FakeRecord())
+
+        self.assertTrue(approved)
+        self.assertEqual("[YES] Final", result["Final Assessment"])
+        expected = [f"[YES] {name}" for name in self.section_names]
+        self.assertListEqual(expected, section_responses(result))
+        self.assertEqual(len(self.section_names) + 1, model.calls)
+
+    def test_that_an_invalid_concurrency_limit_raises_an_error(self):
+        with self.assertRaises(ValueError):
+            OpenAiAssessmentEngine(CriteriaEchoChatModel(), max_concurrency=0)
+
+
+class AsyncAssessmentEngineTestCase(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.criteria = AssessmentCriteria.from_spec("colonoscopy")
+        self.section_names = [name for name, _ in self.criteria.get_sections()]
+
+    async def test_that_concurrent_assessments_are_returned_in_section_order(self):
+        model = CriteriaEchoChatModel(latency=0.2, slow_sections=self.section_names[:2])
+        engine = OpenAiAssessmentEngine(model, max_concurrency=4)
+        result, approved = await engine.aassess_criteria(self.criteria, FakeRecord())
+
+        self.assertTrue(approved)
+        responses = [val for key, val in result.items() if key != "Final Assessment"]
+        expected = [f"[YES] {name}" for name in self.section_names]
+        self.assertListEqual(expected, responses)
+        self.assertGreater(model.max_in_flight, 1)
+
+    async def test_that_max_concurrency_limits_in_flight_requests(self):
+        model = CriteriaEchoChatModel(latency=0.05, slow_sections=self.section_names)
+        engine = OpenAiAssessmentEngine(model, max_concurrency=2)
+        await engine.aassess_criteria(self.criteria, FakeRecord())
+        self.assertLessEqual(model.max_in_flight, 2)
+
+    async def test_that_batched_assessments_are_returned_in_section_order(self):
+        criteria = with_mode(self.criteria, AssessmentMode.BATCH)
+        model = CriteriaEchoChatModel(latency=0.05, slow_sections=self.section_names)
+        engine = OpenAiAssessmentEngine(model, max_concurrency=2)
+        result, approved = await engine.aassess_criteria(criteria, FakeRecord())
+
+        self.assertTrue(approved)
+        responses = [val for key, val in result.items() if key != "Final Assessment"]
+        expected = [f"[YES] {name}" for name in self.section_names]
+        self.assertListEqual(expected, responses)
+        self.assertLessEqual(model.max_in_flight, 2)
+
+    async def test_that_a_combined_assessment_makes_a_single_section_request(self):
+        criteria = with_mode(self.criteria, AssessmentMode.COMBINED)
+        verdicts = {name: f"[YES] {name}" for name in self.section_names}
+        model = FakeListChatModel(responses=[json.dumps(verdicts), "[YES] Final"])
+        engine = OpenAiAssessmentEngine(model)
+        result, approved = await engine.aassess_criteria(criteria, FakeRecord())
+
+        self.assertTrue(approved)
+        responses = [val for key, val in result.items() if key != "Final Assessment"]
+        self.assertListEqual(list(verdicts.values()), responses)
+
+    async def test_that_a_decided_outcome_cancels_the_gates_in_flight(self):
+        fast, slow = self.section_names[0], self.section_names[1]
+        criteria = with_gates(
+            self.criteria, {slow: SectionGate.REQUIRED, fast: SectionGate.REQUIRED}
+        )
+        model = CriteriaEchoChatModel(
+            latency=1.0, slow_sections=[slow], failed_sections=[fast]
+        )
+        engine = OpenAiAssessmentEngine(model, max_concurrency=4)
+        start = time.perf_counter()
+        result, approved = await engine.aassess_criteria(criteria, FakeRecord())
+
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertFalse(approved)
+        responses = section_responses(result)
+        self.assertEqual(f"[NO] {fast}", responses[0])
+        self.assertEqual(SKIPPED_SECTION_RESPONSE, responses[1])
+
+    async def test_that_a_failed_required_section_overrides_a_sufficient_one(self):
+        fast, slow = self.section_names[0], self.section_names[1]
+        criteria = with_gates(
+            self.criteria, {fast: SectionGate.SUFFICIENT, slow: SectionGate.REQUIRED}
+        )
+        model = CriteriaEchoChatModel(
+            latency=0.2, slow_sections=[slow], failed_sections=[slow]
+        )
+        engine = OpenAiAssessmentEngine(model, max_concurrency=4)
+        result, approved = await engine.aassess_criteria(criteria, FakeRecord())
+
+        self.assertFalse(approved)
+        self.assertTrue(result["Final Assessment"].startswith("[NO]"))
+        self.assertEqual(f"[NO] {slow}", section_responses(result)[1])
@@ -0,0 +1,26 @@
+import asyncio
+import unittest
+
+from assess.utils.async_tools import LlmRequestLimiter
+
+
+class LlmRequestLimiterTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def test_that_the_limit_is_applied_across_coroutines(self):
+        limiter = LlmRequestLimiter(max_requests=2)
+        in_flight, max_in_flight = 0, 0
+
+        async def request():
+            nonlocal in_flight, max_in_flight
+            async with limiter.slot():
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+                await asyncio.sleep(0.02)
+                in_flight -= 1
+
+        await asyncio.gather(*(request() for _ in range(8)))
+        self.assertEqual(2, max_in_flight)
+
+    def test_that_an_invalid_limit_raises_an_error(self):
+        with self.assertRaises(ValueError):
+            LlmRequestLimiter().set_max_requests(0)
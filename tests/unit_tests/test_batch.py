@@ -0,0 +1,130 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from assess.models.batch import BatchRunner, BatchStatus, list_records
+from assess.structures.criteria import AssessmentCriteria
+from assess.structures.report import AssessmentReport, Decision
+from assess.utils import instrumentation, serialize
+
+
+class FakeOrchestrator:
+    def build_report(self, criteria, record):
+        if record == "slow":
+            for _ in range(20):
+                with instrumentation.stage("step"):
+                    time.sleep(0.05)
+        if record == "late":
+            time.sleep(0.7)
+        if record == "broken":
+            raise ValueError("Could not read the record")
+        decision = Decision.APPROVED if record == "approved" else Decision.DENIED
+        return AssessmentReport(record, decision, "A reason")
+
+
+class BatchTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def _get_runner(self, **kwargs) -> BatchRunner:
+        return BatchRunner(
+            criteria=AssessmentCriteria.from_spec("colonoscopy"),
+            orchestrator=FakeOrchestrator(),
+            record_loader=lambda path: os.path.splitext(os.path.basename(path))[0],
+            **kwargs,
+        )
+
+    def test_that_it_lists_the_pdfs_in_a_directory(self):
+        for fname in ("b.pdf", "a.pdf", "notes.txt"):
+            serialize.write_text_file("", os.path.join(self.temp_dir, fname))
+        expected = [os.path.join(self.temp_dir, x) for x in ("a.pdf", "b.pdf")]
+        self.assertListEqual(expected, list_records(self.temp_dir))
+
+    def test_that_it_lists_the_records_in_a_manifest(self):
+        manifest = os.path.join(self.temp_dir, "manifest.txt")
+        serialize.write_text_file("a.pdf\n\nrecords/b.pdf\n", manifest)
+        expected = [
+            os.path.join(self.temp_dir, "a.pdf"),
+            os.path.join(self.temp_dir, "records", "b.pdf"),
+        ]
+        self.assertListEqual(expected, list_records(manifest))
+
+        manifest = os.path.join(self.temp_dir, "manifest.json")
+        serialize.write_json_file(["a.pdf", "records/b.pdf"], manifest)
+        self.assertListEqual(expected, list_records(manifest))
+
+    def test_that_it_writes_a_report_per_record_and_a_summary(self):
+        runner = self._get_runner(workers=2, timeout=0.5)
+        paths = ["approved.pdf", "denied.pdf", "broken.pdf", "slow.pdf"]
+        results = runner.run(paths, self.temp_dir)
+
+        statuses = [x.status for x in results]
+        expected = [
+            BatchStatus.APPROVED,
+            BatchStatus.DENIED,
+            BatchStatus.ERROR,
+            BatchStatus.TIMEOUT,
+        ]
+        self.assertListEqual(expected, statuses)
+
+        report = serialize.load_text_file(
+            os.path.join(self.temp_dir, "approved_Assessment.md")
+        )
+        self.assertTrue(
+            report.startswith("# Assessment of Recommended Procedure for approved\n")
+        )
+        self.assertTrue("**Assessment:** APPROVED" in report)
+
+        summary = serialize.load_json_file(os.path.join(self.temp_dir, "summary.json"))
+        self.assertListEqual(
+            [x.value for x in expected], [x["status"] for x in summary]
+        )
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "summary.csv")))
+
+    def test_that_records_over_time_stop_early_and_write_no_report(self):
+        runner = self._get_runner(workers=2, timeout=0.3)
+        start = time.perf_counter()
+        results = runner.run(["slow.pdf", "late.pdf"], self.temp_dir)
+
+        self.assertListEqual(
+            [BatchStatus.TIMEOUT, BatchStatus.TIMEOUT], [x.status for x in results]
+        )
+        # The slow record stops at its next stage rather than running all 20
+        self.assertLess(results[0].seconds, 0.6)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        for name in ("slow", "late"):
+            self.assertFalse(
+                os.path.exists(os.path.join(self.temp_dir, f"{name}_Assessment.md"))
+            )
+
+    def test_that_records_with_the_same_file_name_get_their_own_reports(self):
+        paths = ["a/approved.pdf", "b/approved.pdf", "approved_2.pdf"]
+        results = self._get_runner().run(paths, self.temp_dir)
+
+        reports = [os.path.basename(x.report) for x in results]
+        self.assertListEqual(
+            [
+                "approved_Assessment.md",
+                "approved_3_Assessment.md",
+                "approved_2_Assessment.md",
+            ],
+            reports,
+        )
+
+    def test_that_it_writes_a_trace_per_record_and_batch_metrics(self):
+        runner = self._get_runner(trace=True)
+        runner.run(["approved.pdf", "denied.pdf"], self.temp_dir)
+
+        trace = serialize.load_json_file(
+            os.path.join(self.temp_dir, "approved_trace.json")
+        )
+        self.assertEqual("approved.pdf", trace["name"])
+        self.assertIn("load_record", trace["stages"])
+
+        metrics = serialize.load_json_file(os.path.join(self.temp_dir, "metrics.json"))
+        self.assertEqual(2, metrics["load_record"]["wall_time"]["count"])
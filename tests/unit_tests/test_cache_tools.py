@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from assess.utils import cache_tools
+
+
+class CountingRecord:
+    def __init__(self):
+        self.calls = 0
+
+    @cache_tools.cached_result
+    def derive_a_fact(self):
+        self.calls += 1
+        time.sleep(0.05)
+        return {"fact": self.calls}
+
+    @cache_tools.cached_async_result("derive_a_fact")
+    async def aderive_a_fact(self):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return {"fact": self.calls}
+
+
+class CacheToolsTestCase(unittest.TestCase):
+
+    def test_that_repeated_calls_only_compute_the_result_once(self):
+        record = CountingRecord()
+        self.assertDictEqual({"fact": 1}, record.derive_a_fact())
+        self.assertDictEqual({"fact": 1}, record.derive_a_fact())
+        self.assertEqual(1, record.calls)
+
+    def test_that_concurrent_first_calls_only_compute_the_result_once(self):
+        record = CountingRecord()
+        threads = [threading.Thread(target=record.derive_a_fact) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, record.calls)
+
+    def test_that_callers_cannot_modify_the_cached_result(self):
+        record = CountingRecord()
+        record.derive_a_fact()["fact"] = "changed"
+        self.assertDictEqual({"fact": 1}, record.derive_a_fact())
+
+    def test_that_invalidating_the_cache_recomputes_the_result(self):
+        record = CountingRecord()
+        record.derive_a_fact()
+        cache_tools.invalidate_cached_results(record)
+        self.assertDictEqual({"fact": 2}, record.derive_a_fact())
+
+    def test_that_results_are_cached_per_instance(self):
+        first, second = CountingRecord(), CountingRecord()
+        first.derive_a_fact()
+        second.derive_a_fact()
+        self.assertEqual(1, first.calls)
+        self.assertEqual(1, second.calls)
+
+
+class AsyncCacheToolsTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def test_that_concurrent_first_calls_only_compute_the_result_once(self):
+        record = CountingRecord()
+        results = await asyncio.gather(*(record.aderive_a_fact() for _ in range(8)))
+        self.assertEqual(1, record.calls)
+        self.assertTrue(all(x == {"fact": 1} for x in results))
+
+    async def test_that_the_cache_is_shared_with_the_sync_method(self):
+        record = CountingRecord()
+        await record.aderive_a_fact()
+        self.assertDictEqual({"fact": 1}, record.derive_a_fact())
+        self.assertEqual(1, record.calls)
+
+    async def test_that_invalidating_the_cache_recomputes_the_result(self):
+        record = CountingRecord()
+        await record.aderive_a_fact()
+        cache_tools.invalidate_cached_results(record)
+        self.assertDictEqual({"fact": 2}, await record.aderive_a_fact())
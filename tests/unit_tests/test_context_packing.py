@@ -0,0 +1,184 @@
+import os
+import unittest
+from unittest import mock
+
+from langchain_core.documents import Document
+
+from assess.models.doc_readers import GPT3_5SingleDocumentInterpreter
+from assess.models.llms import LlmType
+from assess.structures.medical_record import MedicalRecord
+from assess.utils import context_packing, instrumentation
+from assess.utils.context_packing import (
+    ContextBudgetExceededError,
+    ContextPacker,
+    TokenCounter,
+)
+from tests.tools.fake_llm import ClinicalFakeChatModel, StubSearch
+
+HEADER = "St Mary's Clinic - Fax 555-0100"
+FOOTER = "CONFIDENTIAL: intended only for the named recipient"
+
+
+class WordEncoding:
+    """Stands in for a tiktoken encoding, with one token per word."""
+
+    def encode(self, text: str, disallowed_special=()):
+        return text.split()
+
+
+def packer_with_budget(budget: int) -> ContextPacker:
+    return ContextPacker(
+        LlmType.GPT_4,
+        reserved_tokens=LlmType.GPT_4.prompt_budget - budget,
+        counter=TokenCounter(WordEncoding()),
+    )
+
+
+def faxed_pages():
+    bodies = [
+        "Patient Name: Jane Doe\nDOB: 01/02/1980",
+        "Six weeks of physical therapy did not help.",
+        "Six weeks of physical therapy did not help.",
+        "Colonoscopy requested, CPT 45378.",
+    ]
+    return [
+        Document(page_content=f"{HEADER}\n{x}\n{FOOTER}", metadata={"page": i})
+        for i, x in enumerate(bodies)
+    ] + [Document(page_content=f"{HEADER}\n{FOOTER}", metadata={"page": 4})]
+
+
+class TokenCounterTestCase(unittest.TestCase):
+
+    def test_that_tokens_are_estimated_without_an_encoding(self):
+        counter = TokenCounter()
+        self.assertFalse(counter.exact)
+        self.assertEqual(3, counter.count("x" * 9))
+
+    def test_that_the_encoding_counts_tokens_when_given(self):
+        counter = TokenCounter(WordEncoding())
+        self.assertTrue(counter.exact)
+        inputs = {"prefix": "one two three", "pages": [Document(page_content="four")]}
+        self.assertEqual(4, counter.count_inputs(inputs))
+
+    def test_that_the_tokenizer_is_only_loaded_from_a_local_cache(self):
+        with mock.patch.dict(os.environ, clear=True):
+            counter = context_packing.load_token_counter(LlmType.GPT_4)
+        self.assertFalse(counter.exact)
+
+
+class ContextPackerTestCase(unittest.TestCase):
+
+    def test_that_duplicate_pages_and_boilerplate_are_removed(self):
+        packer = packer_with_budget(1000)
+        pages, stats = packer.deduplicate(faxed_pages())
+
+        self.assertListEqual([0, 1, 3], [x.metadata["page"] for x in pages])
+        text = "\n".join(x.page_content for x in pages)
+        self.assertEqual(1, text.count(HEADER))
+        self.assertEqual(1, text.count(FOOTER))
+        self.assertIn("CPT 45378", text)
+
+        self.assertEqual(5, stats.pages_in)
+        self.assertEqual(3, stats.pages_out)
+        self.assertEqual(1, stats.duplicate_pages)
+        self.assertEqual(1, stats.empty_pages)
+        self.assertLess(stats.tokens_out, stats.tokens_in)
+        self.assertTrue(stats.tokens_exact)
+
+    def test_that_lines_repeated_in_the_body_of_pages_are_kept(self):
+        finding = "No improvement with physical therapy."
+        pages = [
+            Document(
+                page_content="\n".join(
+                    [HEADER, f"Visit {i}", f"Seen on day {7 * i}.", finding]
+                    + [f"Plan: review in {i + 1} weeks.", f"Page {i}", FOOTER]
+                )
+            )
+            for i in range(4)
+        ]
+        packed, stats = packer_with_budget(1000).deduplicate(pages)
+
+        text = "\n".join(x.page_content for x in packed)
+        self.assertEqual(4, text.count(finding))
+        self.assertEqual(1, text.count(HEADER))
+        self.assertEqual(1, text.count(FOOTER))
+        self.assertEqual(6, stats.boilerplate_lines)
+
+    def test_that_distinct_pages_are_kept_as_they_are(self):
+        pages = [Document(page_content="One page"), Document(page_content="Another")]
+        packed, stats = packer_with_budget(1000).deduplicate(pages)
+        self.assertListEqual([id(x) for x in pages], [id(x) for x in packed])
+        self.assertEqual(0, stats.boilerplate_lines)
+
+    def test_that_context_is_split_into_parts_within_the_budget(self):
+        packer = packer_with_budget(10)
+        pages = [
+            Document(page_content=" ".join(f"p{i}w{j}" for j in range(6)))
+            for i in range(3)
+        ] + [Document(page_content=" ".join(f"long{j}" for j in range(25)))]
+
+        parts = packer.split(pages)
+        self.assertGreater(len(parts), 3)
+        for part in parts:
+            self.assertLessEqual(packer.counter.count_documents(part), 10)
+        words = " ".join(x.page_content for part in parts for x in part).split()
+        self.assertListEqual(" ".join(x.page_content for x in pages).split(), words)
+
+
+class PromptBudgetTestCase(unittest.TestCase):
+
+    def test_that_prompts_over_budget_are_never_sent(self):
+        model = ClinicalFakeChatModel()
+        advisor = GPT3_5SingleDocumentInterpreter(model=model, search=StubSearch())
+        context_packing.configure_token_counter(
+            LlmType.GPT_3_5, TokenCounter(WordEncoding())
+        )
+        self.addCleanup(context_packing.configure_token_counter, LlmType.GPT_3_5, None)
+
+        words = LlmType.GPT_3_5.prompt_budget + 1
+        context = [Document(page_content="word " * words)]
+        with self.assertRaises(ContextBudgetExceededError):
+            advisor.ask("What treatment was recommended?", context=context)
+        self.assertEqual(0, model.calls)
+
+        advisor.ask("What treatment was recommended?", context=context[:0])
+        self.assertEqual(1, model.calls)
+
+    def test_that_records_are_checked_against_their_advisors_budget_untrimmed(self):
+        model = ClinicalFakeChatModel()
+        advisor = GPT3_5SingleDocumentInterpreter(model=model, search=StubSearch())
+        context_packing.configure_token_counter(
+            LlmType.GPT_3_5, TokenCounter(WordEncoding())
+        )
+        self.addCleanup(context_packing.configure_token_counter, LlmType.GPT_3_5, None)
+
+        # Too long for GPT-4, the packer's model, but it fits a prompt to GPT-3.5
+        words = LlmType.GPT_4.prompt_budget + 1
+        pages = [
+            Document(page_content=f"Page {i} " + "word " * words) for i in range(3)
+        ]
+        record = MedicalRecord(
+            pages[:1], advisor=advisor, context_packer=ContextPacker()
+        )
+        record.summarise_treatment_so_far()
+        self.assertIn(pages[0].page_content, model.prompts[0])
+
+        record = MedicalRecord(pages, advisor=advisor, context_packer=ContextPacker())
+        self.assertListEqual(pages, record.context_for("Treatment"))
+        with self.assertRaises(ContextBudgetExceededError):
+            record.summarise_treatment_so_far()
+        self.assertEqual(1, model.calls)
+
+    def test_that_records_send_packed_context_and_trace_the_statistics(self):
+        model = ClinicalFakeChatModel()
+        record = MedicalRecord(
+            faxed_pages(),
+            advisor=GPT3_5SingleDocumentInterpreter(model=model, search=StubSearch()),
+            context_packer=packer_with_budget(1000),
+        )
+        with instrumentation.tracing() as trace:
+            record.summarise_treatment_so_far()
+
+        self.assertEqual(1, model.prompts[0].count(HEADER))
+        self.assertEqual(3, len(record.context_for("CPT codes")))
+        self.assertDictEqual(record.packing_stats.to_dict(), trace.to_dict()["packing"])
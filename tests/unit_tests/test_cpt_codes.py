@@ -0,0 +1,59 @@
+import os
+import unittest
+from unittest import mock
+
+from assess.structures.cpt_codes import CptCodeTable, parse_cpt_codes
+from assess.utils import serialize
+
+
+class CptCodesTestCase(unittest.TestCase):
+
+    def _get_table(self) -> CptCodeTable:
+        return CptCodeTable.from_spec("default")
+
+    def test_that_codes_can_be_parsed_from_text(self):
+        self.assertListEqual(["45378"], parse_cpt_codes("45378"))
+        self.assertListEqual(
+            ["43235", "43239", "0001F"],
+            parse_cpt_codes("CPT codes: 43235, 43239 and 0001F (43235 again)"),
+        )
+        self.assertListEqual([], parse_cpt_codes("No codes were requested."))
+
+    def test_that_known_codes_are_looked_up_exactly(self):
+        table = self._get_table()
+        self.assertEqual("Colonoscopy, flexible, diagnostic", table.lookup("45378"))
+        self.assertIsNone(table.lookup("45390"))
+
+    def test_that_unknown_codes_are_looked_up_by_range(self):
+        table = self._get_table()
+        self.assertEqual("Colonoscopy, flexible", table.describe("45390"))
+        self.assertEqual("Proctosigmoidoscopy, rigid", table.describe("45300"))
+        self.assertEqual("Proctosigmoidoscopy, rigid", table.describe("45327"))
+        self.assertIsNone(table.describe("45328"))
+        self.assertIsNone(table.describe("0001F"))
+        self.assertIsNone(table.describe("10000"))
+
+    def test_that_tables_are_read_from_files_as_specs_are(self):
+        path = os.path.join(
+            os.path.dirname(serialize.CRITERIA_DIR), "cpt_codes", "default.toml"
+        )
+        with mock.patch.object(
+            serialize, "read_toml_file", wraps=serialize.read_toml_file
+        ) as read:
+            table = CptCodeTable.from_file(path)
+        read.assert_called_once_with(path)
+        self.assertEqual(self._get_table().lookup("45378"), table.lookup("45378"))
+        self.assertEqual(self._get_table().describe("45390"), table.describe("45390"))
+
+    def test_that_remembered_meanings_are_looked_up(self):
+        table = self._get_table()
+        self.assertNotIn("10000", table)
+        table.remember("10000", "A remembered meaning")
+        self.assertEqual("A remembered meaning", table.describe("10000"))
+
+    def test_that_overlapping_ranges_raise_an_error(self):
+        with self.assertRaises(ValueError):
+            CptCodeTable(
+                codes={},
+                ranges=[("10000", "10010", "first"), ("10005", "10020", "second")],
+            )
@@ -1,6 +1,14 @@
+import os
+import tempfile
 import unittest
 
-from assess.structures.criteria import AssessmentCriteria
+from assess.structures.criteria import (
+    AssessmentCriteria,
+    CriteriaRegistry,
+    InvalidCriteriaException,
+    SectionGate,
+    criteria_registry,
+)
 from assess.utils import serialize
 from tests.tools import data_handler
 
@@ -24,3 +32,64 @@ class CriteriaTestCase(unittest.TestCase):
         expected = data_handler.load_example_treatment_criteria()["description"]
         result = self._get_criteria().get_description()
         self.assertEqual(expected.strip(), result.strip())
+
+    def test_that_sections_are_evaluated_by_order_and_then_as_written(self):
+        criteria = AssessmentCriteria(
+            {
+                "description": "Some criteria",
+                "first": {"criteria": "A"},
+                "second": {"criteria": "B", "order": 2, "gate": "required"},
+                "third": {"criteria": "C", "order": 1, "gate": "sufficient"},
+            }
+        )
+        order = [name for name, _ in criteria.get_evaluation_order()]
+        self.assertListEqual(["third", "second", "first"], order)
+        self.assertTrue(criteria.has_gates())
+        self.assertIsNone(criteria.get_section_gate("first"))
+        self.assertEqual(SectionGate.REQUIRED, criteria.get_section_gate("second"))
+        self.assertFalse(self._get_criteria().has_gates())
+
+    def test_that_compiled_criteria_cannot_be_changed(self):
+        criteria = self._get_criteria()
+        with self.assertRaises(AttributeError):
+            criteria.name = "changed"
+        with self.assertRaises(AttributeError):
+            criteria.sections[0].criteria = "changed"
+        with self.assertRaises(TypeError):
+            criteria.critera["description"] = "changed"
+        criteria.get_sections().clear()
+        self.assertGreater(len(criteria.get_sections()), 0)
+
+    def test_that_invalid_criteria_raise_an_error(self):
+        invalid = [
+            {"first": {"criteria": "A"}},
+            {"description": "D", "first": {"text": "A"}},
+            {"description": "D", "first": {"criteria": "A", "gate": "maybe"}},
+            {"description": "D", "first": {"criteria": "A", "order": "1"}},
+            {"description": "D", "assessment-mode": "sometimes"},
+            {"description": "D", "count": 3},
+        ]
+        for spec in invalid:
+            with self.assertRaises(InvalidCriteriaException):
+                AssessmentCriteria(spec)
+
+    def test_that_specs_are_compiled_once_until_their_file_changes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "example.toml")
+            serialize.write_text_file('description = "First"\n', path)
+            registry = CriteriaRegistry(directory)
+
+            first = registry.get("example")
+            self.assertIs(first, registry.get("example"))
+            self.assertListEqual(["example"], registry.names())
+
+            serialize.write_text_file('description = "Second"\n', path)
+            os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10**9))
+            second = registry.get("example")
+            self.assertIsNot(first, second)
+            self.assertEqual("Second", second.get_description())
+
+    def test_that_every_packaged_spec_compiles(self):
+        compiled = criteria_registry.compile_all()
+        self.assertIn("colonoscopy", compiled)
+        self.assertIs(compiled["colonoscopy"], self._get_criteria())
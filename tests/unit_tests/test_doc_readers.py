@@ -0,0 +1,110 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from langchain_community.chat_models.fake import FakeListChatModel
+from langchain_core.documents import Document
+from langchain_core.pydantic_v1 import BaseModel, Field
+
+from assess.models.doc_readers import (
+    ChainRegistry,
+    GPT3_5SingleDocumentInterpreter,
+    OpenAiEngine,
+    chain_registry,
+)
+from assess.models.llms import LlmType
+from assess.structures.cpt_codes import CptCodeTable
+from assess.structures.medical_record import MedicalRecord
+from assess.utils import retry_tools
+from tests.tools.fake_llm import ClinicalFakeChatModel, StubSearch
+
+
+class ExampleJson(BaseModel):
+    name: str = Field(description="The patient's name")
+    dob: str = Field(description="The patient's date of birth")
+
+
+class OpenAiEngineTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        chain_registry.clear()
+
+    def tearDown(self) -> None:
+        chain_registry.clear()
+
+    def test_that_json_extraction_chains_are_built_once_and_reused(self):
+        response = '{"name": "James Freeman", "dob": "06/16/1982"}'
+        engine = OpenAiEngine(FakeListChatModel(responses=[response] * 3))
+        context = [Document(page_content="James Freeman, born 06/16/1982")]
+
+        expected = {"name": "James Freeman", "dob": "06/16/1982"}
+        for _ in range(3):
+            result = engine.extract_json(
+                "Extract the name and date of birth.", ExampleJson, context=context
+            )
+            self.assertDictEqual(expected, result)
+        self.assertEqual(1, len(chain_registry))
+
+    def test_that_each_model_gets_its_own_chain(self):
+        response = '{"name": "James Freeman", "dob": "06/16/1982"}'
+        for _ in range(2):
+            engine = OpenAiEngine(FakeListChatModel(responses=[response]))
+            engine.extract_json("Extract the name.", ExampleJson, context=[])
+        self.assertEqual(2, len(chain_registry))
+
+    def test_that_chains_are_kept_per_model_type(self):
+        model = FakeListChatModel(responses=["{}"])
+        for llm_type in (LlmType.GPT_4, LlmType.GPT_3_5, None):
+            OpenAiEngine(model, llm_type)._get_json_extraction_chain(ExampleJson)
+        self.assertEqual(3, len(chain_registry))
+
+    def test_that_the_least_recently_used_chains_are_dropped(self):
+        registry = ChainRegistry(max_entries=2)
+        models = [FakeListChatModel(responses=[]) for _ in range(3)]
+        chains = [registry.get(x, "t", None, object) for x in models[:2]]
+        self.assertIs(chains[0], registry.get(models[0], "t", None, object))
+
+        registry.get(models[2], "t", None, object)
+        self.assertEqual(2, len(registry))
+        self.assertIs(chains[0], registry.get(models[0], "t", None, object))
+        self.assertIsNot(chains[1], registry.get(models[1], "t", None, object))
+
+
+class SingleDocumentInterpreterTestCase(unittest.TestCase):
+
+    def test_that_codes_missing_from_the_table_are_summarised_from_the_search(self):
+        search = StubSearch(answer="99999: A made-up procedure")
+        model = ClinicalFakeChatModel()
+        advisor = GPT3_5SingleDocumentInterpreter(model=model, search=search)
+
+        def record() -> MedicalRecord:
+            return MedicalRecord(
+                [Document(page_content="CPT 99999")],
+                advisor=advisor,
+                cpt_code_table=CptCodeTable({}),
+            )
+
+        record().describe_cpt_codes("99999")
+        asyncio.run(record().adescribe_cpt_codes("99999"))
+        self.assertEqual(2, search.calls)
+        for prompt in model.prompts:
+            self.assertIn("99999: A made-up procedure", prompt)
+            self.assertIn("<search-results>", prompt)
+            self.assertNotIn("medical record", prompt)
+
+    def test_that_malformed_patient_profiles_are_asked_for_again(self):
+        model = ClinicalFakeChatModel(malformed_profiles=2)
+        advisor = GPT3_5SingleDocumentInterpreter(model=model, search=StubSearch())
+
+        def record() -> MedicalRecord:
+            return MedicalRecord([Document(page_content="A record")], advisor=advisor)
+
+        with mock.patch.object(retry_tools.time, "sleep"), mock.patch.object(
+            retry_tools.asyncio, "sleep", mock.AsyncMock()
+        ):
+            self.assertEqual("01/01/1970", record().extract_patient_profile()["dob"])
+            self.assertEqual(3, model.calls)
+            model.malformed_profiles = 1
+            profile = asyncio.run(record().aextract_patient_profile())
+        self.assertEqual("01/01/1970", profile["dob"])
+        self.assertEqual(5, model.calls)
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from langchain_core.documents import Document
+
+from assess.utils import serialize
+from assess.utils.document_cache import ParsedDocumentCache, configure_document_cache
+from tests.tools import data_handler
+
+
+class DocumentCacheTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, "documents")
+
+    def tearDown(self) -> None:
+        configure_document_cache(None)
+        shutil.rmtree(self.temp_dir)
+
+    def _pages(self, text: str):
+        return [Document(page_content=text, metadata={"source": "a.pdf", "page": 0})]
+
+    def test_that_repeat_loads_are_read_from_the_cache(self):
+        cache = ParsedDocumentCache(self.cache_dir)
+        configure_document_cache(cache)
+        path = data_handler.get_medical_record_one_path()
+
+        first = serialize.load_pdf_file(path)
+        second = serialize.load_pdf_file(path)
+        self.assertListEqual(first, second)
+        self.assertDictEqual({"hits": 1, "misses": 1, "entries": 1}, cache.stats())
+
+    def test_that_pages_are_only_cached_once_they_have_all_been_read(self):
+        cache = ParsedDocumentCache(self.cache_dir)
+        path = data_handler.get_test_pdf_file_path()
+        pages = cache.iter_load(path, "v1", lambda: iter(self._pages("x") * 2))
+        next(pages)
+        pages.close()
+        self.assertEqual(0, len(cache))
+        self.assertEqual(2, len(cache.load(path, "v1", lambda: self._pages("x") * 2)))
+        self.assertEqual(1, len(cache))
+
+    def test_that_copies_of_a_file_share_an_entry(self):
+        cache = ParsedDocumentCache(self.cache_dir, compress=False)
+        original = data_handler.get_test_pdf_file_path()
+        copy = os.path.join(self.temp_dir, "copy.pdf")
+        shutil.copy(original, copy)
+
+        parsed = []
+        for path in (original, copy):
+            pages = cache.load(
+                path, "v1", lambda: parsed.append(path) or self._pages("x")
+            )
+        self.assertListEqual([original], parsed)
+        # Pages read from the entry name the file that was asked for
+        self.assertEqual(copy, pages[0].metadata["source"])
+
+    def test_that_a_new_parser_version_is_a_miss(self):
+        cache = ParsedDocumentCache(self.cache_dir)
+        path = data_handler.get_test_pdf_file_path()
+        cache.load(path, "v1", lambda: self._pages("old"))
+        result = cache.load(path, "v2", lambda: self._pages("new"))
+        self.assertEqual("new", result[0].page_content)
+        self.assertEqual(2, len(cache))
+
+    def test_that_the_least_recently_used_entries_are_evicted(self):
+        cache = ParsedDocumentCache(self.cache_dir, max_entries=2)
+        for key in ("a", "b"):
+            cache.put(key, self._pages(key))
+            time.sleep(0.02)
+        cache.get("a")
+        time.sleep(0.02)
+        cache.put("c", self._pages("c"))
+
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual("a", cache.get("a")[0].page_content)
+
+    def test_that_the_size_limit_is_respected(self):
+        cache = ParsedDocumentCache(self.cache_dir, max_bytes=1, compress=False)
+        cache.put("a", self._pages("a"))
+        self.assertEqual(0, len(cache))
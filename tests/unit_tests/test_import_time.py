@@ -0,0 +1,60 @@
+import json
+import subprocess
+import sys
+import unittest
+
+# Generous, so that only a heavy dependency creeping back into an import fails the test
+IMPORT_TIME_BUDGET_SECONDS = 1.0
+LIGHT_MODULES = [
+    "assess.models.orchestrator",
+    "assess.models.batch",
+    "assess.structures.criteria",
+    "assess.utils.serialize",
+    "assess.utils.context_packing",
+]
+HEAVY_PACKAGES = [
+    "langchain",
+    "langchain_openai",
+    "langchain_community",
+    "openai",
+    "duckduckgo_search",
+    "pypdf",
+    "tomlkit",
+    "markdown2",
+    "pdfkit",
+]
+
+MEASURE_IMPORT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+loaded = sorted({{x.split(".")[0] for x in sys.modules}})
+print(json.dumps({{"elapsed": elapsed, "loaded": loaded}}))
+"""
+
+
+def measure_cold_import(module: str) -> dict:
+    """Imports the module in a fresh interpreter, so nothing is already loaded."""
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", MEASURE_IMPORT.format(module=module)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout)
+
+
+class ImportTimeTestCase(unittest.TestCase):
+
+    def test_that_modules_import_without_their_heavy_dependencies(self):
+        for module in LIGHT_MODULES:
+            with self.subTest(module=module):
+                loaded = measure_cold_import(module)["loaded"]
+                self.assertListEqual(
+                    [], [x for x in HEAVY_PACKAGES if x in loaded], module
+                )
+
+    def test_that_the_package_imports_within_the_time_budget(self):
+        elapsed = measure_cold_import("assess.models.orchestrator")["elapsed"]
+        self.assertLess(elapsed, IMPORT_TIME_BUDGET_SECONDS)
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+from typing import Dict, List
+
+from langchain_core.documents import Document
+
+from assess.models.assessors import FINAL_ASSESSMENT_STAGE, OpenAiAssessmentEngine
+from assess.models.doc_readers import OpenAiEngine
+from assess.structures.criteria import AssessmentCriteria
+from assess.utils import instrumentation, retry_tools
+from assess.utils.instrumentation import Metric, Operation
+from assess.utils.response_cache import SqliteResponseCache, configure_response_cache
+from tests.tools.fake_llm import CriteriaEchoChatModel
+
+
+class FakeRecord:
+    def __init__(self):
+        self.pages = [Document(page_content="The patient is 50 years old.")]
+
+    def context_for(self, query: str) -> List[Document]:
+        return self.pages
+
+    def extract_patient_profile(self) -> Dict:
+        return {"name": "Jane Doe", "dob": "01/01/1970", "age": "50"}
+
+
+class InstrumentationTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        configure_response_cache(None)
+        shutil.rmtree(self.temp_dir)
+
+    def test_that_each_criteria_section_is_recorded_as_a_stage(self):
+        criteria = AssessmentCriteria.from_spec("colonoscopy")
+        engine = OpenAiAssessmentEngine(CriteriaEchoChatModel(), max_concurrency=4)
+        with instrumentation.tracing() as trace:
+            with instrumentation.stage("assessment"):
+                engine.assess_criteria(criteria, FakeRecord())
+
+        totals = trace.stage_totals()
+        n_sections = len(criteria.get_sections())
+        self.assertEqual(n_sections + 1, totals["assessment"][Metric.CALLS])
+        for name, _ in criteria.get_sections():
+            stage = totals[f"assessment/{name}"]
+            self.assertEqual(1, stage[Metric.CALLS])
+            self.assertEqual(1, stage[Metric.CONTEXT_PAGES])
+            self.assertGreater(stage[Metric.PROMPT_TOKENS], 0)
+            self.assertGreater(stage[Metric.COMPLETION_TOKENS], 0)
+        self.assertIn(f"assessment/{FINAL_ASSESSMENT_STAGE}", totals)
+        self.assertTrue(all(x.tokens_estimated for x in trace.events))
+
+    def test_that_cache_hits_are_recorded_and_cost_no_tokens(self):
+        configure_response_cache(
+            SqliteResponseCache(os.path.join(self.temp_dir, "responses.sqlite"))
+        )
+        engine = OpenAiEngine(CriteriaEchoChatModel())
+        with instrumentation.tracing() as trace:
+            engine.ask("<criteria>\nrisk:\n")
+            engine.ask("<criteria>\nrisk:\n")
+
+        first, second = trace.events
+        self.assertFalse(first.cache_hit)
+        self.assertTrue(second.cache_hit)
+        self.assertEqual(0, second.prompt_tokens + second.completion_tokens)
+
+    def test_that_retries_are_recorded_against_the_stage(self):
+        attempts = []
+
+        @retry_tools.retry_on_failure(tolerance=3)
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise ValueError("Not yet")
+            return "done"
+
+        with instrumentation.tracing() as trace:
+            with instrumentation.stage("profile"):
+                flaky()
+        self.assertEqual(2, trace.stage_totals()["profile"][Metric.RETRIES])
+
+    def test_that_nothing_is_recorded_outside_a_trace(self):
+        with instrumentation.event(Operation.LLM) as call:
+            pass
+        self.assertIsNone(instrumentation.current_trace())
+        self.assertGreaterEqual(call.wall_time, 0)
+
+    def test_that_traces_are_aggregated_into_histograms(self):
+        traces = []
+        for seconds in range(1, 21):
+            trace = instrumentation.Trace()
+            trace.add_stage_time("profile", float(seconds))
+            traces.append(trace)
+
+        hist = instrumentation.aggregate_traces(traces)["profile"][Metric.WALL_TIME]
+        self.assertEqual(20, hist["count"])
+        self.assertEqual(10.0, hist["p50"])
+        self.assertEqual(19.0, hist["p95"])
+        self.assertEqual(20, sum(x["count"] for x in hist["buckets"]))
@@ -0,0 +1,157 @@
+import asyncio
+import time
+import unittest
+
+from langchain_core.documents import Document
+
+from assess.models.assessors import GPT4Assessor
+from assess.models.doc_readers import GPT3_5SingleDocumentInterpreter
+from assess.models.llms import LlmType
+from assess.models.map_reduce import MapReduceReader
+from assess.models.orchestrator import Orchestrator
+from assess.structures import prompts
+from assess.structures.criteria import AssessmentCriteria
+from assess.structures.medical_record import MedicalRecord
+from assess.utils import context_packing, instrumentation
+from assess.utils.context_packing import (
+    ContextBudgetExceededError,
+    ContextPacker,
+    TokenCounter,
+)
+from tests.tools.fake_llm import ClinicalFakeChatModel, StubSearch
+from tests.tools.synthetic_records import CLINICAL_SENTENCES
+
+LATENCY = 0.05
+TREATMENT_SUMMARY = "1. Fibre supplements were tried.\n2. Nothing has improved."
+
+
+def long_pages(n_pages: int = 40):
+    return [
+        Document(
+            page_content=f"Page {i}. " + " ".join(CLINICAL_SENTENCES * 2),
+            metadata={"page": i},
+        )
+        for i in range(n_pages)
+    ]
+
+
+class CharacterEncoding:
+    """Stands in for a tiktoken encoding, with one token per character."""
+
+    def encode(self, text: str, disallowed_special=()):
+        return list(text)
+
+
+def packer_with_budget(budget: int) -> ContextPacker:
+    return ContextPacker(
+        LlmType.GPT_3_5,
+        reserved_tokens=LlmType.GPT_3_5.prompt_budget - budget,
+        counter=TokenCounter(),
+    )
+
+
+class MapReduceTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Counting every character as a token, the long record is too long for one
+        # prompt to the advisor, while two pages still fit
+        context_packing.configure_token_counter(
+            LlmType.GPT_3_5, TokenCounter(CharacterEncoding())
+        )
+        self.addCleanup(context_packing.configure_token_counter, LlmType.GPT_3_5, None)
+        self.model = ClinicalFakeChatModel(latency=LATENCY)
+        advisor = GPT3_5SingleDocumentInterpreter(model=self.model, search=StubSearch())
+        self.reader = MapReduceReader(
+            advisor=advisor, packer=packer_with_budget(1000), max_workers=16
+        )
+        self.record = MedicalRecord(
+            long_pages(), advisor=advisor, map_reduce=self.reader
+        )
+
+    def test_that_long_records_are_read_in_parts_in_parallel(self):
+        parts = self.reader.split(self.record.pages)
+        self.assertGreater(len(parts), 8)
+
+        start = time.perf_counter()
+        with instrumentation.tracing() as trace:
+            summary = self.record.summarise_treatment_so_far()
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(TREATMENT_SUMMARY, summary)
+        # One call per part, then one to combine their answers
+        self.assertEqual(len(parts) + 1, self.model.calls)
+        self.assertLess(elapsed, LATENCY * len(parts) / 2)
+        stages = trace.stage_totals()
+        self.assertEqual(len(parts), stages["summarise_treatment_so_far/map"]["calls"])
+        self.assertEqual(1, stages["summarise_treatment_so_far/reduce"]["calls"])
+
+        map_prompts = self.model.prompts[:-1]
+        self.assertTrue(
+            all(prompts.SUMMARY_OF_TREATMENT_SO_FAR in x for x in map_prompts)
+        )
+        self.assertIn(f"part 1 of {len(parts)}", "\n".join(map_prompts))
+        self.assertIn("Answer from part 1", self.model.prompts[-1])
+
+    def test_that_the_requested_cpt_codes_are_chosen_from_every_parts_codes(self):
+        codes = self.record.extract_requested_cpt_codes()
+        self.assertEqual("45378", codes)
+        # Parts may also name codes of past procedures, so the model picks the requested
+        # codes from every part's answer rather than taking them all
+        n_parts = len(self.reader.split(self.record.pages))
+        self.assertEqual(n_parts + 1, self.model.calls)
+        reduce_prompt = self.model.prompts[-1]
+        self.assertIn(prompts.ASK_FOR_CPT_CODES, reduce_prompt)
+        self.assertIn(f"Answer from part {n_parts}:\n45378", reduce_prompt)
+
+    def test_that_long_answers_are_combined_in_rounds(self):
+        self.reader.packer = packer_with_budget(60)
+        self.record.invalidate_cache()
+        evidence = self.record.present_evidence_treatment_helped()
+
+        self.assertIn("The pain has improved.", evidence)
+        n_parts = len(self.reader.split(self.record.pages))
+        self.assertGreater(self.model.calls, n_parts + 1)
+
+    def test_that_answers_too_long_to_combine_raise_an_error(self):
+        # Each answer is longer than the budget, so no round leaves fewer groups
+        self.reader.packer = packer_with_budget(20)
+        self.record.invalidate_cache()
+        with self.assertRaises(ContextBudgetExceededError):
+            self.record.present_evidence_treatment_helped()
+
+    def test_that_the_async_pipeline_stages_read_in_parts(self):
+        async def run():
+            return await asyncio.gather(
+                self.record.acheck_for_previous_conservative_treatment(),
+                self.record.aextract_and_validate_cpt_codes(),
+            )
+
+        (treatment, helped), cpt_codes = asyncio.run(run())
+        self.assertFalse(helped)
+        self.assertEqual(
+            TREATMENT_SUMMARY, treatment["Summary of Treatment Received To Date"]
+        )
+        self.assertEqual("45378", cpt_codes["Extracted CPT Codes"])
+
+    def test_that_the_whole_pipeline_runs_on_a_record_over_budget(self):
+        # Counting tokens as the models would, the record is too long for either of them
+        context_packing.configure_token_counter(LlmType.GPT_3_5, None)
+        self.record.pages = long_pages(80)
+        for llm_type in (LlmType.GPT_4, LlmType.GPT_3_5):
+            self.assertFalse(context_packing.fits_prompt(llm_type, self.record.pages))
+        orchestrator = Orchestrator(assessor=GPT4Assessor(model=self.model))
+        criteria = AssessmentCriteria.from_spec("colonoscopy")
+
+        report = orchestrator.build_report(criteria, self.record)
+        self.assertTrue(report.approved)
+        self.record.invalidate_cache()
+        report = asyncio.run(orchestrator.abuild_report(criteria, self.record))
+        self.assertTrue(report.approved)
+
+    def test_that_records_which_fit_are_read_whole(self):
+        record = MedicalRecord(
+            long_pages(2), advisor=self.record.advisor, map_reduce=self.reader
+        )
+        self.assertEqual(TREATMENT_SUMMARY, record.summarise_treatment_so_far())
+        self.assertEqual(1, self.model.calls)
+        self.assertNotIn("part 1 of", self.model.prompts[0])
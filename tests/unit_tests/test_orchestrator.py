@@ -0,0 +1,192 @@
+import asyncio
+import time
+import unittest
+from collections import Counter, OrderedDict
+
+from assess.models.assessors import Assessor
+from assess.models.orchestrator import Orchestrator, combine_reports
+from assess.structures.criteria import AssessmentCriteria
+from assess.structures.report import INTRO, SectionKind, to_markdown
+
+STAGE_LATENCY = 0.2
+
+
+class FakeRecord:
+    def __init__(self, treatment_helped: bool):
+        self.treatment_helped = treatment_helped
+        self.calls = Counter()
+
+    def extract_patient_profile(self):
+        self.calls["extract_patient_profile"] += 1
+        time.sleep(STAGE_LATENCY)
+        return {"name": "Jane Doe", "dob": "01/01/1970", "age": "50"}
+
+    def extract_and_validate_cpt_codes(self):
+        self.calls["extract_and_validate_cpt_codes"] += 1
+        time.sleep(STAGE_LATENCY)
+        return OrderedDict([("Extracted CPT Codes", "45378")])
+
+    def check_for_previous_conservative_treatment(self):
+        self.calls["check_for_previous_conservative_treatment"] += 1
+        time.sleep(STAGE_LATENCY)
+        return OrderedDict([("Summary", "Nothing helped")]), self.treatment_helped
+
+    def present_evidence_treatment_helped(self):
+        return "The pain went away."
+
+    async def aextract_patient_profile(self):
+        self.calls["extract_patient_profile"] += 1
+        await asyncio.sleep(STAGE_LATENCY)
+        return {"name": "Jane Doe", "dob": "01/01/1970", "age": "50"}
+
+    async def aextract_and_validate_cpt_codes(self):
+        self.calls["extract_and_validate_cpt_codes"] += 1
+        await asyncio.sleep(STAGE_LATENCY)
+        return OrderedDict([("Extracted CPT Codes", "45378")])
+
+    async def acheck_for_previous_conservative_treatment(self):
+        self.calls["check_for_previous_conservative_treatment"] += 1
+        await asyncio.sleep(STAGE_LATENCY)
+        return OrderedDict([("Summary", "Nothing helped")]), self.treatment_helped
+
+    async def apresent_evidence_treatment_helped(self):
+        return "The pain went away."
+
+
+class FakeAssessor(Assessor):
+    def _assessment(self, criteria):
+        if criteria.name == "strict":
+            return OrderedDict([("Final Assessment", "[NO] Does not meet it")]), False
+        return OrderedDict([("Final Assessment", "[YES] Meets the criteria")]), True
+
+    def assess_criteria(self, criteria, record):
+        time.sleep(STAGE_LATENCY)
+        return self._assessment(criteria)
+
+    async def aassess_criteria(self, criteria, record):
+        await asyncio.sleep(STAGE_LATENCY)
+        return self._assessment(criteria)
+
+
+def get_two_criteria():
+    colonoscopy = AssessmentCriteria.from_spec("colonoscopy")
+    strict = AssessmentCriteria(colonoscopy.critera, name="strict")
+    return [colonoscopy, strict]
+
+
+class OrchestratorTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.criteria = AssessmentCriteria.from_spec("colonoscopy")
+        self.orchestrator = Orchestrator(assessor=FakeAssessor())
+
+    def test_that_independent_stages_overlap(self):
+        start = time.perf_counter()
+        result = self.orchestrator.run_pipeline(self.criteria, FakeRecord(False))
+        elapsed = time.perf_counter() - start
+
+        # The longest chain is the treatment check followed by the assessment
+        self.assertLess(elapsed, 3 * STAGE_LATENCY)
+        self.assertTrue("APPROVED" in result)
+        self.assertTrue("45378" in result)
+        self.assertTrue("Jane Doe" in result)
+
+    def test_that_evidence_is_presented_when_previous_treatment_helped(self):
+        result = self.orchestrator.run_pipeline(self.criteria, FakeRecord(True))
+        self.assertTrue("DENIED" in result)
+        self.assertTrue("The pain went away." in result)
+        self.assertTrue("45378" in result)
+
+    def test_that_record_level_stages_run_once_for_many_criteria(self):
+        record = FakeRecord(False)
+        start = time.perf_counter()
+        results = self.orchestrator.run_multi_criteria_pipeline(
+            get_two_criteria(), record
+        )
+        elapsed = time.perf_counter() - start
+
+        self.assertListEqual(["colonoscopy", "strict"], list(results.keys()))
+        self.assertTrue(results["colonoscopy"][1])
+        self.assertFalse(results["strict"][1])
+        self.assertTrue("APPROVED" in results["colonoscopy"][0])
+        self.assertTrue("DENIED" in results["strict"][0])
+        self.assertEqual(1, max(record.calls.values()))
+        self.assertLess(elapsed, 3 * STAGE_LATENCY)
+
+    def test_that_the_report_is_structured(self):
+        report = self.orchestrator.build_report(self.criteria, FakeRecord(False))
+        self.assertTrue(report.approved)
+        self.assertEqual("Jane Doe", report.patient_name)
+        self.assertEqual("colonoscopy", report.criteria_name)
+        (cpt_codes,) = report.get_sections(SectionKind.CPT_CODES)
+        self.assertEqual("45378", cpt_codes.subsections[0].body)
+        self.assertEqual(1, len(report.get_sections(SectionKind.CRITERIA)))
+        self.assertEqual(
+            to_markdown(report),
+            self.orchestrator.run_pipeline(self.criteria, FakeRecord(False)),
+        )
+
+    def test_that_the_markdown_report_is_unchanged(self):
+        result = self.orchestrator.run_pipeline(self.criteria, FakeRecord(True))
+        expected = (
+            "# Assessment of Recommended Procedure for Jane Doe\n"
+            f"{INTRO}\n\n"
+            "**Assessment:** DENIED\n\n"
+            "**Reason:** Previous conservative treatment has shown improvement and "
+            "should be continued (see below)\n\n"
+            "## Previous Treatments\n### Summary\nNothing helped\n\n"
+            "## Justification for Continuing Conservative Treatment\n"
+            "The pain went away.\n\n"
+            "## Recommended Procedure and CPT Codes\n"
+            "### Extracted CPT Codes\n45378\n\n"
+        )
+        self.assertEqual(expected, result)
+
+    def test_that_reports_can_be_combined(self):
+        reports = self.orchestrator.build_multi_criteria_reports(
+            get_two_criteria(), FakeRecord(False)
+        )
+        combined = combine_reports(reports)
+        self.assertTrue(combined.startswith("# colonoscopy\n\n## Assessment of"))
+        self.assertTrue("\n# strict\n\n## Assessment of" in combined)
+        self.assertTrue("\n### Final Assessment\n[NO] Does not meet it\n" in combined)
+        self.assertFalse("\n## Final Assessment" in combined)
+
+
+class AsyncOrchestratorTestCase(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.criteria = AssessmentCriteria.from_spec("colonoscopy")
+        self.orchestrator = Orchestrator(assessor=FakeAssessor())
+
+    async def test_that_independent_stages_overlap(self):
+        start = time.perf_counter()
+        result, approved = await self.orchestrator.arun_pipeline_with_decision(
+            self.criteria, FakeRecord(False)
+        )
+        elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, 3 * STAGE_LATENCY)
+        self.assertTrue(approved)
+        self.assertTrue("APPROVED" in result)
+        self.assertTrue("45378" in result)
+        self.assertTrue("Jane Doe" in result)
+
+    async def test_that_the_async_report_matches_the_sync_report(self):
+        for treatment_helped in (False, True):
+            expected = self.orchestrator.run_pipeline(
+                self.criteria, FakeRecord(treatment_helped)
+            )
+            result = await self.orchestrator.arun_pipeline(
+                self.criteria, FakeRecord(treatment_helped)
+            )
+            self.assertEqual(expected, result)
+
+    async def test_that_record_level_stages_run_once_for_many_criteria(self):
+        record = FakeRecord(False)
+        results = await self.orchestrator.arun_multi_criteria_pipeline(
+            get_two_criteria(), record
+        )
+        self.assertTrue(results["colonoscopy"][1])
+        self.assertFalse(results["strict"][1])
+        self.assertEqual(1, max(record.calls.values()))
@@ -0,0 +1,57 @@
+import io
+import unittest
+
+from pypdf import PdfReader
+
+from assess.utils.pdf_writer import (
+    BOLD_FONT,
+    REGULAR_FONT,
+    PdfWriter,
+    text_width,
+    to_encodable,
+    wrap_text,
+)
+
+
+class PdfWriterTestCase(unittest.TestCase):
+
+    def test_that_text_is_measured_with_the_font_metrics(self):
+        self.assertAlmostEqual(5.56, text_width("a", REGULAR_FONT, 10))
+        self.assertAlmostEqual(6.11, text_width("b", BOLD_FONT, 10))
+        self.assertLess(
+            text_width("iii", REGULAR_FONT, 10), text_width("mmm", REGULAR_FONT, 10)
+        )
+
+    def test_that_text_wraps_between_words(self):
+        lines = wrap_text("one two three four", REGULAR_FONT, 10, 50)
+        self.assertListEqual(["one two", "three four"], lines)
+        for line in wrap_text("x" * 100, REGULAR_FONT, 10, 50):
+            self.assertLessEqual(text_width(line, REGULAR_FONT, 10), 50)
+
+    def test_that_long_text_flows_onto_new_pages(self):
+        writer = PdfWriter()
+        for i in range(100):
+            writer.add_text(f"Paragraph {i} (with brackets) and a backslash \\")
+        stream = io.BytesIO()
+        writer.write(stream)
+
+        reader = PdfReader(io.BytesIO(stream.getvalue()))
+        self.assertGreater(len(reader.pages), 1)
+        text = "".join(x.extract_text() for x in reader.pages)
+        self.assertIn("Paragraph 0 (with brackets) and a backslash \\", text)
+        self.assertIn("Paragraph 99", text)
+
+    def test_that_symbols_outside_the_encoding_are_spelled_out(self):
+        self.assertEqual(
+            "Age >= 45 \u2013 Yes", to_encodable("Age \u2265 45 \u2013 \u2713")
+        )
+        self.assertEqual("Gdansk", to_encodable("Gda\u0144sk"))
+
+    def test_that_tables_are_laid_out_in_columns(self):
+        writer = PdfWriter()
+        writer.add_table([["Criteria", "Met"], ["Age \u2265 45", "\u2713"]])
+        stream = io.BytesIO()
+        writer.write(stream)
+
+        text = PdfReader(io.BytesIO(stream.getvalue())).pages[0].extract_text()
+        self.assertListEqual(["Criteria Met", "Age >= 45 Yes"], text.splitlines())
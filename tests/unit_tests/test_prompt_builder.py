@@ -0,0 +1,80 @@
+import shutil
+import tempfile
+import unittest
+
+from langchain_core.documents import Document
+
+from assess.structures import prompts
+from assess.structures.criteria import AssessmentCriteria
+from assess.utils.prompt_builder import PromptBuilder, SplitPrompt, prompt_builder
+from tests.tools.offline_pipeline import OfflinePipeline
+from tests.tools.synthetic_records import write_synthetic_records
+
+PROMPT = SplitPrompt("<context>\n{context}\n</context>\n\n", "Question: {question}")
+
+
+class PromptBuilderTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.pages = [Document(page_content="Page one"), Document(page_content="Two")]
+
+    def test_that_the_prefix_is_rendered_once_per_context(self):
+        builder = PromptBuilder()
+        first = builder.prefix(PROMPT, self.pages)
+        second = builder.prefix(PROMPT, list(self.pages))
+        self.assertEqual("<context>\nPage one\n\nTwo\n</context>\n\n", first)
+        self.assertIs(first, second)
+        self.assertEqual((1, 1), (builder.misses, builder.hits))
+
+        other = builder.prefix(PROMPT, [Document(page_content="Page one")])
+        self.assertNotEqual(first, other)
+        self.assertEqual(2, builder.misses)
+
+    def test_that_the_whole_prompt_is_the_prefix_then_the_suffix(self):
+        builder = PromptBuilder()
+        self.assertEqual(
+            "<context>\nText\n</context>\n\nQuestion: Why?",
+            builder.build(PROMPT, "Text", question="Why?"),
+        )
+        inputs = builder.inputs(PROMPT, "Text", question="Why?")
+        self.assertEqual("Why?", inputs["question"])
+        self.assertEqual(
+            builder.build(PROMPT, "Text", question="Why?"),
+            PROMPT.template.format(**inputs),
+        )
+
+    def test_that_the_least_recently_used_prefixes_are_evicted(self):
+        builder = PromptBuilder(max_entries=2)
+        for text in ("a", "b", "a", "c"):
+            builder.prefix(PROMPT, text)
+        self.assertEqual(2, len(builder))
+        builder.prefix(PROMPT, "a")
+        builder.prefix(PROMPT, "b")
+        # "a" was used more recently than "b", so "b" was evicted by "c"
+        self.assertEqual((2, 4), (builder.hits, builder.misses))
+
+
+class PromptPrefixTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        prompt_builder.clear()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def test_that_every_prompt_about_a_record_shares_one_prefix(self):
+        pipeline = OfflinePipeline()
+        (path,) = write_synthetic_records(self.temp_dir, [2])
+        record = pipeline.load_record(path)
+        pipeline.orchestrator.run_pipeline(
+            AssessmentCriteria.from_spec("colonoscopy"), record
+        )
+
+        prefix = prompts.BASIC_CONTEXT.render_prefix(record.pages)
+        about_record = [x for x in pipeline.model.prompts if x.startswith(prefix)]
+        criteria = AssessmentCriteria.from_spec("colonoscopy")
+        # The profile, CPT codes, treatment summary and every criteria section
+        self.assertGreaterEqual(len(about_record), 4 + len(criteria.get_sections()))
+        # Rendered once for the record and once for the summary of treatment so far
+        self.assertEqual(2, prompt_builder.misses)
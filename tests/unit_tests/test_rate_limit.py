@@ -0,0 +1,84 @@
+import asyncio
+import time
+import unittest
+
+from langchain_core.documents import Document
+
+from assess.utils import rate_limit
+from assess.utils.rate_limit import RateLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class RateLimitTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+
+    def test_that_a_full_bucket_does_not_wait(self):
+        bucket = TokenBucket(per_minute=60, clock=self.clock)
+        waits = [bucket.reserve(1) for _ in range(60)]
+        self.assertListEqual([0.0] * 60, waits)
+
+    def test_that_callers_queue_behind_earlier_reservations(self):
+        bucket = TokenBucket(per_minute=60, capacity=1, clock=self.clock)
+        waits = [bucket.reserve(1) for _ in range(4)]
+        self.assertListEqual([0.0, 1.0, 2.0, 3.0], waits)
+
+    def test_that_the_bucket_refills_over_time_up_to_its_capacity(self):
+        bucket = TokenBucket(per_minute=60, capacity=2, clock=self.clock)
+        bucket.reserve(2)
+        self.clock.now = 1.0
+        self.assertEqual(0.0, bucket.reserve(1))
+        self.clock.now = 100.0
+        self.assertEqual(0.0, bucket.reserve(2))
+        self.assertEqual(1.0, bucket.reserve(1))
+
+    def test_that_the_slowest_limit_sets_the_wait(self):
+        limiter = RateLimiter(
+            requests_per_minute=600, tokens_per_minute=60, clock=self.clock
+        )
+        self.assertEqual(0.0, limiter.reserve(tokens=60))
+        self.assertEqual(30.0, limiter.reserve(tokens=30))
+
+    def test_that_an_invalid_rate_raises_an_error(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(per_minute=0)
+
+    def test_that_input_tokens_are_estimated_from_text_and_documents(self):
+        inputs = {
+            "question": "a" * 40,
+            "context": [Document(page_content="b" * 40)] * 2,
+        }
+        self.assertEqual(
+            120 // rate_limit.CHARS_PER_TOKEN, rate_limit.estimate_input_tokens(inputs)
+        )
+
+
+class SharedRateLimitTestCase(unittest.IsolatedAsyncioTestCase):
+
+    def tearDown(self) -> None:
+        rate_limit.configure_rate_limiter("test", None)
+
+    async def test_that_threads_and_tasks_share_the_configured_limit(self):
+        rate_limit.configure_rate_limiter("test", RateLimiter(requests_per_minute=600))
+        limiter = rate_limit.get_rate_limiter("test")
+        limiter.requests = TokenBucket(per_minute=600, capacity=1)
+
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(rate_limit.aacquire("test") for _ in range(3)),
+            asyncio.to_thread(rate_limit.acquire, "test"),
+        )
+        # Four requests at ten a second, with one available at once
+        self.assertGreaterEqual(time.perf_counter() - start, 0.29)
+
+    async def test_that_unconfigured_operations_are_not_limited(self):
+        self.assertIsNone(rate_limit.get_rate_limiter("test"))
+        await rate_limit.aacquire("test", tokens=10**9)
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from pypdf import PdfReader
+
+from assess.models.rendering import PdfRenderPool
+from assess.structures.report import (
+    AssessmentReport,
+    Decision,
+    ReportSection,
+    SectionKind,
+)
+
+
+def get_report(i: int) -> AssessmentReport:
+    section = ReportSection(
+        SectionKind.FINAL_ASSESSMENT, "Final Assessment", f"Case {i}"
+    )
+    return AssessmentReport(f"Patient {i}", Decision.APPROVED, "A reason", [section])
+
+
+class PdfRenderPoolTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def _read(self, path: str) -> str:
+        return "".join(x.extract_text() for x in PdfReader(path).pages)
+
+    def test_that_reports_render_concurrently_on_shared_workers(self):
+        paths = [os.path.join(self.temp_dir, f"{i}.pdf") for i in range(8)]
+        with PdfRenderPool(workers=2) as pool:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                list(
+                    executor.map(
+                        lambda i: pool.render_to_file(get_report(i), paths[i]),
+                        range(len(paths)),
+                    )
+                )
+        for i, path in enumerate(paths):
+            text = self._read(path)
+            self.assertIn(f"Patient {i}", text)
+            self.assertIn(f"Case {i}", text)
+
+    def test_that_reports_render_on_the_calling_thread_without_workers(self):
+        path = os.path.join(self.temp_dir, "report.pdf")
+        with PdfRenderPool(workers=0) as pool:
+            pool.render_to_file(get_report(0), path)
+        self.assertIn("APPROVED", self._read(path))
+
+    def test_that_render_errors_reach_the_caller(self):
+        path = os.path.join(self.temp_dir, "missing", "report.pdf")
+        for workers in (0, 1):
+            with PdfRenderPool(workers=workers) as pool:
+                with self.assertRaises(FileNotFoundError):
+                    pool.render_to_file(get_report(0), path)
@@ -0,0 +1,159 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from pypdf import PdfReader
+
+from assess.structures.report import (
+    INTRO,
+    AssessmentReport,
+    Decision,
+    ReportSection,
+    SectionKind,
+    render_combined_markdown,
+    render_html,
+    render_json,
+    render_markdown,
+    render_pdf,
+    to_html,
+    to_markdown,
+    write_report,
+)
+
+
+def get_report(decision: Decision = Decision.APPROVED) -> AssessmentReport:
+    return AssessmentReport(
+        "Jane Doe",
+        decision,
+        "A reason",
+        [
+            ReportSection(SectionKind.FINAL_ASSESSMENT, "Final Assessment", "[YES]"),
+            ReportSection.from_items(
+                SectionKind.CPT_CODES, "CPT Codes", {"Extracted": "45378 <b>"}
+            ),
+        ],
+        criteria_name="colonoscopy",
+    )
+
+
+class ReportTestCase(unittest.TestCase):
+
+    def test_that_it_renders_markdown(self):
+        expected = (
+            "# Assessment of Recommended Procedure for Jane Doe\n"
+            f"{INTRO}\n\n"
+            "**Assessment:** APPROVED\n\n"
+            "**Reason:** A reason\n\n"
+            "## Final Assessment\n[YES]\n\n"
+            "## CPT Codes\n### Extracted\n45378 <b>\n\n"
+        )
+        self.assertEqual(expected, to_markdown(get_report()))
+
+    def test_that_headings_can_be_offset(self):
+        stream = io.StringIO()
+        render_markdown(get_report(), stream, heading_offset=1)
+        headings = [x for x in stream.getvalue().splitlines() if x.startswith("#")]
+        self.assertListEqual(
+            [
+                "## Assessment of Recommended Procedure for Jane Doe",
+                "### Final Assessment",
+                "### CPT Codes",
+                "#### Extracted",
+            ],
+            headings,
+        )
+
+    def test_that_reports_can_be_combined(self):
+        stream = io.StringIO()
+        reports = {"first": get_report(), "second": get_report(Decision.DENIED)}
+        render_combined_markdown(reports, stream)
+        combined = stream.getvalue()
+        self.assertTrue(combined.startswith("# first\n\n## Assessment of"))
+        self.assertTrue(combined.endswith("#### Extracted\n45378 <b>\n\n\n"))
+        self.assertEqual(
+            ["# first", "# second"],
+            [x for x in combined.splitlines() if x.startswith("# ")],
+        )
+
+    def test_that_it_renders_html(self):
+        stream = io.StringIO()
+        render_html(get_report(), stream, body_to_html=lambda x: f"<p>{x}</p>\n")
+        result = stream.getvalue()
+        self.assertTrue(
+            result.startswith(
+                "<h1>Assessment of Recommended Procedure for Jane Doe</h1>\n"
+            )
+        )
+        self.assertTrue("<p><strong>Assessment:</strong> APPROVED</p>" in result)
+        self.assertTrue("<h2>CPT Codes</h2>\n<h3>Extracted</h3>\n" in result)
+        # Section bodies are left to the Markdown converter
+        self.assertTrue("<p>45378 <b></p>" in result)
+
+    def test_that_html_in_section_bodies_is_escaped(self):
+        report = AssessmentReport(
+            "Jane Doe",
+            Decision.APPROVED,
+            "A reason",
+            [
+                ReportSection(
+                    SectionKind.JUSTIFICATION,
+                    "Justification",
+                    "**Met** <script>alert(1)</script> [link](javascript:alert(1))",
+                )
+            ],
+        )
+        result = to_html(report)
+        self.assertIn("<strong>Met</strong>", result)
+        self.assertIn("&lt;script&gt;", result)
+        self.assertNotIn("<script>", result)
+        self.assertNotIn("javascript:", result)
+
+    def test_that_it_renders_json(self):
+        stream = io.StringIO()
+        render_json(get_report(Decision.DENIED), stream)
+        result = json.loads(stream.getvalue())
+        self.assertEqual("DENIED", result["decision"])
+        self.assertFalse(result["approved"])
+        self.assertEqual("colonoscopy", result["criteria"])
+        self.assertEqual("cpt_codes", result["sections"][1]["kind"])
+        self.assertEqual("45378 <b>", result["sections"][1]["subsections"][0]["body"])
+
+    def test_that_it_renders_pdf(self):
+        stream = io.BytesIO()
+        render_pdf(get_report(), stream)
+        reader = PdfReader(io.BytesIO(stream.getvalue()))
+        text = reader.pages[0].extract_text()
+        self.assertIn("Assessment of Recommended Procedure for Jane", text)
+        self.assertIn("Assessment: APPROVED", text)
+        self.assertIn("45378 <b>", text)
+
+    def test_that_pdf_bodies_keep_lists_and_tables(self):
+        body = (
+            "1. *Fibre* was tried.\n2. Nothing helped.\n\n"
+            "| Criteria | Met |\n|---|---|\n| Age \u2265 45 | \u2713 |"
+        )
+        report = AssessmentReport(
+            "Jane Doe",
+            Decision.APPROVED,
+            "A reason",
+            [ReportSection(SectionKind.JUSTIFICATION, "Justification", body)],
+        )
+        stream = io.BytesIO()
+        render_pdf(report, stream)
+        lines = PdfReader(io.BytesIO(stream.getvalue())).pages[0].extract_text()
+        lines = lines.splitlines()
+        for line in ("1. Fibre was tried.", "2. Nothing helped.", "Age >= 45 Yes"):
+            self.assertIn(line, lines)
+
+    def test_that_it_writes_to_a_file(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, "report.md")
+            write_report(get_report(), path)
+            with open(path) as f:
+                self.assertEqual(to_markdown(get_report()), f.read())
+        finally:
+            shutil.rmtree(temp_dir)
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from assess.utils.response_cache import (
+    CacheMissInReplayMode,
+    SqliteResponseCache,
+    configure_response_cache,
+)
+from tests.tools.fake_llm import CriteriaEchoChatModel
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "responses.sqlite")
+        self.model = CriteriaEchoChatModel()
+        prompt = ChatPromptTemplate.from_template("<criteria>\n{name}:\n")
+        self.chain = prompt | self.model | StrOutputParser()
+
+    def tearDown(self) -> None:
+        configure_response_cache(None)
+        shutil.rmtree(self.temp_dir)
+
+    def test_that_repeated_prompts_are_answered_from_the_cache(self):
+        cache = SqliteResponseCache(self.path)
+        configure_response_cache(cache)
+        self.assertEqual("[YES] risk", self.chain.invoke({"name": "risk"}))
+        self.assertEqual("[YES] risk", self.chain.invoke({"name": "risk"}))
+        self.assertEqual("[YES] family", self.chain.invoke({"name": "family"}))
+        self.assertEqual(2, self.model.calls)
+        self.assertDictEqual({"hits": 1, "misses": 2, "entries": 2}, cache.stats())
+
+    def test_that_responses_persist_between_cache_instances(self):
+        configure_response_cache(SqliteResponseCache(self.path))
+        self.chain.invoke({"name": "risk"})
+
+        configure_response_cache(SqliteResponseCache(self.path, replay=True))
+        self.assertEqual("[YES] risk", self.chain.invoke({"name": "risk"}))
+        self.assertEqual(1, self.model.calls)
+
+    def test_that_a_miss_in_replay_mode_raises_an_error(self):
+        configure_response_cache(SqliteResponseCache(self.path, replay=True))
+        with self.assertRaises(CacheMissInReplayMode):
+            self.chain.invoke({"name": "risk"})
+        self.assertEqual(0, self.model.calls)
+
+    def test_that_expired_entries_are_not_returned(self):
+        configure_response_cache(SqliteResponseCache(self.path, ttl_seconds=0.05))
+        self.chain.invoke({"name": "risk"})
+        time.sleep(0.1)
+        self.chain.invoke({"name": "risk"})
+        self.assertEqual(2, self.model.calls)
+
+    def test_that_the_least_recently_used_entries_are_evicted(self):
+        cache = SqliteResponseCache(self.path, max_entries=2)
+        configure_response_cache(cache)
+        self.chain.invoke({"name": "first"})
+        self.chain.invoke({"name": "second"})
+        self.chain.invoke({"name": "first"})
+        self.chain.invoke({"name": "third"})
+        self.assertEqual(2, len(cache))
+
+        self.chain.invoke({"name": "first"})
+        self.assertEqual(3, self.model.calls)
+        self.chain.invoke({"name": "second"})
+        self.assertEqual(4, self.model.calls)
@@ -0,0 +1,79 @@
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+
+from assess.structures.medical_record import MedicalRecord
+from assess.utils import retrieval
+from tests.tools import data_handler
+
+FILLER = "The patient attended the clinic and was seen by the nurse. " * 20
+
+
+class RetrievalTestCase(unittest.TestCase):
+
+    def _get_pages(self):
+        return [
+            Document(page_content=FILLER, metadata={"page": 0}),
+            Document(
+                page_content="CPT code 45378 was requested for a colonoscopy.",
+                metadata={"page": 1},
+            ),
+            Document(page_content=FILLER, metadata={"page": 2}),
+            Document(
+                page_content="Date of birth: 06/16/1982. Name: James Freeman.",
+                metadata={"page": 3},
+            ),
+        ]
+
+    def test_that_bm25_ranks_the_most_relevant_document_first(self):
+        index = retrieval.BM25Index(self._get_pages())
+        self.assertEqual(1, index.rank("Which CPT code was requested?")[0])
+        self.assertEqual(3, index.rank("What is the patient's date of birth?")[0])
+
+    def test_that_chunks_keep_the_metadata_of_their_page(self):
+        chunks = retrieval.chunk_documents(self._get_pages(), chunk_size=200)
+        self.assertGreater(len(chunks), 4)
+        self.assertSetEqual({0, 1, 2, 3}, {x.metadata["page"] for x in chunks})
+
+    def test_that_small_records_are_sent_whole(self):
+        pages = data_handler.load_medical_record_1()
+        selector = retrieval.ContextSelector(token_budget=100000)
+        self.assertFalse(selector.needs_retrieval(pages))
+
+    def test_that_large_records_only_send_relevant_chunks_within_budget(self):
+        pages = self._get_pages()
+        selector = retrieval.ContextSelector(token_budget=150, chunk_size=200)
+        self.assertTrue(selector.needs_retrieval(pages))
+
+        index = selector.build_index(pages)
+        selected = selector.select(index, "Which CPT code was requested?")
+        self.assertLessEqual(retrieval.estimate_tokens(selected), 150)
+        self.assertTrue(any("45378" in x.page_content for x in selected))
+
+        chunk_ids = [x.metadata["chunk"] for x in selected]
+        self.assertListEqual(sorted(chunk_ids), chunk_ids)
+
+    def test_that_top_k_limits_the_number_of_chunks(self):
+        selector = retrieval.ContextSelector(token_budget=150, top_k=1, chunk_size=200)
+        index = selector.build_index(self._get_pages())
+        self.assertEqual(1, len(selector.select(index, "colonoscopy")))
+
+    def test_that_concurrent_stages_build_the_index_once(self):
+        selector = retrieval.ContextSelector(token_budget=150, chunk_size=200)
+        build_index = selector.build_index
+        builds = []
+
+        def counted_build_index(pages):
+            builds.append(pages)
+            time.sleep(0.05)
+            return build_index(pages)
+
+        selector.build_index = counted_build_index
+        record = MedicalRecord(
+            self._get_pages(), advisor=object(), context_selector=selector
+        )
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(record.context_for, ["colonoscopy"] * 16))
+        self.assertEqual(1, len(builds))
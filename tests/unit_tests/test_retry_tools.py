@@ -1,6 +1,27 @@
+import types
 import unittest
+from typing import Optional, Type
+from unittest import mock
 
-from assess.utils import retry_tools
+import httpx
+import openai
+from langchain_core.runnables import RunnableLambda
+
+from assess.utils import retry_tools, runnables
+
+
+def make_openai_error(
+    error_type: Type[openai.APIStatusError],
+    status_code: int,
+    retry_after: Optional[str] = None,
+    retry_after_ms: Optional[str] = None,
+) -> openai.APIStatusError:
+    headers = {"retry-after": retry_after} if retry_after is not None else {}
+    if retry_after_ms is not None:
+        headers["retry-after-ms"] = retry_after_ms
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status_code, headers=headers, request=request)
+    return error_type("An error", response=response, body=None)
 
 
 class RetryToolsTestCase(unittest.TestCase):
@@ -22,3 +43,138 @@ class RetryToolsTestCase(unittest.TestCase):
 
         # If this succeeds without error, the test passes
         decorated()
+
+    def test_that_the_last_error_is_raised_once_the_attempts_are_used_up(self):
+        calls = []
+
+        @retry_tools.retry_on_failure(tolerance=3, base_delay=0.01)
+        def always_fails():
+            calls.append(1)
+            raise ValueError(f"Failure {len(calls)}")
+
+        with self.assertRaisesRegex(ValueError, "Failure 3"):
+            always_fails()
+        self.assertEqual(3, len(calls))
+
+    def test_that_errors_which_should_not_be_retried_are_raised_at_once(self):
+        calls = []
+
+        @retry_tools.retry_on_failure(
+            tolerance=3, retry_if=retry_tools.is_transient_error
+        )
+        def invalid_request():
+            calls.append(1)
+            raise make_openai_error(openai.BadRequestError, 400)
+
+        with self.assertRaises(openai.BadRequestError):
+            invalid_request()
+        self.assertEqual(1, len(calls))
+
+    def test_that_the_delay_grows_exponentially_up_to_the_limit(self):
+        with mock.patch.object(retry_tools.random, "uniform", lambda a, b: b):
+            delays = [retry_tools.backoff_delay(n, 0.5, 3.0) for n in range(1, 6)]
+        self.assertListEqual([0.5, 1.0, 2.0, 3.0, 3.0], delays)
+
+    def test_that_retry_after_is_honoured(self):
+        calls = []
+
+        @retry_tools.retry_on_failure(tolerance=2, base_delay=100)
+        def rate_limited():
+            calls.append(1)
+            if len(calls) == 1:
+                raise make_openai_error(openai.RateLimitError, 429, retry_after="0.25")
+            return "done"
+
+        with mock.patch.object(retry_tools.time, "sleep") as sleep:
+            self.assertEqual("done", rate_limited())
+        sleep.assert_called_once_with(0.25)
+
+    def test_that_retry_after_is_read_in_seconds_or_as_a_date(self):
+        error = make_openai_error(openai.RateLimitError, 429, retry_after="3")
+        self.assertEqual(3.0, retry_tools.retry_after_seconds(error))
+
+        error = make_openai_error(
+            openai.RateLimitError, 429, retry_after="Wed, 21 Oct 2015 07:28:00 GMT"
+        )
+        self.assertEqual(0.0, retry_tools.retry_after_seconds(error))
+        self.assertIsNone(retry_tools.retry_after_seconds(ValueError()))
+
+    def test_that_a_malformed_retry_after_ms_falls_back_to_retry_after(self):
+        error = make_openai_error(
+            openai.RateLimitError, 429, retry_after="2", retry_after_ms="soon"
+        )
+        self.assertEqual(2.0, retry_tools.retry_after_seconds(error))
+        error = make_openai_error(openai.RateLimitError, 429, retry_after_ms="soon")
+        self.assertIsNone(retry_tools.retry_after_seconds(error))
+
+    def test_that_rate_limits_and_server_errors_are_transient(self):
+        self.assertTrue(
+            retry_tools.is_transient_error(
+                make_openai_error(openai.RateLimitError, 429)
+            )
+        )
+        self.assertTrue(
+            retry_tools.is_transient_error(
+                make_openai_error(openai.InternalServerError, 503)
+            )
+        )
+        self.assertTrue(retry_tools.is_transient_error(TimeoutError()))
+        self.assertFalse(
+            retry_tools.is_transient_error(
+                make_openai_error(openai.AuthenticationError, 401)
+            )
+        )
+        self.assertFalse(retry_tools.is_transient_error(ValueError()))
+
+    def test_that_search_errors_are_transient_in_the_pinned_version(self):
+        # duckduckgo_search 4.4 has no RatelimitException or TimeoutException
+        exceptions = types.ModuleType("duckduckgo_search.exceptions")
+        exceptions.DuckDuckGoSearchException = type(
+            "DuckDuckGoSearchException", (Exception,), {}
+        )
+        with mock.patch("duckduckgo_search.exceptions", exceptions):
+            self.assertTrue(
+                retry_tools.is_transient_error(
+                    exceptions.DuckDuckGoSearchException("Ratelimit")
+                )
+            )
+            self.assertFalse(retry_tools.is_transient_error(ValueError()))
+
+            calls = []
+
+            def fails(x):
+                calls.append(x)
+                raise ValueError("Not transient")
+
+            chain = runnables.RateLimitedRunnable(RunnableLambda(fails))
+            with self.assertRaisesRegex(ValueError, "Not transient"):
+                chain.invoke("x")
+            self.assertEqual(1, len(calls))
+
+
+class AsyncRetryToolsTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def test_that_the_last_error_is_raised_once_the_attempts_are_used_up(self):
+        calls = []
+
+        @retry_tools.retry_on_failure(tolerance=3, base_delay=0.01)
+        async def always_fails():
+            calls.append(1)
+            raise ValueError(f"Failure {len(calls)}")
+
+        with self.assertRaisesRegex(ValueError, "Failure 3"):
+            await always_fails()
+        self.assertEqual(3, len(calls))
+
+    async def test_that_a_rate_limited_chain_retries_transient_failures(self):
+        calls = []
+
+        def flaky(x):
+            calls.append(x)
+            if len(calls) < 3:
+                raise make_openai_error(openai.RateLimitError, 429, retry_after="0")
+            return x.upper()
+
+        chain = runnables.RateLimitedRunnable(RunnableLambda(flaky))
+        self.assertEqual("DONE", await chain.ainvoke("done"))
+        self.assertEqual(3, len(calls))
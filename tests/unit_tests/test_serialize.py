@@ -3,7 +3,7 @@ import shutil
 import tempfile
 import unittest
 
-from assess.utils import serialize
+from assess.utils import instrumentation, serialize
 from tests.tools import data_handler
 
 
@@ -33,6 +33,12 @@ class SerializeTestCase(unittest.TestCase):
         result = serialize.load_toml_file(data_handler.get_test_toml_file_path())
         self.assertDictEqual(expected, result)
 
+    def test_that_read_toml_file_loads_the_same_data_as_plain_dicts(self):
+        path = data_handler.get_test_toml_file_path()
+        result = serialize.read_toml_file(path)
+        self.assertDictEqual(serialize.load_toml_file(path), result)
+        self.assertIs(dict, type(result["test-system"]))
+
     def test_that_write_toml_file_correctly_writes_data_to_a_toml_file(self):
         to_write = {"test-system": {"super_awesome": True}}
         write_path = os.path.join(self.temp_dir, "test.toml")
@@ -69,6 +75,40 @@ class SerializeTestCase(unittest.TestCase):
         )
         self.assertEqual(expected, result)
 
+    def test_that_raw_text_loads_are_traced_like_document_loads(self):
+        path = data_handler.get_medical_record_one_path()
+        loads = []
+        for as_raw_text in (False, True):
+            with instrumentation.tracing() as trace:
+                serialize.load_pdf_file(path, as_raw_text=as_raw_text)
+            (load,) = trace.events
+            loads.append((load.context_pages, load.context_chars))
+        self.assertGreater(loads[0][0], 1)
+        self.assertEqual(loads[0], loads[1])
+
+    def test_that_pdf_pages_are_yielded_as_they_are_parsed(self):
+        path = data_handler.get_medical_record_one_path()
+        pages = serialize.iter_pdf_file(path)
+        first = next(pages)
+        self.assertEqual(0, first.metadata["page"])
+        self.assertListEqual(serialize.load_pdf_file(path), [first] + list(pages))
+
+    def test_that_page_ranges_parsed_in_parallel_are_yielded_in_order(self):
+        path = data_handler.get_medical_record_one_path()
+        expected = serialize.load_pdf_file(path)
+        result = list(serialize.iter_pdf_file(path, workers=2, pages_per_range=1))
+        self.assertGreater(len(expected), 1)
+        self.assertListEqual(expected, result)
+
+    def test_that_every_file_is_parsed_on_one_spawned_pool(self):
+        self.addCleanup(serialize.close_pdf_parse_pool)
+        path = data_handler.get_medical_record_one_path()
+        pool = serialize.get_pdf_parse_pool(2)
+        for _ in range(2):
+            list(serialize.iter_pdf_file(path, workers=2, pages_per_range=1))
+            self.assertIs(pool, serialize.get_pdf_parse_pool(2))
+        self.assertEqual("spawn", pool._mp_context.get_start_method())
+
     def test_that_it_can_load_assessment_criteria(self):
         expected = data_handler.load_example_treatment_criteria()
         result = serialize.load_assesment_criteria(criteria_for="colonoscopy")
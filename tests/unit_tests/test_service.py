@@ -0,0 +1,160 @@
+import http.client
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from typing import Dict, Optional, Tuple
+
+from assess.models.service import (
+    AssessmentServer,
+    AssessmentService,
+    JobStatus,
+    QueueFullError,
+)
+from tests.tools.offline_pipeline import OfflinePipeline
+from tests.tools.synthetic_records import write_synthetic_records
+
+
+class AssessmentServiceTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.temp_dir = tempfile.mkdtemp()
+        (path,) = write_synthetic_records(cls.temp_dir, [2])
+        with open(path, "rb") as f:
+            cls.pdf = f.read()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        shutil.rmtree(cls.temp_dir)
+
+    def setUp(self) -> None:
+        self.pipeline = OfflinePipeline()
+        self.release = threading.Event()
+        self.release.set()
+        self.service = AssessmentService(
+            orchestrator=self.pipeline.orchestrator,
+            record_loader=self._load_record,
+            workers=1,
+            queue_size=1,
+        )
+        self.server = AssessmentServer(self.service, port=0)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self) -> None:
+        self.release.set()
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+
+    def _load_record(self, path: str):
+        self.release.wait()
+        return self.pipeline.load_record(path)
+
+    def _request(
+        self, method: str, path: str, body: Optional[bytes] = None
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        request = urllib.request.Request(
+            self.server.url + path, data=body, method=method
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, dict(response.headers), response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, dict(e.headers), e.read()
+
+    def _wait_for(self, job_id: str, timeout: float = 10) -> Dict:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            _, _, body = self._request("GET", f"/jobs/{job_id}")
+            job = json.loads(body)
+            if job["status"] in (JobStatus.DONE.value, JobStatus.ERROR.value):
+                return job
+            time.sleep(0.05)
+        self.fail(f"Job {job_id} did not finish")
+
+    def test_that_an_uploaded_record_is_assessed(self):
+        status, headers, body = self._request(
+            "POST", "/jobs?criteria=colonoscopy&name=a.pdf", self.pdf
+        )
+        self.assertEqual(202, status)
+        job = json.loads(body)
+        self.assertEqual(f"/jobs/{job['id']}", headers["Location"])
+
+        job = self._wait_for(job["id"])
+        self.assertEqual(JobStatus.DONE.value, job["status"])
+        self.assertTrue(job["approved"])
+
+        status, headers, body = self._request("GET", f"/jobs/{job['id']}/report")
+        self.assertEqual(200, status)
+        self.assertIn("**Assessment:** APPROVED", body.decode())
+        self.assertIn("45378", body.decode())
+
+        _, _, body = self._request("GET", f"/jobs/{job['id']}/report?format=json")
+        self.assertEqual("APPROVED", json.loads(body)["decision"])
+        _, headers, body = self._request("GET", f"/jobs/{job['id']}/report?format=pdf")
+        self.assertEqual("application/pdf", headers["Content-Type"])
+        self.assertTrue(body.startswith(b"%PDF"))
+
+    def test_that_uploads_are_refused_when_the_queue_is_full(self):
+        self.release.clear()
+        first = json.loads(self._request("POST", "/jobs", self.pdf)[2])
+        # The worker takes the first job, the second fills the queue
+        while self.service.get_job(first["id"]).status != JobStatus.RUNNING:
+            time.sleep(0.01)
+        second = json.loads(self._request("POST", "/jobs", self.pdf)[2])
+
+        status, headers, _ = self._request("POST", "/jobs", self.pdf)
+        self.assertEqual(503, status)
+        self.assertIn("Retry-After", headers)
+        with self.assertRaises(QueueFullError):
+            self.service.submit(self.pdf, "colonoscopy", "c.pdf")
+
+        status, _, _ = self._request("GET", f"/jobs/{second['id']}/report")
+        self.assertEqual(409, status)
+        self.release.set()
+        self.assertEqual(JobStatus.DONE.value, self._wait_for(second["id"])["status"])
+
+    def test_that_bad_requests_are_rejected(self):
+        self.assertEqual(400, self._request("POST", "/jobs", b"")[0])
+        self.assertEqual(
+            400, self._request("POST", "/jobs?criteria=unknown", self.pdf)[0]
+        )
+        self.assertEqual(404, self._request("GET", "/jobs/missing")[0])
+        self.assertEqual(404, self._request("GET", "/unknown")[0])
+
+    def test_that_an_invalid_content_length_is_rejected(self):
+        for length in ("abc", "-1", "1_000"):
+            with self.subTest(length=length):
+                connection = http.client.HTTPConnection(
+                    self.server.server_address[0], self.server.server_address[1]
+                )
+                try:
+                    connection.putrequest("POST", "/jobs")
+                    connection.putheader("Content-Length", length)
+                    connection.endheaders()
+                    response = connection.getresponse()
+                    self.assertEqual(400, response.status)
+                    self.assertIn(
+                        "Content-Length", json.loads(response.read())["error"]
+                    )
+                finally:
+                    connection.close()
+
+    def test_that_failed_jobs_report_their_error(self):
+        job = json.loads(self._request("POST", "/jobs", b"not a pdf")[2])
+        job = self._wait_for(job["id"])
+        self.assertEqual(JobStatus.ERROR.value, job["status"])
+        self.assertIsNotNone(job["error"])
+
+    def test_that_it_reports_its_health_and_criteria(self):
+        status, _, body = self._request("GET", "/health")
+        self.assertEqual(200, status)
+        self.assertEqual(1, json.loads(body)["workers"])
+        _, _, body = self._request("GET", "/criteria")
+        self.assertIn("colonoscopy", json.loads(body))
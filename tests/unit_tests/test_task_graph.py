@@ -0,0 +1,51 @@
+import threading
+import time
+import unittest
+
+from assess.utils.task_graph import TaskGraph
+
+
+class TaskGraphTestCase(unittest.TestCase):
+
+    def test_that_tasks_receive_the_results_of_their_dependencies(self):
+        graph = TaskGraph()
+        graph.add_task("a", lambda: 1)
+        graph.add_task("b", lambda: 2)
+        graph.add_task("c", lambda a, b: a + b, depends_on=("a", "b"))
+        graph.add_task("d", lambda c: c * 10, depends_on=("c",))
+        self.assertDictEqual({"a": 1, "b": 2, "c": 3, "d": 30}, graph.run())
+
+    def test_that_independent_tasks_run_concurrently(self):
+        barrier = threading.Barrier(3, timeout=2)
+        graph = TaskGraph()
+        for name in ("a", "b", "c"):
+            graph.add_task(name, barrier.wait)
+
+        # The barrier only opens if all three tasks are running at the same time
+        graph.run()
+
+    def test_that_a_task_starts_as_soon_as_its_own_dependencies_finish(self):
+        finished = []
+        graph = TaskGraph()
+        graph.add_task("slow", lambda: time.sleep(0.3) or finished.append("slow"))
+        graph.add_task("fast", lambda: finished.append("fast"))
+        graph.add_task(
+            "after_fast", lambda fast: finished.append("after_fast"), ("fast",)
+        )
+        graph.run()
+        self.assertListEqual(["fast", "after_fast", "slow"], finished)
+
+    def test_that_errors_in_tasks_are_raised(self):
+        def fail():
+            raise RuntimeError("A generic failure")
+
+        graph = TaskGraph()
+        graph.add_task("fail", fail)
+        graph.add_task("never", lambda fail: None, depends_on=("fail",))
+        with self.assertRaises(RuntimeError):
+            graph.run()
+
+    def test_that_dependencies_must_be_added_first(self):
+        graph = TaskGraph()
+        with self.assertRaises(KeyError):
+            graph.add_task("a", lambda b: b, depends_on=("b",))